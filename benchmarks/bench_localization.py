@@ -0,0 +1,128 @@
+'''Benchmark of Monte Carlo localization on a saved map.
+
+Maps the corridor of `bench_slam_icp.py` with `SLAM.process_scan`, saves it
+with `save_map_visualization` and loads it as a `LikelihoodField`. Then
+drives the corridor again and reports the time per scan and the CPU time
+of full SLAM against localization only (`SLAM(localizer=...)`), the
+particles KLD resampling kept and the pose error, starting from a known
+pose.
+
+Then starts filters without a pose (particles spread over the whole map)
+in the room of `bench_slam_pose_graph.py`, mapped at the true poses, with
+and without noisy odometry, and reports after how many scans they
+converged to within 10 cm for good.
+
+Run from the repository root:
+
+    python benchmarks/bench_localization.py
+'''
+import glob
+import math
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx.simulator import FakeHokuyo, box_world
+from localization import LikelihoodField, MonteCarloLocalizer
+from odometry import relative_pose
+from slam import SLAM, apply_transform, polar_to_cartesian
+from bench_slam_icp import simulated_scans
+from bench_slam_pose_graph import square
+
+
+def run(slam, poses, scans):
+    times, errors = [], []
+    cpu = time.process_time()
+    for pose, points in zip(poses, scans):
+        start = time.perf_counter()
+        slam.process_scan(points)
+        times.append(time.perf_counter() - start)
+        errors.append(np.hypot(*(slam.pose[:2] - pose[:2])))
+    return np.array(times), time.process_time() - cpu, np.array(errors)
+
+
+def room_scans(n=150, seed=1):
+    '''True poses and scans of a lap around the block of the pose graph benchmark'''
+    pillars = [square(x, y) for x in (-5, -2, 1, 4) for y in (-3.5, 3.2)]
+    block = [(-3, -1.2), (3, -1.2), (3, 1.2), (-3, 1.2)]
+    cabinet = [(-5.9, 0.4), (-5.3, 0.4), (-5.3, 1.6), (-5.9, 1.6)]  #breaks the symmetry of the room
+    sim = FakeHokuyo(box_world(12, 8, [block, cabinet] + pillars), noise=10, seed=seed)
+    angles = sim.get_angles()
+    poses, scans = [], []
+    for k in range(n):
+        t = 2 * math.pi * k / n
+        pose = (4.8 * math.cos(t), 2.6 * math.sin(t), math.atan2(2.6 * math.cos(t), -4.8 * math.sin(t)))
+        sim.pose = pose
+        ranges = sim.measure(False).astype(float)
+        keep = (ranges > 20) & (ranges < 10000)
+        poses.append(pose)
+        scans.append(polar_to_cartesian(angles[keep], ranges[keep]))
+    return poses, scans
+
+
+def main():
+    out_dir = tempfile.mkdtemp()
+    poses, scans = simulated_scans(n=200, step=0.04)
+    slam = SLAM(icp_method='point_to_line')
+    slam.pose[:] = poses[0]
+    times, cpu, errors = run(slam, poses, scans)
+    slam.save_map_visualization(out_dir=out_dir, filename_prefix='corridor')
+    print('%-18s  %6.2f ms/scan  CPU %5.2f s  pose error mean %5.1f mm  max %5.1f mm' %
+          ('SLAM (mapping)', 1e3*times.mean(), cpu, 1e3*errors.mean(), 1e3*errors.max()))
+
+    start = time.perf_counter()
+    field = LikelihoodField.load(glob.glob(os.path.join(out_dir, 'corridor_*.npy'))[0])
+    print('likelihood field of %dx%d cells in %.1f ms' %
+          (field.prob.shape + (1e3*(time.perf_counter() - start),)))
+    poses, scans = simulated_scans(n=200, step=0.04)
+    localizer = MonteCarloLocalizer(field, seed=0)
+    localizer.init_pose(poses[0])
+    slam = SLAM(submap_keyframes=0, localizer=localizer)
+    particles = []
+    times, cpu_loc, errors = [], 0., []
+    for pose, points in zip(poses, scans):
+        t, c, e = run(slam, [pose], [points])
+        times.append(t[0])
+        cpu_loc += c
+        errors.append(e[0])
+        particles.append(localizer.last_update['particles'])
+    times, errors = np.array(times), np.array(errors)
+    print('%-18s  %6.2f ms/scan  CPU %5.2f s  pose error mean %5.1f mm  max %5.1f mm  '
+          'particles %d -> mean %.0f  (%.0f%% of the CPU of mapping)' %
+          ('localization only', 1e3*times.mean(), cpu_loc, 1e3*errors.mean(), 1e3*errors.max(),
+           particles[0], np.mean(particles), 100*cpu_loc/cpu))
+
+    print()
+    poses, scans = room_scans()
+    mapper = SLAM(width_m=16, height_m=12)
+    for pose, points in zip(poses, scans):
+        mapper.update_map(apply_transform(points, *pose), origin=np.array(pose[:2]))
+    mapper.save_map_visualization(out_dir=out_dir, filename_prefix='room')
+    field = LikelihoodField.load(glob.glob(os.path.join(out_dir, 'room_*.npy'))[0])
+    poses, scans = room_scans(seed=2)
+    for odometry in (False, True):
+        for seed in range(3):
+            rng = np.random.default_rng(seed)
+            localizer = MonteCarloLocalizer(field, seed=seed)
+            localizer.init_global()
+            converged = None
+            for k, (pose, points) in enumerate(zip(poses, scans)):
+                delta = None
+                if odometry and k:
+                    delta = tuple(np.array(relative_pose(poses[k-1], pose)) * (1 + rng.normal(0, 0.05, 3)))
+                x, y, _ = localizer.update(points, delta)
+                error = math.hypot(x - pose[0], y - pose[1])
+                if error >= 0.1:
+                    converged = None
+                elif converged is None:
+                    converged = k + 1
+            print('global localization, %-12s (seed %d): %-26s final error %5.1f mm, %4d particles, %.2f ms/scan' %
+                  ('odometry' if odometry else 'no odometry', seed,
+                   'converged after %d scans,' % converged if converged is not None else 'not converged,',
+                   1e3*error, len(localizer), localizer.last_update['time_ms']))
+
+if __name__ == '__main__':
+    main()
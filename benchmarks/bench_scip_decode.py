@@ -0,0 +1,61 @@
+'''Micro-benchmark of the SCIP scan decoder used by HokuyoLX.
+
+Compares the vectorized `HokuyoLX._decode_scan` path with the previous
+per-block `_check_sum` + per-value `_convert2int` decoder on synthetic
+UST-10LX sized `MD` (1081 distances) and `ME` (1081 distance/intensity
+pairs) frames.
+
+Run from the repository root:
+
+    python benchmarks/bench_scip_decode.py
+'''
+import os
+import sys
+import timeit
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx import HokuyoLX
+from hokuyolx.simulator import encode_scan
+
+STEPS = 1081
+REPEATS = 200
+
+
+def legacy_decode(blocks):
+    '''Decoder as it was before vectorization.'''
+    raw_data = ''.join([HokuyoLX._check_sum(block) for block in blocks])
+    return np.array([
+        HokuyoLX._convert2int(raw_data[3*i:3*i+3])
+        for i in range(len(raw_data)//3)], np.uint32)
+
+
+def vectorized_decode(payload):
+    return HokuyoLX._decode_scan(payload)
+
+
+def run(name, values):
+    blocks = encode_scan(values)
+    payload = '\n'.join(blocks).encode('ascii')
+    expected = np.asarray(values, np.uint32)
+    assert np.array_equal(legacy_decode(blocks), expected)
+    assert np.array_equal(vectorized_decode(payload), expected)
+
+    t_old = min(timeit.repeat(lambda: legacy_decode(blocks),
+                              number=REPEATS, repeat=3)) / REPEATS
+    t_new = min(timeit.repeat(lambda: vectorized_decode(payload),
+                              number=REPEATS, repeat=3)) / REPEATS
+    print('%-4s %6d values  legacy %8.1f us  vectorized %7.1f us  x%.1f' %
+          (name, len(values), t_old*1e6, t_new*1e6, t_old/t_new))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    dist = rng.integers(20, 30000, STEPS)
+    intens = rng.integers(0, 10000, STEPS)
+    run('MD', dist.tolist())
+    run('ME', np.column_stack((dist, intens)).ravel().tolist())
+
+
+if __name__ == '__main__':
+    main()
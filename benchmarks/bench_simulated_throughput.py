@@ -0,0 +1,63 @@
+'''End-to-end throughput of HokuyoLX against the local fake sensor.
+
+Starts `hokuyolx.simulator.FakeHokuyo` at several scan rates and measures
+how many scans per second reach the caller through single measurments
+(`get_filtered_dist`), continuous measurment (`iter_dist`) and background
+streaming (`start_stream` + `wait_next_scan`).
+
+Run from the repository root:
+
+    python benchmarks/bench_simulated_throughput.py
+'''
+import os
+import sys
+import time
+import logging
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx import HokuyoLX
+from hokuyolx.simulator import FakeHokuyo, box_world
+
+RATES = (40, 100, 200, 400)
+DURATION = 2.0
+
+
+def rate(fn):
+    '''Calls `fn` repeatedly for `DURATION` seconds, returns calls per second'''
+    n = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < DURATION:
+        fn()
+        n += 1
+    return n/(time.perf_counter() - t0)
+
+
+def run(freq):
+    world = box_world(8, 6, [[(1, 1), (2, 1), (2, 2), (1, 2)]])
+    with FakeHokuyo(world, scan_freq=freq, noise=5, seed=0) as fake:
+        laser = HokuyoLX(addr=fake.addr)
+        single = rate(lambda: laser.get_filtered_dist(dmax=10000))
+
+        gen = laser.iter_dist()
+        cont = rate(lambda: next(gen))
+        gen.close()
+        laser.standby()
+        laser.activate()
+
+        laser.start_stream()
+        stream = rate(laser.wait_next_scan)
+        laser.stop_stream()
+        laser.close()
+    print('%5d Hz  GD %7.1f/s  MD %7.1f/s  stream %7.1f/s' %
+          (freq, single, cont, stream))
+
+
+def main():
+    # messages of a stopped stream are discarded with a warning
+    logging.getLogger('hokuyo').setLevel(logging.ERROR)
+    for freq in RATES:
+        run(freq)
+
+
+if __name__ == '__main__':
+    main()
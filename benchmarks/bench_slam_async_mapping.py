@@ -0,0 +1,122 @@
+'''Benchmark of the split tracking / mapping pipeline of SLAM.
+
+First replays the corridor scans of `bench_slam_icp.py` through
+`SLAM.process_scan` with the map updated in line and by the mapping worker
+(`async_mapping=True`), and reports the time each call takes (the latency
+of a pose update), the scans the mapping worker dropped and how much the
+final maps differ.
+
+Then drives a simulated robot at 0.3 m/s past `FakeHokuyo` scanning at
+40 Hz, read through `HokuyoLX` in streaming mode, and reports the pose
+error the waypoint controller sees: with the synchronous loop of
+`explore_waypoints` (a scan every 5 iterations of 0.25 s) and with the
+tracking thread (`start_tracking`), polled at 40 Hz.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_async_mapping.py
+'''
+import os
+import sys
+import threading
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx import HokuyoLX
+from hokuyolx.simulator import FakeHokuyo, box_world
+from slam import SLAM
+from bench_slam_icp import shelves, simulated_scans
+
+SPEED = 0.3  #m/s
+DURATION = 6.0  #s of each live run
+
+
+def replay(poses, scans, async_mapping):
+    slam = SLAM(icp_method='point_to_line', async_mapping=async_mapping)
+    slam.pose[:] = poses[0]
+    times = []
+    for points in scans:
+        start = time.perf_counter()
+        slam.process_scan(points)
+        times.append(time.perf_counter() - start)
+    slam.flush_mapping()
+    return slam, np.array(times)
+
+
+class Robot(object):
+    '''Moves the fake sensor along the corridor at SPEED'''
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.start = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def pose(self):
+        return (-7 + SPEED*(time.perf_counter() - self.start), 0., 0.)
+
+    def _run(self):
+        while not self._stop.wait(0.005):
+            self.fake.pose = self.pose()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def live(tracking):
+    world = box_world(20, 4, list(shelves(20, 1.4)) + list(shelves(20, -1.8)))
+    with FakeHokuyo(world, pose=(-7., 0., 0.), scan_freq=40, noise=10, seed=0) as fake:
+        laser = HokuyoLX(addr=fake.addr)
+        laser.start_stream()
+        slam = SLAM(icp_method='point_to_line', async_mapping=tracking)
+        slam.pose[:] = (-7., 0., 0.)
+        slam.step(laser)
+        robot = Robot(fake)
+        errors = []
+        if tracking:
+            slam.start_tracking(laser)
+            while time.perf_counter() - robot.start < DURATION:
+                x, y, _ = slam.get_pose()
+                errors.append(np.hypot(x - robot.pose()[0], y))
+                time.sleep(1/40.)
+            slam.stop_tracking()
+            rate = slam.tracking_rate_hz
+        else:
+            iteration, steps = 0, 0
+            while time.perf_counter() - robot.start < DURATION:
+                x, y, _ = slam.get_pose()
+                errors.append(np.hypot(x - robot.pose()[0], y))
+                time.sleep(0.25)
+                if iteration % 5 == 0:
+                    slam.step(laser)
+                    steps += 1
+                iteration += 1
+            rate = steps / DURATION
+        robot.stop()
+        laser.close()
+    return rate, np.array(errors)
+
+
+def main():
+    poses, scans = simulated_scans(n=200, step=0.04)
+    maps = {}
+    for name, async_mapping in (('in line', False), ('mapping worker', True)):
+        slam, times = replay(poses, scans, async_mapping)
+        maps[name] = slam.get_map_prob()
+        print('map update %-14s  process_scan mean %5.2f ms  p95 %5.2f ms  '
+              'scans dropped by mapping %3d' %
+              (name, 1e3*times.mean(), 1e3*np.percentile(times, 95), slam.mapping_dropped))
+    diff = np.abs(maps['in line'] - maps['mapping worker'])
+    print('maps differ by more than 0.1 in %d of %d cells' % (np.sum(diff > 0.1), diff.size))
+    print()
+    for name, tracking in (('explore loop', False), ('tracking thread', True)):
+        rate, errors = live(tracking)
+        print('%-15s  pose updates %5.1f Hz  pose error seen by the controller: '
+              'mean %6.1f mm  max %6.1f mm' % (name, rate, 1e3*errors.mean(), 1e3*errors.max()))
+
+
+if __name__ == '__main__':
+    main()
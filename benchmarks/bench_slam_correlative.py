@@ -0,0 +1,74 @@
+'''Benchmark of the correlative scan matcher in SLAM on fast turns.
+
+Simulates a robot in the shelf-lined corridor of `bench_slam_icp.py` that
+turns on the spot by up to 20 and up to 30 degrees between scans, like the
+emergency turns of `explore_waypoints`, and runs `SLAM.process_scan` with
+point-to-point and point-to-line ICP alone, with the correlative matcher
+initializing them and with the correlative matcher alone. Reports rejected
+scans, time per scan and the largest position and heading errors along the
+run.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_correlative.py
+'''
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx.simulator import FakeHokuyo, box_world
+from slam import SLAM, CORRELATIVE_MODES, polar_to_cartesian
+from bench_slam_icp import shelves
+
+
+def turning_scans(n=60, max_turn_deg=20):
+    world = box_world(20, 4, list(shelves(20, 1.4)) + list(shelves(20, -1.8)))
+    sim = FakeHokuyo(world, noise=10, seed=0)
+    angles = sim.get_angles()
+    rng = np.random.default_rng(0)
+    pose = np.array([-5., 0., 0.])
+    poses, scans = [], []
+    for k in range(n):
+        poses.append(tuple(pose))
+        sim.pose = tuple(pose)
+        ranges = sim.measure(False).astype(float)
+        keep = (ranges > 20) & (ranges < 10000)
+        scans.append(polar_to_cartesian(angles[keep], ranges[keep]))
+        pose += (0.05 + rng.uniform(0, 0.05), rng.uniform(-0.03, 0.03),
+                 np.radians(rng.choice([-1, 1])*rng.uniform(5, max_turn_deg)))
+    return poses, scans
+
+
+def run(poses, scans, method, mode):
+    slam = SLAM(icp_method=method, correlative_mode=mode)
+    slam.pose[:] = poses[0]
+    rejected = 0
+    pos_err, ang_err = [], []
+    total = 0.
+    for pose, points in zip(poses, scans):
+        start = time.perf_counter()
+        rejected += not slam.process_scan(points)
+        total += time.perf_counter() - start
+        pos_err.append(np.hypot(*(slam.pose[:2] - pose[:2])))
+        d = slam.pose[2] - pose[2]
+        ang_err.append(abs(np.degrees(np.arctan2(np.sin(d), np.cos(d)))))
+    print('%-13s correlative %-4s  %2d of %d scans rejected  process_scan %6.2f ms  '
+          'max error %7.1f mm %5.1f deg' %
+          (method, mode, rejected, len(scans), 1e3*total/len(scans),
+           1e3*max(pos_err), max(ang_err)))
+
+
+def main():
+    for max_turn in (20, 30):
+        print('turns of up to %d deg between scans' % max_turn)
+        poses, scans = turning_scans(max_turn_deg=max_turn)
+        for method in ('point_to_point', 'point_to_line'):
+            for mode in CORRELATIVE_MODES:
+                run(poses, scans, method, mode)
+        print()
+
+
+if __name__ == '__main__':
+    main()
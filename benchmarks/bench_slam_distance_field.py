@@ -0,0 +1,106 @@
+'''Benchmark of the incrementally maintained distance field of SLAM.
+
+Maps the corridor of `bench_slam_icp.py` with `SLAM(distance_field_max_m=1.0)`
+and records the cells every `update_map` hands to the distance field. Reports
+how many flip occupancy per scan, the time of the incremental (dynamic
+brushfire) update and of recomputing the whole field with
+`distance_transform_edt`, and the largest difference between the two.
+
+Then replays the same per-scan change sets into fields of larger maps, where
+the cost of recomputing the field grows with the map while the incremental
+update does not, and times single (`distance_at`) and batch (`get_distance`)
+lookups.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_distance_field.py
+'''
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from slam import SLAM, DistanceField, OCCUPIED_PROB
+from bench_slam_icp import simulated_scans
+
+MAX_DIST = 1.0  #m
+
+
+def record(poses, scans):
+    '''Map the scans, timing and recording every update of the distance field'''
+    slam = SLAM(icp_method='point_to_line', distance_field_max_m=MAX_DIST)
+    slam.pose[:] = poses[0]
+    field = slam._distance
+    update = field.update
+    changes, times = [], []
+
+    def timed_update(rows, cols, occupied):
+        i0, _, j0, _ = field.extent
+        flips = np.sum(field.occupied[rows - i0, cols - j0] != occupied)
+        changes.append((field.extent, rows.copy(), cols.copy(), occupied.copy(), flips))
+        start = time.perf_counter()
+        changed = update(rows, cols, occupied)
+        times.append(time.perf_counter() - start)
+        return changed
+
+    field.update = timed_update
+    for points in scans:
+        slam.process_scan(points)
+    return slam, changes, np.array(times)
+
+
+def full_recompute(slam):
+    occupied = slam.get_map_prob() > OCCUPIED_PROB
+    start = time.perf_counter()
+    field = DistanceField(slam.resolution, slam.get_map_extent(), MAX_DIST)
+    field.reset(occupied, slam.get_map_extent())
+    return time.perf_counter() - start, field
+
+
+def main():
+    poses, scans = simulated_scans(n=200, step=0.04)
+    slam, changes, times = record(poses, scans)
+    touched = np.mean([len(c[1]) for c in changes])
+    flips = np.mean([c[4] for c in changes])
+    full, exact = full_recompute(slam)
+    error = np.abs(exact.get() - slam.get_distance_map()).max()
+    shape = slam.get_map_prob().shape
+    print('corridor map %dx%d cells: %.0f cells updated and %.1f flipped per scan, '
+          '%.0f distances changed per scan' % (shape + (touched, flips, slam._distance.updates / len(changes))))
+    print('  incremental update  mean %6.2f ms  p95 %6.2f ms' %
+          (1e3*times.mean(), 1e3*np.percentile(times, 95)))
+    print('  full recomputation       %6.2f ms    largest difference %.2g m' % (1e3*full, error))
+    print()
+
+    i0, i1, j0, j1 = slam.get_map_extent()
+    for side in (25, 50, 100):
+        cells = int(side / slam.resolution)
+        extent = (i0, max(i1, i0 + cells), j0, max(j1, j0 + cells))
+        field = DistanceField(slam.resolution, extent, MAX_DIST)
+        start = time.perf_counter()
+        for _, rows, cols, occupied, _ in changes:
+            field.update(rows, cols, occupied)
+        incremental = (time.perf_counter() - start) / len(changes)
+        start = time.perf_counter()
+        field.reset(field.occupied, extent)
+        recompute = time.perf_counter() - start
+        print('%3d x %3d m map  incremental %6.2f ms/scan  full recomputation %7.2f ms/scan  (%.0fx)' %
+              (side, side, 1e3*incremental, 1e3*recompute, recompute / incremental))
+    print()
+
+    rng = np.random.default_rng(0)
+    xy = np.column_stack((rng.uniform(-8, 8, 10000), rng.uniform(-2, 2, 10000)))
+    start = time.perf_counter()
+    for x, y in xy[:1000]:
+        slam.distance_at(x, y)
+    single = (time.perf_counter() - start) / 1000
+    start = time.perf_counter()
+    slam.get_distance(xy)
+    batch = time.perf_counter() - start
+    print('distance_at %.2f us per point, get_distance of %d points %.2f ms (%.3f us per point)' %
+          (1e6*single, len(xy), 1e3*batch, 1e6*batch/len(xy)))
+
+
+if __name__ == '__main__':
+    main()
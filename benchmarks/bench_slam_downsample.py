@@ -0,0 +1,77 @@
+'''Benchmark of scan downsampling ahead of ICP in SLAM.
+
+Runs `SLAM.process_scan` with point-to-line ICP over a simulated robot
+driving down a corridor lined with shelves and cluttered with small boxes
+close to its path, with the full scans, voxel downsampled scans and
+downsampled scans with a point budget, and reports points matched per scan,
+ICP and `process_scan` time and the final pose error.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_downsample.py
+'''
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx.simulator import FakeHokuyo, box_world
+from slam import SLAM, polar_to_cartesian
+from bench_slam_icp import shelves
+
+SETTINGS = [
+    ('full scans', dict(downsample_leaf_m=0)),
+    ('leaf 0.05 m', dict(downsample_leaf_m=0.05)),
+    ('leaf 0.02 m, 250 points', dict(downsample_leaf_m=0.02,
+                                     downsample_max_points=250)),
+]
+
+
+def boxes(n, seed=1, size=0.08):
+    rng = np.random.default_rng(seed)
+    ys = rng.choice([-1, 1], n)*rng.uniform(0.6, 1.2, n)
+    for x, y in zip(rng.uniform(-9, 9, n), ys):
+        yield [(x, y), (x + size, y), (x + size, y + size), (x, y + size)]
+
+
+def cluttered_scans(n=120, step=0.08):
+    world = box_world(20, 4, list(shelves(20, 1.4)) + list(shelves(20, -1.8)) +
+                      list(boxes(60)))
+    sim = FakeHokuyo(world, noise=10)
+    angles = sim.get_angles()
+    poses = [(-7 + step*k, 0.1*np.sin(0.1*k), 0.05*np.sin(0.07*k))
+             for k in range(n)]
+    scans = []
+    for pose in poses:
+        sim.pose = pose
+        ranges = sim.measure(False).astype(float)
+        keep = (ranges > 20) & (ranges < 10000)
+        scans.append(polar_to_cartesian(angles[keep], ranges[keep]))
+    return poses, scans
+
+
+def main():
+    poses, scans = cluttered_scans()
+    for name, kwargs in SETTINGS:
+        slam = SLAM(icp_method='point_to_line', **kwargs)
+        slam.pose[:] = poses[0]
+        points, icp_ms = [], []
+        total = 0.
+        for pts in scans:
+            start = time.perf_counter()
+            slam.process_scan(pts)
+            total += time.perf_counter() - start
+            if slam.last_icp:
+                points.append(slam.last_icp['points'])
+                icp_ms.append(slam.last_icp['time_ms'])
+                slam.last_icp = {}
+        error = np.hypot(*(slam.pose[:2] - poses[-1][:2]))
+        print('%-24s  %4d of %4d points  ICP %6.2f ms  process_scan %6.2f ms  '
+              'final pose error %5.1f mm' %
+              (name, np.mean(points), np.mean([len(s) for s in scans]),
+               np.mean(icp_ms), 1e3*total/len(scans), 1e3*error))
+
+
+if __name__ == '__main__':
+    main()
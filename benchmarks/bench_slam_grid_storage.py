@@ -0,0 +1,63 @@
+'''Benchmark of the occupancy grid storage modes of SLAM.
+
+For several resolutions compares memory of the map tiles and speed of
+`update_map` and `get_map_prob` with `float64`, `int16` (fixed-point
+log-odds) and `uint8` (hit/miss update tables) storage, and the mean and
+largest difference of the resulting probability maps from `float64`.
+`uint8` applies at most one update per cell and scan, so cells both hit and
+crossed by rays in one scan differ most.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_grid_storage.py
+'''
+import os
+import sys
+import timeit
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from slam import SLAM, GRID_DTYPES
+from bench_slam_update_map import scan_points
+
+POSES = [(0.5 * np.cos(a), 0.5 * np.sin(a), a) for a in np.linspace(0, 6, 12)]
+
+
+def build(resolution, dtype, scans):
+    slam = SLAM(resolution=resolution, grid_dtype=dtype)
+    for pose, points in scans:
+        slam.pose[:] = pose
+        slam.update_map(points)
+    return slam
+
+
+def full_prob(slam):
+    '''get_map_prob with every tile stale'''
+    slam.map_version += 1
+    for key in slam._tile_versions:
+        slam._tile_versions[key] = slam.map_version
+    return slam.get_map_prob()
+
+
+def main():
+    scans = [(pose, scan_points(pose)) for pose in POSES]
+    for resolution in (0.05, 0.025, 0.01):
+        reference = None
+        for dtype in GRID_DTYPES:
+            t_update = min(timeit.repeat(lambda: build(resolution, dtype, scans),
+                                         number=1, repeat=3)) / len(scans)
+            slam = build(resolution, dtype, scans)
+            prob = slam.get_map_prob()
+            if reference is None:
+                reference = prob
+            t_prob = min(timeit.repeat(lambda: full_prob(slam), number=1,
+                                       repeat=3))
+            diff = np.abs(prob - reference)
+            print('res %.3f m  %-7s tiles %6.1f MB  update %6.2f ms/scan  '
+                  'full get_map_prob %6.2f ms  |dp| mean %.4f max %.4f' %
+                  (resolution, dtype, slam.map_nbytes() / 1e6, t_update * 1e3,
+                   t_prob * 1e3, diff.mean(), diff.max()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+'''Benchmark of the scan matchers of SLAM.
+
+Runs `SLAM.process_scan` with point-to-point and point-to-line ICP over the
+same scans and reports ICP iterations, final residual, ICP and whole
+`process_scan` time per scan and, for simulated scans, the final pose error.
+Scans come from a scan log recorded with `hokuyolx.recording.ScanRecorder`
+if one is given, otherwise from a simulated robot driving down a corridor
+lined with shelves, where point-to-point ICP converges slowly.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_icp.py [scan_log.hkl]
+'''
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx.recording import ReplayLaser
+from hokuyolx.simulator import FakeHokuyo, box_world
+from slam import SLAM, ICP_METHODS, polar_to_cartesian
+
+
+def shelves(length, offset, depth=0.4, size=1.2, gap=0.6):
+    '''Rectangular shelves along one wall of the corridor'''
+    x = -length/2 + gap
+    while x + size < length/2:
+        yield [(x, offset), (x + size, offset), (x + size, offset + depth),
+               (x, offset + depth)]
+        x += size + gap
+
+
+def simulated_scans(n=80, step=0.08):
+    world = box_world(20, 4, list(shelves(20, 1.4)) + list(shelves(20, -1.8)))
+    sim = FakeHokuyo(world, noise=10)
+    angles = sim.get_angles()
+    poses = [(-7 + step*k, 0.2*np.sin(0.1*k), 0.05*np.sin(0.07*k))
+             for k in range(n)]
+    scans = []
+    for pose in poses:
+        sim.pose = pose
+        ranges = sim.measure(False).astype(float)
+        keep = (ranges > 20) & (ranges < 10000)
+        scans.append(polar_to_cartesian(angles[keep], ranges[keep]))
+    return poses, scans
+
+
+def logged_scans(path):
+    laser = ReplayLaser(path)
+    slam = SLAM()
+    scans = [slam.get_scan_points(laser) for _ in range(len(laser))]
+    laser.close()
+    return None, scans
+
+
+def main():
+    poses, scans = (logged_scans(sys.argv[1]) if len(sys.argv) > 1
+                    else simulated_scans())
+    for method in ICP_METHODS:
+        slam = SLAM(icp_method=method)
+        if poses is not None:
+            slam.pose[:] = poses[0]
+        stats = []
+        total = 0.
+        for points in scans:
+            start = time.perf_counter()
+            slam.process_scan(points)
+            total += time.perf_counter() - start
+            if slam.last_icp:
+                stats.append((slam.last_icp['iterations'],
+                              slam.last_icp['residual'],
+                              slam.last_icp['time_ms']))
+                slam.last_icp = {}
+        it, res, ms = np.array(stats).T
+        line = ('%-14s  %3d scans  iterations mean %5.1f max %2d  '
+                'residual %5.1f mm  ICP %6.2f ms  process_scan %6.2f ms' %
+                (method, len(scans), it.mean(), it.max(), 1e3*np.nanmean(res),
+                 ms.mean(), 1e3*total/len(scans)))
+        if poses is not None:
+            error = np.hypot(*(slam.pose[:2] - poses[-1][:2]))
+            line += '  final pose error %5.1f mm' % (1e3*error)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+'''Benchmark of the wheel odometry motion prior in SLAM.
+
+Simulates the robot of `explore_waypoints` in the shelf-lined corridor of
+`bench_slam_icp.py`: it drives random `drive_xy` commands for 0.2 s each and
+takes a scan every 10 commands. The simulated chassis moves with gains that
+differ from the nominal ones of `odometry.DEFAULT_GAINS`, plus noise.
+
+Runs `SLAM.process_scan` with point-to-line ICP without a motion prior,
+with the nominal model and with a model calibrated on a first run, and
+reports ICP iterations, failed or rejected matches and the largest pose
+error along the run.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_odometry.py
+'''
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx.simulator import FakeHokuyo, box_world
+from odometry import MecanumMotionModel, compose
+from slam import SLAM, polar_to_cartesian
+from bench_slam_icp import shelves
+
+TRUE_GAINS = (0.0013, -0.0008, 0.0065)
+DURATION = 0.2
+COMMANDS_PER_SCAN = 10
+
+
+def run(seed, n=60):
+    '''Commands driven between scans, scans and true poses of a simulated run'''
+    world = box_world(20, 4, list(shelves(20, 1.4)) + list(shelves(20, -1.8)))
+    sim = FakeHokuyo(world, noise=10)
+    angles = sim.get_angles()
+    rng = np.random.default_rng(seed)
+    truth = MecanumMotionModel(TRUE_GAINS)
+    pose = (-6., 0., 0.)
+    steps = []
+    for k in range(n):
+        commands = []
+        if k:
+            for _ in range(COMMANDS_PER_SCAN):
+                cmd = (int(rng.choice([0, 40, 50])), int(rng.choice([0, 0, -40, 40])),
+                       int(rng.choice([0, 30, -30, 40, -40])))
+                commands.append(cmd)
+                delta = truth.predict_delta(*cmd, DURATION)
+                delta = np.array(delta) * rng.normal(1, 0.1, 3)
+                pose = compose(pose, delta)
+            if abs(pose[1]) > 0.8:
+                pose = (pose[0], 0.8*np.sign(pose[1]), pose[2])
+        sim.pose = pose
+        ranges = sim.measure(False).astype(float)
+        keep = (ranges > 20) & (ranges < 10000)
+        steps.append((commands, polar_to_cartesian(angles[keep], ranges[keep]), pose))
+    return steps
+
+
+def replay(steps, model):
+    slam = SLAM(icp_method='point_to_line', motion_model=model)
+    slam.pose[:] = steps[0][2]
+    iterations, failed, errors = [], 0, []
+    for commands, points, pose in steps:
+        if model is not None:
+            for cmd in commands:
+                model.command(*cmd, DURATION)
+        failed += not slam.process_scan(points)
+        if slam.last_icp:
+            iterations.append(slam.last_icp.get('iterations', 0))
+            slam.last_icp = {}
+        errors.append(np.hypot(*(slam.pose[:2] - pose[:2])))
+    return np.mean(iterations), failed, slam.odometry_rejections, max(errors)
+
+
+def main():
+    calibrated = MecanumMotionModel()
+    replay(run(1), calibrated)
+    result = calibrated.calibrate()
+    print('calibrated gains %s from %d samples (true %s)' %
+          (np.round(result['gains'], 5), result['samples'], TRUE_GAINS))
+    calibrated.samples = []
+    steps = run(2)
+    for name, model in (('no motion prior', None),
+                        ('nominal gains', MecanumMotionModel()),
+                        ('calibrated gains', calibrated)):
+        it, failed, rejected, error = replay(steps, model)
+        print('%-17s  ICP iterations %5.1f  failed %2d (odometry gate %2d) of %d  '
+              'max pose error %7.1f mm' % (name, it, failed, rejected, len(steps),
+                                           1e3*error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+'''Benchmark of the pose graph back-end of SLAM.
+
+Simulates two laps around a block in the middle of a room with pillars,
+seen by a lidar whose angular step is 2% off, so that scan matching drifts
+along the first lap. Runs `SLAM.process_scan` with and without
+`pose_graph=True` and reports loop closures, optimizations adopted, the
+largest pose error on the second lap and the final pose error.
+
+Then times `PoseGraph.optimize` on synthetic graphs of thousands of
+keyframes driving a loop over and over with noisy odometry edges and a
+loop closure every 10 keyframes.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_pose_graph.py
+'''
+import math
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx.simulator import FakeHokuyo, box_world
+from odometry import compose, relative_pose
+from pose_graph import PoseGraph
+from slam import SLAM, polar_to_cartesian
+
+ANGLE_SCALE = 1.02  #lidar angular step error driving the drift
+
+
+def square(x, y, size=0.3):
+    return [(x, y), (x + size, y), (x + size, y + size), (x, y + size)]
+
+
+def loop_scans(laps=2, step=0.1):
+    '''True poses and scans along an ellipse around the block'''
+    pillars = [square(x, y) for x in (-5, -2, 1, 4) for y in (-3.5, 3.2)]
+    block = [(-3, -1.2), (3, -1.2), (3, 1.2), (-3, 1.2)]
+    world = box_world(12, 8, [block] + pillars)
+    sim = FakeHokuyo(world, noise=10, seed=0)
+    angles = sim.get_angles()
+    a, b = 4.8, 2.6
+    n = int(laps * 2 * math.pi * math.sqrt((a*a + b*b) / 2) / step)
+    poses, scans = [], []
+    for k in range(n):
+        t = 2 * math.pi * laps * k / n
+        pose = (a * math.cos(t), b * math.sin(t), math.atan2(b * math.cos(t), -a * math.sin(t)))
+        sim.pose = pose
+        ranges = sim.measure(False).astype(float)
+        keep = (ranges > 20) & (ranges < 10000)
+        poses.append(pose)
+        scans.append(polar_to_cartesian(ANGLE_SCALE*angles[keep], ranges[keep]))
+    return poses, scans
+
+
+def replay(poses, scans, pose_graph):
+    slam = SLAM(icp_method='point_to_line', pose_graph=pose_graph)
+    slam.pose[:] = poses[0]
+    errors = []
+    start = time.perf_counter()
+    for pose, points in zip(poses, scans):
+        slam.process_scan(points)
+        errors.append(np.hypot(*(slam.pose[:2] - pose[:2])))
+    elapsed = time.perf_counter() - start
+    slam.flush_pose_graph()
+    final = np.hypot(*(slam.pose[:2] - poses[-1][:2]))
+    return slam, max(errors[len(errors)//2:]), final, elapsed
+
+
+def synthetic_graph(n, seed=0):
+    '''Graph of n keyframes on a circle of 200 keyframes per lap'''
+    rng = np.random.default_rng(seed)
+    truth = [(0., 0., 0.)]
+    for _ in range(1, n):
+        truth.append(compose(truth[-1], (0.2, 0., 2*math.pi/200)))
+    graph = PoseGraph()
+    graph.add_node(truth[0])
+    for k in range(1, n):
+        z = np.array(relative_pose(truth[k-1], truth[k])) + rng.normal(0, [0.02, 0.02, 0.01])
+        graph.add_node(compose(tuple(graph.poses[-1]), z))
+        graph.add_edge(k - 1, k, z)
+    for k in range(200, n, 10):
+        graph.add_edge(k - 200, k, relative_pose(truth[k - 200], truth[k]), loop=True)
+    return graph, np.array(truth)
+
+
+def main():
+    poses, scans = loop_scans()
+    for name, pose_graph in (('front-end only', False), ('pose graph', True)):
+        slam, max_error, final, elapsed = replay(poses, scans, pose_graph)
+        print('%-14s  %d scans in %5.2f s  loop closures %3d  optimizations %2d  '
+              'max pose error (2nd lap) %6.1f mm  final %6.1f mm' %
+              (name, len(scans), elapsed, slam.loop_closures, slam.graph_optimizations,
+               1e3*max_error, 1e3*final))
+    print()
+    for n in (1000, 2000, 5000):
+        graph, truth = synthetic_graph(n)
+        before = np.max(np.hypot(*(graph.poses[:, :2] - truth[:, :2]).T))
+        start = time.perf_counter()
+        stats = graph.optimize()
+        elapsed = time.perf_counter() - start
+        after = np.max(np.hypot(*(graph.poses[:, :2] - truth[:, :2]).T))
+        print('%5d keyframes %5d edges  %2d iterations  %6.1f ms  max error %6.0f -> %4.0f mm' %
+              (n, graph.num_edges, stats['iterations'], 1e3*elapsed, 1e3*before, 1e3*after))
+
+
+if __name__ == '__main__':
+    main()
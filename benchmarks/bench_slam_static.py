@@ -0,0 +1,70 @@
+'''Benchmark of skipping static scans in SLAM.
+
+Simulates the scans `explore_waypoints` hands to SLAM in the shelf-lined
+corridor of `bench_slam_icp.py`: driving, standing still (waypoint pauses
+and the stop after every move), creeping a few millimeters per scan and
+turning in place. Runs `SLAM.process_scan` with point-to-line ICP with and
+without `static_threshold_m` and reports the scans processed and skipped,
+the total processing time and the largest pose error.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_static.py
+'''
+import math
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx.simulator import FakeHokuyo, box_world
+from slam import SLAM, polar_to_cartesian
+from bench_slam_icp import shelves
+
+
+def stop_and_go_scans():
+    '''True poses and scans of a run that stands still half of the time'''
+    world = box_world(20, 4, list(shelves(20, 1.4)) + list(shelves(20, -1.8)))
+    sim = FakeHokuyo(world, noise=10, seed=0)
+    angles = sim.get_angles()
+    x, theta = -7., 0.
+    poses = []
+    for phase in range(6):
+        for _ in range(20):  #driving
+            x += 0.08
+            poses.append((x, 0., theta))
+        poses += [(x, 0., theta)] * 40  #standing still
+        for _ in range(20):  #creeping
+            x += 0.003
+            poses.append((x, 0., theta))
+        for _ in range(10):  #turning in place and back
+            theta += math.radians(3) * (1 if phase % 2 else -1)
+            poses.append((x, 0., theta))
+    scans = []
+    for pose in poses:
+        sim.pose = pose
+        ranges = sim.measure(False).astype(float)
+        keep = (ranges > 20) & (ranges < 10000)
+        scans.append(polar_to_cartesian(angles[keep], ranges[keep]))
+    return poses, scans
+
+
+def main():
+    poses, scans = stop_and_go_scans()
+    for name, threshold in (('every scan', None), ('static skipped', 0.02)):
+        slam = SLAM(icp_method='point_to_line', static_threshold_m=threshold)
+        slam.pose[:] = poses[0]
+        errors = []
+        start = time.perf_counter()
+        for pose, points in zip(poses, scans):
+            slam.process_scan(points)
+            errors.append(np.hypot(*(slam.pose[:2] - pose[:2])))
+        elapsed = time.perf_counter() - start
+        print('%-14s  processed %3d  skipped %3d  %6.2f s (%5.1f ms/scan)  max pose error %5.1f mm' %
+              (name, slam.scans_processed, slam.scans_skipped, elapsed,
+               1e3*elapsed/len(scans), 1e3*max(errors)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+'''Benchmark of scan-to-submap matching in SLAM.
+
+Runs `SLAM.process_scan` over the simulated shelf-lined corridor of
+`bench_slam_icp.py`, matching scans either against the previous scan only or
+against a submap of recent keyframes with a cached KD-tree, and reports time
+per scan, number of KD-tree builds and the pose error (drift) at the end and
+along the run.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_submap.py
+'''
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from slam import SLAM, ICP_METHODS
+from bench_slam_icp import simulated_scans
+
+
+def main():
+    poses, scans = simulated_scans(n=180)
+    for method in ICP_METHODS:
+        for keyframes in (0, 10):
+            slam = SLAM(icp_method=method, submap_keyframes=keyframes)
+            slam.pose[:] = poses[0]
+            errors = []
+            total = 0.
+            for pose, points in zip(poses, scans):
+                start = time.perf_counter()
+                slam.process_scan(points)
+                total += time.perf_counter() - start
+                errors.append(np.hypot(*(slam.pose[:2] - pose[:2])))
+            builds = slam._submap.rebuilds if slam._submap else len(scans) - 1
+            print('%-14s  %-22s  process_scan %6.2f ms  KD-tree builds %3d  '
+                  'pose error final %6.1f mm  max %6.1f mm' %
+                  (method, 'submap of %d keyframes' % keyframes if keyframes
+                   else 'previous scan', 1e3*total/len(scans), builds,
+                   1e3*errors[-1], 1e3*max(errors)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+'''Benchmark of the memory of the tiled SLAM map on a long run.
+
+Drives a simulated robot along a 60x3 m corridor, far out of the initial
+20x20 m map area, and reports the memory held by the map tiles with and
+without spilling idle tiles to disk, against a dense grid of the bounding
+box of the explored area.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_tiled_map.py
+'''
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx.simulator import FakeHokuyo, box_world
+from slam import SLAM, apply_transform, polar_to_cartesian
+
+LENGTH = 60.
+WIDTH = 3.
+
+
+def corridor_scans(step=0.5):
+    sim = FakeHokuyo(box_world(LENGTH, WIDTH))
+    angles = sim.get_angles()
+    for x in np.arange(-LENGTH/2 + 1, LENGTH/2 - 1, step):
+        pose = (x, 0.3*np.sin(x), 0.)
+        sim.pose = pose
+        ranges = sim.measure(False).astype(float)
+        keep = ranges < 10000
+        yield pose, apply_transform(polar_to_cartesian(angles[keep], ranges[keep]), *pose)
+
+
+def main():
+    scans = list(corridor_scans())
+    for resolution in (0.05, 0.025):
+        for max_resident in (None, 24):
+            slam = SLAM(resolution=resolution, max_resident_tiles=max_resident)
+            start = time.perf_counter()
+            for pose, points in scans:
+                slam.pose[:] = pose
+                slam.update_map(points)
+            elapsed = time.perf_counter() - start
+            i0, i1, j0, j1 = slam.get_map_extent()
+            resident, spilled = slam.tile_counts()
+            print('res %.3f m  resident limit %4s  %4d tiles in memory %4d on disk  '
+                  '%6.1f MB  dense bounding box %6.1f MB  update %5.2f ms/scan' %
+                  (resolution, max_resident, resident, spilled,
+                   slam.map_nbytes() / 1e6, (i1 - i0) * (j1 - j0) * 8 / 1e6,
+                   elapsed / len(scans) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
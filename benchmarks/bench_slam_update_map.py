@@ -0,0 +1,83 @@
+'''Benchmark of the occupancy grid update in SLAM.
+
+Compares the vectorized `SLAM.update_map`, which ray-casts every beam, with
+the previous per-cell loop (hits one by one, Bresenham ray-casting of every
+len/50-th beam only) on scans of a simulated 8x6 m room. The vectorized
+update is measured both with rays cast at runtime and with the precomputed
+ray lookup table.
+
+Run from the repository root:
+
+    python benchmarks/bench_slam_update_map.py
+'''
+import os
+import sys
+import timeit
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hokuyolx.simulator import FakeHokuyo, box_world
+from slam import SLAM, _bresenham, apply_transform, polar_to_cartesian
+
+REPEATS = 20
+
+
+def legacy_update_map(slam, grid, points_world):
+    '''update_map as it was before vectorization, on a dense `grid` of the
+    initial map area.'''
+    origin_ij = slam.world_to_cell(slam.pose[:2].reshape(1, 2))[0]
+    hit_ij = slam.world_to_cell(points_world)
+    h, w = grid.shape
+    for i in range(len(points_world)):
+        j, i_ = int(hit_ij[i, 0]), int(hit_ij[i, 1])
+        if 0 <= j < w and 0 <= i_ < h:
+            grid[i_, j] = np.clip(grid[i_, j] + slam.lp_hit,
+                                  slam.log_odds_min, slam.log_odds_max)
+    step = max(1, len(points_world) // 50)
+    for i in range(0, len(points_world), step):
+        j, i_ = int(hit_ij[i, 0]), int(hit_ij[i, 1])
+        origin_j, origin_i = int(origin_ij[0]), int(origin_ij[1])
+        if not (0 <= origin_j < w and 0 <= origin_i < h):
+            continue
+        if not (0 <= j < w and 0 <= i_ < h):
+            continue
+        for (jj, ii) in _bresenham(origin_j, origin_i, j, i_):
+            if 0 <= jj < w and 0 <= ii < h:
+                grid[ii, jj] = np.clip(grid[ii, jj] + slam.lp_miss,
+                                       slam.log_odds_min, slam.log_odds_max)
+
+
+def scan_points(pose):
+    sim = FakeHokuyo(box_world(8, 6, [[(1, 1), (1.5, 1), (1.5, 1.5), (1, 1.5)]]),
+                     pose=pose)
+    angles = sim.get_angles()
+    ranges = sim.measure(False).astype(float)
+    keep = ranges < 10000
+    return apply_transform(polar_to_cartesian(angles[keep], ranges[keep]), *pose)
+
+
+def timed(func):
+    return min(timeit.repeat(func, number=REPEATS, repeat=3)) / REPEATS
+
+
+def main():
+    for resolution in (0.1, 0.05, 0.025):
+        points = scan_points((0.5, -0.5, 0.3))
+        old = SLAM(resolution=resolution)
+        old_grid = old.get_map()
+        cast = SLAM(resolution=resolution, ray_lut_range_m=None)
+        lut = SLAM(resolution=resolution)
+        lut.update_map(points)
+        t_old = timed(lambda: legacy_update_map(old, old_grid, points))
+        t_cast = timed(lambda: cast.update_map(points))
+        t_lut = timed(lambda: lut.update_map(points))
+        print('res %.3f m  %4d beams  legacy %7.2f ms (%5d free cells)  '
+              'runtime rays %6.2f ms (%5d)  ray LUT %6.2f ms (%5d)  x%.1f' %
+              (resolution, len(points), t_old*1e3,
+               np.count_nonzero(old_grid < 0), t_cast*1e3,
+               np.count_nonzero(cast.get_map() < 0), t_lut*1e3,
+               np.count_nonzero(lut.get_map() < 0), t_old/t_lut))
+
+
+if __name__ == '__main__':
+    main()
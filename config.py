@@ -15,10 +15,45 @@ class Config:
         (0.0, 0.0),
     ) #exploration_mode "free" ignores waypoints at runtime
     slam_resolution: float = 0.05
+    slam_grid_dtype: str = "float64" #occupancy grid storage: "float64", "int16" (4x less memory) or "uint8" (8x less memory, coarser log-odds)
+    slam_max_resident_tiles: int = 0 #map tiles (64x64 cells) kept in memory; least recently updated ones are spilled to disk (0 = keep all)
+    slam_tile_spill_dir: str = "" #directory of spilled map tiles (empty = temporary directory)
+    slam_icp_method: str = "point_to_point" #scan matcher: "point_to_point" or "point_to_line" (fewer iterations along walls and corridors)
+    slam_icp_max_iter: int = 20 #ICP iteration limit
+    slam_icp_tol: float = 1e-4 #ICP stops once the pose changes less than this (m, rad) in an iteration
+    slam_submap_keyframes: int = 10 #scans are matched against the last N keyframes (0 = against the previous scan only)
+    slam_submap_voxel_m: float = 0.05 #voxel size used to deduplicate submap points
+    slam_keyframe_distance_m: float = 0.2 #a scan becomes a keyframe after the robot moved this far...
+    slam_keyframe_angle_deg: float = 10.0 #...or turned this much since the last keyframe
+    slam_downsample_leaf_m: float = 0.05 #voxel size of the scan copy ICP matches; the map uses full scans (0 = no downsampling)
+    slam_downsample_max_points: int = 0 #if set, the voxel size grows until scans fit this many points for ICP (0 = no budget)
+    slam_correlative_mode: str = "off" #correlative scan matcher: "off", "init" (initializes ICP, robust to fast turns) or "only"
+    slam_correlative_window_m: float = 0.5 #translation searched by the correlative matcher (+-m)
+    slam_correlative_window_deg: float = 30.0 #rotation searched by the correlative matcher (+-deg)
+    slam_odometry: bool = False #use the drive_xy commands as motion prior (initial guess and outlier gate) for scan matching
+    slam_odometry_gains_path: str = "" #motion model gains fitted by odometry.py (empty = nominal gains)
+    slam_odometry_samples_path: str = "" #if set, calibration samples are appended here after every run
+    slam_pose_graph: bool = False #optimize keyframe poses with loop closures in a background thread and rebuild the map
+    slam_loop_closure_radius_m: float = 2.0 #keyframes this close are checked for loop closure...
+    slam_loop_closure_min_gap: int = 30 #...if at least this many keyframes older
+    slam_static_threshold_m: float = 0.02 #scans that changed less than this since the last processed one are skipped (0 = process all)
+    slam_static_threshold_deg: float = 1.0 #...and only if the odometry motion prior (if used) predicts less rotation than this
+    slam_async_mapping: bool = False #track the pose in a thread at the lidar rate and update the map in another one
+    slam_mapping_queue_size: int = 4 #scans waiting for the mapping thread; the oldest is dropped when full
+    slam_scan_interval: int = 5 #exploration iterations between SLAM updates (without slam_async_mapping)
+    slam_distance_field_max_m: float = 0.0 #keep the distance of every map cell to the nearest obstacle up to this far, updated per scan (0 = off)
+    localization_map_path: str = "" #if set, localize on this map (.npy saved by an earlier run) with a particle filter instead of mapping
+    localization_initial_pose: tuple[float, float, float] | None = (0.0, 0.0, 0.0) #start pose (x m, y m, theta deg) on that map; None = unknown
+    localization_max_particles: int = 5000 #particles while the pose is uncertain; KLD resampling needs far fewer once localized
     map_out_dir: str = "maps"
     map_filename_prefix: str = "lidar_map"
     save_map_npy: bool = True
 
+    #settings for lidar acquisition
+    lidar_streaming: bool = True #read scans continuously in a background thread instead of requesting each scan (get_filtered_dist returns the latest scan immediately)
+    lidar_bus_name: str = "" #if set, read scans from the shared memory bus with this name (started by python -m hokuyolx.bus) instead of connecting to the lidar, so other programs can use the lidar at the same time
+    scan_log_path: str = "" #if set, every scan used by SLAM is appended to this binary log (replay it with hokuyolx.recording.ReplayLaser)
+
     #settings for lidar obstacle avoidance
     lidar_mask_angle_intervals_deg: tuple[tuple[float, float], ...] = () #sets the angle intervals to mask for obstacle avoidance (e.g. range where the arm/chassis of robot is to avoid sensing itself)
     lidar_forward_cone_half_width_deg: float = 40.0 #sets the width of the forward cone for obstacle avoidance
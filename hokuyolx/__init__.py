@@ -16,7 +16,30 @@ Usage example:
 >>> # Continous measurment mode
 >>> for timestamp, scan in laser.iter_dist(10):
 ...     print(timestamp)
+>>> # Background continous measurment
+>>> laser.start_stream()
+>>> seq, timestamp, scan = laser.wait_next_scan()
+>>> seq, timestamp, scan = laser.get_latest_scan(max_age_ms=100)
+>>> laser.stop_stream()
+
+The same interface is available for `asyncio` code:
+
+>>> from hokuyolx import AsyncHokuyoLX
+>>> laser = await AsyncHokuyoLX.create()
+>>> timestamp, scan = await laser.get_dist()
+>>> async for scan, timestamp, pending in laser.iter_dist(10):
+...     print(timestamp)
+
+For testing without the sensor `hokuyolx.simulator.FakeHokuyo` provides a local
+stand-in speaking the same protocol. Scans can be recorded into binary logs
+with `hokuyolx.recording.ScanRecorder` and replayed later through
+`hokuyolx.recording.ReplayLaser`, which has the same measurment methods.
+To share one sensor between several processes `hokuyolx.bus.ScanPublisher`
+writes scans into shared memory, where `hokuyolx.bus.ScanSubscriber` instances
+read them.
 
 For further information please refer to HokuyoLX class documentation
 '''
 from .hokuyo import HokuyoLX
+from .aio import AsyncHokuyoLX
+from .recording import ScanRecorder, ReplayLaser
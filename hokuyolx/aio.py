@@ -0,0 +1,600 @@
+'''AsyncHokuyoLX class code'''
+import asyncio
+import collections
+import logging
+import time
+from codecs import encode, decode
+from .hokuyo import HokuyoLX
+from .clock import SensorClock
+from .exceptions import HokuyoException, HokuyoStatusException
+from .statuses import activation_statuses, laser_states, tsync_statuses
+
+
+def _split_frame(frame, nlines=None):
+    '''Splits message (without the terminating line feed) into decoded lines.
+    If `nlines` is given only the first `nlines` lines are decoded and the
+    rest of the message is appended to the list as raw bytes.'''
+    if nlines is None:
+        return decode(frame[:-1], 'ascii').split('\n')
+    lines = []
+    pos = 0
+    while pos < len(frame) and len(lines) < nlines:
+        eol = frame.index(b'\n', pos)
+        lines.append(decode(frame[pos:eol], 'ascii'))
+        pos = eol + 1
+    lines.append(frame[pos:])
+    return lines
+
+
+class _ScanStream(object):
+    '''Continuous measurment shared by all of its subscribers'''
+
+    def __init__(self, prefix, with_intensity):
+        self.prefix = prefix
+        self.with_intensity = with_intensity
+        self.queues = set()
+
+
+class AsyncHokuyoLX(object):
+    '''Class for working with Hokuyo laser rangefinders from `asyncio` code.
+    It offers the same methods as `HokuyoLX`, but all of the methods which
+    communicate with the sensor are coroutines and the continuous measurment
+    generators are async generators.
+
+    All replies from the sensor are read by a single reader task, which
+    routes them to the awaiting requests. Continuous measurments with the same
+    parameters started by several consumers share one `MD`/`ME` stream, every
+    scan is read and decoded once and delivered to all of them.
+
+    Examples
+    --------
+    >>> laser = await AsyncHokuyoLX.create()
+    >>> timestamp, scan = await laser.get_filtered_dist()
+    >>> async for scan, timestamp, pending in laser.iter_dist(10):
+    ...     print(timestamp)
+    >>> await laser.close()
+    '''
+
+    addr = HokuyoLX.addr #: IP address and port of the scanner
+    dmin = HokuyoLX.dmin #: Minimum measurable distance (in millimeters)
+    dmax = HokuyoLX.dmax #: Maximum measurable distance (in millimeters)
+    ares = HokuyoLX.ares #: Angular resolution
+    amin = HokuyoLX.amin #: Minimum step number of the scanning area
+    amax = HokuyoLX.amax #: Maximum step number of the scanning area
+    aforw = HokuyoLX.aforw #: Step number of the front direction
+    scan_freq = HokuyoLX.scan_freq #: Scanning frequency in Hz
+    model = HokuyoLX.model #: Sensor model
+    clock = None #: Model of the sensor clock (`SensorClock` instance)
+    convert_time = True #: To convert timestamps to UNIX time or not?
+
+    _reader = None #: asyncio stream reader of the connection
+    _writer = None #: asyncio stream writer of the connection
+    _read_task = None #: Task routing recieved messages
+    _stream = None #: Currently running shared continuous measurment
+    _logger = None #: Logger instance for performing logging operations
+    _angles = None #: Cache of angle tables: (sensor parameters, tables)
+
+    _check_sum = staticmethod(HokuyoLX._check_sum)
+    _convert2int = staticmethod(HokuyoLX._convert2int)
+    _decode_scan = staticmethod(HokuyoLX._decode_scan)
+    _process_scan_data = HokuyoLX._process_scan_data
+    _process_info_line = HokuyoLX._process_info_line
+    _filter = HokuyoLX._filter
+    get_angles = HokuyoLX.get_angles
+    #clock-backed properties, shared with HokuyoLX
+    tzero = HokuyoLX.tzero
+    tn = HokuyoLX.tn
+
+    def __init__(self, addr=None, timeout=5, time_tolerance=300, logger=None,
+                 convert_time=True, queue_size=2):
+        '''Creates new object for communications with the sensor. Connection
+        is established by `connect`, or use `create` to do both at once.
+
+        Parameters
+        ----------
+        addr : tuple, optional
+            IP address and port of the sensor (the default is
+            `('192.168.0.10', 10940)`)
+        timeout : int, optional
+            Timeout limit for replies from the sensor in seconds
+            (the default is 5)
+        time_tolerance : int, optinal
+            Error of the clock model in milliseconds after which it is
+            anchored again to the recieved scans (the default is 300)
+        logger : `logging._logger` instance, optional
+            Logger instance, if none is provided new instance is created
+        convert_time : bool
+            Convert timestamps to UNIX time?
+        queue_size : int, optional
+            Number of scans buffered for each continuous measurment consumer,
+            the oldest scan is dropped when a consumer falls behind
+            (the default is 2)
+        '''
+        super(AsyncHokuyoLX, self).__init__()
+        if addr is not None:
+            self.addr = addr
+        self.timeout = timeout
+        self.time_tolerance = time_tolerance
+        self.convert_time = convert_time
+        self.queue_size = queue_size
+        self._logger = logging.getLogger('hokuyo') if logger is None else logger
+        self.clock = SensorClock(time_tolerance)
+        self._pending = {}
+        self._stream_lock = None
+
+    @classmethod
+    async def create(cls, activate=True, info=True, tsync=True, **kwargs):
+        '''Creates new object and connects to the sensor, keyword arguments
+        are passed to the constructor. See `connect` for other parameters.'''
+        laser = cls(**kwargs)
+        await laser.connect(activate, info, tsync)
+        return laser
+
+    async def connect(self, activate=True, info=True, tsync=True):
+        '''Connects to the sensor and prepares it for measurments.
+
+        Parameters
+        ----------
+        activate : bool, optional
+            Switch sensor to the measurement state? (the default is True)
+        info : bool, optional
+            Update sensor information? (the default is True)
+        tsync : bool, optional
+            Perform time synchronization? (the default is True)
+        '''
+        self._logger.info('Connecting to the laser')
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(*self.addr), self.timeout)
+        except (asyncio.TimeoutError, OSError):
+            raise HokuyoException('Failed to connect to the sensor')
+        self._stream_lock = asyncio.Lock()
+        self._read_task = asyncio.ensure_future(self._read_loop())
+        if tsync:
+            await self.time_sync()
+        if info:
+            await self.update_info()
+        if activate:
+            await self.activate()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    #Low-level data converting and checking
+
+    def _convert2ts(self, chars, convert=None):
+        '''Converts sensor timestamp in the form of chars to the UNIX
+        timestamp using the clock model, see `HokuyoLX._convert2ts`'''
+        ts = self._convert2int(self._check_sum(chars))
+        if not (self.convert_time if convert is None else convert):
+            return ts
+        s = self.clock.unwrap(ts)
+        error = self.clock.update(s, time.time()*1000)
+        if error is not None:
+            self._logger.warning('Time difference %d ms is too big, '
+                                 'clock model was adjusted', error)
+        return self.clock.to_local(s)
+
+    #Low level connection methods
+
+    def _fail_all(self, exc):
+        '''Passes exception to all awaiting requests and stream consumers'''
+        for waiters in self._pending.values():
+            for fut in waiters:
+                if not fut.done():
+                    fut.set_exception(exc)
+        self._pending.clear()
+        if self._stream is not None:
+            for queue in self._stream.queues:
+                self._put_latest(queue, exc)
+
+    async def _read_loop(self):
+        '''Reads messages from the sensor and routes them either to the
+        awaiting request with the same header or to the running continuous
+        measurment'''
+        exc = HokuyoException('Connection closed')
+        try:
+            while True:
+                frame = (await self._reader.readuntil(b'\n\n'))[:-1]
+                eol = frame.index(b'\n')
+                header = decode(frame[:eol], 'ascii')
+                body = frame[eol + 1:]
+                waiters = self._pending.get(header)
+                if waiters:
+                    fut = waiters.popleft()
+                    if not waiters:
+                        del self._pending[header]
+                    if not fut.done():
+                        fut.set_result(body)
+                    continue
+                stream = self._stream
+                if (stream is not None and header.startswith(stream.prefix)
+                        and len(header) == len(stream.prefix) + 2):
+                    self._dispatch_scan(stream, header, body)
+                    continue
+                self._logger.debug('Discarded message with unexpected '
+                                   'header: %s', header)
+        except asyncio.CancelledError:
+            raise
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            self._logger.info('Connection to the sensor lost: %s', e)
+            exc = HokuyoException('Connection closed by the sensor')
+        except Exception as e:
+            self._logger.error('Failed to process message: %s', e)
+            exc = e
+        finally:
+            self._fail_all(exc)
+
+    def _dispatch_scan(self, stream, header, body):
+        '''Decodes scan message once and delivers it to all consumers'''
+        status_line, ts_line, data = _split_frame(body, 2)
+        try:
+            status = self._check_sum(status_line)
+            if status == '0M':
+                self._logger.warning('Unstable scanner condition')
+                return
+            elif status != '99':
+                raise HokuyoStatusException(status)
+            timestamp = self._convert2ts(ts_line)
+            scan = self._process_scan_data(data, stream.with_intensity)
+            item = (scan, timestamp)
+        except HokuyoException as e:
+            item = e
+        for queue in stream.queues:
+            self._put_latest(queue, item)
+
+    @staticmethod
+    def _put_latest(queue, item):
+        '''Puts item into the queue dropping the oldest one if it is full'''
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(item)
+
+    def _send_cmd(self, cmd, params='', string=''):
+        '''Sends given command to the sensor'''
+        if not (len(cmd) == 2 or (cmd[0] == '%' and len(cmd) == 3)):
+            raise HokuyoException(
+                'Command must be two chars string '
+                'or three chars starting with %%, got %d chars' % len(cmd))
+        self._logger.debug(
+            'Sending command to the sensor; '
+            'cmd: %s, params: %s, string: %s', cmd, params, string)
+        req = cmd + params
+        if string:
+            req += ';' + string
+        if self._writer is None or self._read_task.done():
+            raise HokuyoException('Not connected to the laser')
+        self._writer.write(encode(req, 'ascii') + b'\n')
+        return req
+
+    async def _send_req(self, cmd, params='', string='', nlines=None):
+        '''Sends given command to the sensor and awaits response to it.
+        If `nlines` is given only the first `nlines` lines of the response
+        (counting the status line) are decoded, see `_split_frame`.'''
+        req = cmd + params + (';' + string if string else '')
+        fut = asyncio.get_running_loop().create_future()
+        waiters = self._pending.setdefault(req, collections.deque())
+        waiters.append(fut)
+        try:
+            self._send_cmd(cmd, params, string)
+            await self._writer.drain()
+            body = await asyncio.wait_for(fut, self.timeout)
+        except asyncio.TimeoutError:
+            raise HokuyoException('Connection timeout')
+        finally:
+            if fut in waiters:
+                waiters.remove(fut)
+                if not waiters and self._pending.get(req) is waiters:
+                    del self._pending[req]
+        resp = _split_frame(body, nlines)
+        status = self._check_sum(resp.pop(0))
+        self._logger.debug('Got response with status %s', status)
+        return status, resp
+
+    #Control of sensor state
+
+    async def _force_standby(self):
+        '''Forces standby state, if it unable to do it throws an exception'''
+        state, description = await self.laser_state()
+        if state in (3, 4, 5):
+            await self.standby()
+        elif state == 2:
+            await self.tsync_exit()
+        elif state != 0:
+            raise HokuyoException('Unexpected laser state: %s' % description)
+
+    async def activate(self):
+        '''Switches the sensor to the measurement state, see
+        `HokuyoLX.activate`'''
+        self._logger.info('Activating sensor')
+        status, _ = await self._send_req('BM')
+        if status not in activation_statuses:
+            raise HokuyoStatusException(status)
+        return int(status), activation_statuses[status]
+
+    async def standby(self):
+        '''Switches the sensor to the standby state, see
+        `HokuyoLX.standby`'''
+        self._logger.info('Switching sensor to the standby state')
+        status, _ = await self._send_req('QT')
+        if status != '00':
+            raise HokuyoStatusException(status)
+
+    async def sleep(self):
+        '''Switches the sensor to the sleep state, see `HokuyoLX.sleep`'''
+        self._logger.info('Switching sensor to the sleep state')
+        await self._force_standby()
+        status, _ = await self._send_req('%SL')
+        if status != '00':
+            raise HokuyoStatusException(status)
+
+    #Single measurments
+
+    async def _single_measurment(self, with_intensity, start, end, grouping):
+        '''Generic coroutine for taking single measurment.
+        Valid only in the measurment state.'''
+        start = self.amin if start is None else start
+        end = self.amax if end is None else end
+        params = '%0.4d%0.4d%0.2d' % (start, end, grouping)
+        cmd = 'GE' if with_intensity else 'GD'
+        status, data = await self._send_req(cmd, params, nlines=2)
+        if status != '00':
+            raise HokuyoStatusException(status)
+        timestamp = self._convert2ts(data[0])
+        scan = self._process_scan_data(data[1], with_intensity)
+        return timestamp, scan
+
+    async def get_dist(self, start=None, end=None, grouping=0):
+        '''Measure distances for the given parameters, see
+        `HokuyoLX.get_dist`'''
+        return await self._single_measurment(False, start, end, grouping)
+
+    async def get_intens(self, start=None, end=None, grouping=0):
+        '''Measure distances and intensities for the given parameters, see
+        `HokuyoLX.get_intens`'''
+        return await self._single_measurment(True, start, end, grouping)
+
+    async def get_filtered_dist(self, start=None, end=None, grouping=0,
+                                dmin=None, dmax=None, out=None, split=False):
+        '''Measure distances for the given parameters and perform basic
+        filtering, see `HokuyoLX.get_filtered_dist`'''
+        ts, scan = await self.get_dist(start, end, grouping)
+        return ts, self._filter(scan, start, end, grouping, dmin, dmax,
+                                out=out, split=split)
+
+    async def get_filtered_intens(self, start=None, end=None, grouping=0,
+                                  dmin=None, dmax=None, imin=None, imax=None,
+                                  out=None, split=False):
+        '''Measure distances and intensities for the given parameters and
+        perform basic filtering, see `HokuyoLX.get_filtered_intens`'''
+        ts, scan = await self.get_intens(start, end, grouping)
+        return ts, self._filter(scan, start, end, grouping,
+                                dmin, dmax, imin, imax, out, split)
+
+    #Continous measurments
+
+    async def _subscribe(self, with_intensity, start, end, grouping, skips):
+        '''Returns queue of a new consumer of the continuous measurment,
+        starting the measurment if it is not running yet'''
+        start = self.amin if start is None else start
+        end = self.amax if end is None else end
+        cmd = 'ME' if with_intensity else 'MD'
+        prefix = cmd + '%0.4d%0.4d%0.2d%0.1d' % (start, end, grouping, skips)
+        async with self._stream_lock:
+            stream = self._stream
+            if stream is None:
+                self._logger.info('Initializing continous measurment')
+                stream = _ScanStream(prefix, with_intensity)
+                self._stream = stream
+                try:
+                    status, _ = await self._send_req(prefix[:2], prefix[2:] +
+                                                     '00')
+                    if status != '00':
+                        raise HokuyoStatusException(status)
+                except Exception:
+                    self._stream = None
+                    raise
+            elif stream.prefix != prefix:
+                raise HokuyoException('Continuous measurment with other '
+                                      'parameters is already running')
+            queue = asyncio.Queue(self.queue_size)
+            stream.queues.add(queue)
+            return queue
+
+    async def _unsubscribe(self, queue):
+        '''Removes consumer of the continuous measurment, stops the
+        measurment after the last consumer is gone'''
+        async with self._stream_lock:
+            stream = self._stream
+            if stream is None or queue not in stream.queues:
+                return
+            stream.queues.discard(queue)
+            if stream.queues:
+                return
+            self._stream = None
+            if self._read_task is not None and not self._read_task.done():
+                self._logger.info('Last consumer left, stopping '
+                                  'continous measurment')
+                await self.standby()
+                await self.activate()
+
+    async def _iter_meas(self, with_intensity, scans, start, end, grouping,
+                         skips):
+        '''Generic async generator for taking continous measurment. If `scans`
+        is equal to 0 infinite number of scans will be yielded.'''
+        queue = await self._subscribe(with_intensity, start, end,
+                                      grouping, skips)
+        try:
+            n = 0
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    raise HokuyoException('Connection timeout')
+                if isinstance(item, Exception):
+                    raise item
+                scan, timestamp = item
+                n += 1
+                pending = scans - n if scans else 0
+                yield (scan, timestamp, pending)
+                if scans and pending == 0:
+                    break
+        finally:
+            await self._unsubscribe(queue)
+
+    def iter_dist(self, scans=0, start=None, end=None, grouping=0, skips=0):
+        '''Async generator for taking continous measurment of distances,
+        see `HokuyoLX.iter_dist`'''
+        return self._iter_meas(False, scans, start, end, grouping, skips)
+
+    def iter_intens(self, scans=0, start=None, end=None, grouping=0, skips=0):
+        '''Async generator for taking continous measurment of distances and
+        intensities, see `HokuyoLX.iter_intens`'''
+        return self._iter_meas(True, scans, start, end, grouping, skips)
+
+    async def iter_filtered_dist(self, scans=0, start=None, end=None,
+                                 grouping=0, skips=0, dmin=None, dmax=None,
+                                 out=None, split=False):
+        '''Async generator for taking continous measurment of distances with
+        additional filtering, see `HokuyoLX.iter_filtered_dist`'''
+        gen = self.iter_dist(scans, start, end, grouping, skips)
+        try:
+            async for scan, timestamp, pending in gen:
+                scan = self._filter(scan, start, end, grouping, dmin, dmax,
+                                    out=out, split=split)
+                yield (scan, timestamp, pending)
+        finally:
+            await gen.aclose()
+
+    #Time synchronization methods
+
+    async def _tsync_cmd(self, code):
+        '''Sends time synchronization command with the given code'''
+        status, data = await self._send_req('TM', str(code))
+        if status not in tsync_statuses:
+            raise HokuyoStatusException(status)
+        if data:
+            return status, tsync_statuses[status], data[0]
+        else:
+            return status, tsync_statuses[status]
+
+    async def tsync_enter(self):
+        '''Transition from standby state to time synchronization state.'''
+        self._logger.info('Entering time sync mode')
+        return await self._tsync_cmd(0)
+
+    async def tsync_get(self):
+        '''Get time value for time synchronization'''
+        resp = await self._tsync_cmd(1)
+        if resp[0] != '00':
+            raise HokuyoException(
+                'Failed to get sensor time: %s (%s)' %
+                (resp[1], resp[0]))
+        return self._convert2ts(resp[2], False)
+
+    async def tsync_exit(self):
+        '''Transition from time synchronization state to standby state.'''
+        self._logger.info('Exiting time sync mode')
+        return await self._tsync_cmd(2)
+
+    async def time_sync(self, N=5, dt=0.):
+        '''Performs time synchronization, see `HokuyoLX.time_sync`. Not
+        allowed while continuous measurment is running.'''
+        if self._stream is not None:
+            raise HokuyoException('Time synchronization is not possible '
+                                  'during continuous measurment')
+        self._logger.info('Starting time synchronization.')
+        await self._force_standby()
+        code, description = await self.tsync_enter()
+        if code != '00':
+            self._logger.info(
+                'Failed to enter time sync mode: %s (%s)', description, code)
+
+        self._logger.info('Collecting timestamps...')
+        self.clock.reset()
+        sensor, local = [], []
+        for _ in range(N):
+            t0 = time.time()
+            ts = await self.tsync_get()
+            t1 = time.time()
+            sensor.append(self.clock.unwrap(ts))
+            local.append((t0 + t1)*500)
+            if dt:
+                await asyncio.sleep(dt)
+        self.clock.fit(sensor, local)
+
+        self._logger.info('Time sync done, t0: %d ms, drift: %g',
+                          self.tzero, self.clock.drift)
+
+        code, description = await self.tsync_exit()
+        if code != '00':
+            self._logger.info(
+                'Failed to exit time sync mode: %s (%s)', description, code)
+
+    #Sensor information
+
+    async def _get_info(self, cmd):
+        '''Generic method for recieving and decoding sensor information,
+        accepts the following commands: II, VV and PP'''
+        status, data = await self._send_req(cmd)
+        if status != '00':
+            raise HokuyoStatusException(status)
+        return dict(self._process_info_line(line) for line in data if line)
+
+    async def sensor_state(self):
+        '''Obtains status information of the sensor.'''
+        self._logger.info('Retrieving sensor state')
+        return await self._get_info('II')
+
+    async def version(self):
+        '''Obtains manufacturing (version) information of the sensor.'''
+        self._logger.info('Retrieving manufacturing information of the sensor')
+        return await self._get_info('VV')
+
+    async def sensor_parameters(self):
+        '''Obtains sensor internal parameters information.'''
+        self._logger.info('Retrieving sensor internal parameters')
+        return await self._get_info('PP')
+
+    async def laser_state(self):
+        '''Return the current sensor state, see `HokuyoLX.laser_state`'''
+        status, data = await self._send_req('%ST')
+        if status != '00':
+            raise HokuyoStatusException(status)
+        state = self._check_sum(data[0])
+        if state not in laser_states:
+            raise HokuyoException('Unknown laser state code: %s' % state)
+        return int(state), laser_states[state]
+
+    async def update_info(self):
+        '''Updates sensor information stored in the object attributes using
+        `sensor_parameters` method.'''
+        self._logger.info('Updating sensor information')
+        params = await self.sensor_parameters()
+        for key in ['dmin', 'dmax', 'ares', 'amin', 'amax', ]:
+            if key.upper() in params:
+                self.__dict__[key] = params[key.upper()]
+        sfreq = params['SCAN']
+        self.scan_freq = sfreq//60 if sfreq % 60 == 0 else sfreq/60
+        self.aforw = params['AFRT']
+        self.model = params['MODL']
+
+    #Service methods
+
+    async def close(self):
+        '''Disconnects from the sensor closing TCP connection'''
+        if self._writer is None:
+            self._logger.info('Close: connection already closed')
+            return
+        self._logger.info('Close: closing connection to sensor')
+        self._stream = None
+        self._read_task.cancel()
+        try:
+            await self._read_task
+        except asyncio.CancelledError:
+            pass
+        self._writer.close()
+        self._writer = self._reader = None
@@ -0,0 +1,454 @@
+'''Shared memory scan bus which allows several processes to use one sensor.
+
+A publisher process owns the sensor and writes decoded scans into a ring
+buffer inside `multiprocessing.shared_memory`. Every slot of the ring carries
+sequence number of its scan, which is invalidated before the slot is
+rewritten, so readers detect overwritten scans without any locking and a
+slow reader never blocks the publisher.
+
+Plain stores into shared memory are not ordered across processes, and weakly
+ordered CPUs (like the ARM of the Raspberry Pi) may make the new sequence
+number visible before the whole scan. Every slot therefore also carries a
+checksum of its sequence number, timestamp and scan, written after the scan,
+which readers verify on the data they return, so a partly written scan is
+read again instead of being returned.
+
+Usage example:
+
+>>> # In one process (or `python -m hokuyolx.bus --name hokuyo`)
+>>> from hokuyolx import HokuyoLX
+>>> from hokuyolx.bus import ScanPublisher
+>>> publisher = ScanPublisher(HokuyoLX(), 'hokuyo')
+>>> publisher.run()
+>>> # In any number of other processes
+>>> from hokuyolx.bus import ScanSubscriber
+>>> laser = ScanSubscriber('hokuyo')
+>>> timestamp, scan = laser.get_filtered_dist()
+'''
+import argparse
+import logging
+import os
+import struct
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from .hokuyo import HokuyoLX
+from .exceptions import HokuyoException
+
+#: Magic bytes at the beginning of the shared memory block
+BUS_MAGIC = b'HKYBUS\x00\x02'
+#: Layout of the bus header: magic, flags, number of slots, number of beams,
+#: amin, amax, aforw, ares, dmin, dmax, start, end, grouping, scan frequency,
+#: model
+BUS_HEADER = struct.Struct('<8sIII9id16s')
+#: Offset of the control words: last published sequence number, publisher
+#: state (1 - running, 2 - stopped) and publisher PID
+BUS_CONTROL = 128
+#: Offset of the first slot of the ring buffer
+BUS_SLOTS = 192
+#: Flag set when scans contain intensities
+FLAG_INTENSITY = 1
+
+
+def _slot_dtype(nbeams, with_intensity):
+    '''Returns numpy dtype of one ring buffer slot'''
+    shape = (nbeams, 2) if with_intensity else (nbeams,)
+    return np.dtype([('seq', '<i8'), ('timestamp', '<i8'), ('check', '<i8'),
+                     ('scan', '<u4', shape)])
+
+
+def _checksum(seq, timestamp, scan):
+    '''Returns checksum of a slot, it covers the sequence number, so data of
+    a scan which replaced the expected one does not match either'''
+    return seq + timestamp + int(scan.sum(dtype=np.uint64))
+
+
+def _attach(name):
+    '''Attaches to the existing shared memory block without handing it over
+    to the resource tracker, which would destroy it when this process exits'''
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+
+class ScanPublisher(object):
+    '''Writes scans measured by `HokuyoLX` into the shared memory ring buffer
+    read by `ScanSubscriber` instances.'''
+
+    def __init__(self, laser, name='hokuyo', slots=16, with_intensity=False,
+                 start=None, end=None, grouping=0, logger=None):
+        '''Creates the shared memory block of the bus.
+
+        Parameters
+        ----------
+        laser : `HokuyoLX` instance
+            Laser to take measurments with
+        name : str, optional
+            Name of the shared memory block (the default is 'hokuyo')
+        slots : int, optional
+            Number of scans kept in the ring buffer, views returned to
+            subscribers stay valid for `slots - 1` following scans
+            (the default is 16)
+        with_intensity : bool, optional
+            Publish intensities too? (the default is False)
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `laser.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `laser.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        logger : `logging._logger` instance, optional
+            Logger instance, if none is provided new instance is created
+        '''
+        super(ScanPublisher, self).__init__()
+        self.laser = laser
+        self.name = name
+        self.with_intensity = with_intensity
+        self.start = laser.amin if start is None else start
+        self.end = laser.amax if end is None else end
+        self.grouping = grouping
+        self._logger = logging.getLogger('hokuyo') if logger is None else logger
+        nbeams = len(laser.get_angles(self.start, self.end, grouping))
+        dtype = _slot_dtype(nbeams, with_intensity)
+        size = BUS_SLOTS + slots*dtype.itemsize
+        try:
+            self._shm = shared_memory.SharedMemory(name, True, size)
+        except FileExistsError:
+            old = _attach(name)
+            ctrl = np.ndarray(3, '<i8', old.buf, BUS_CONTROL)
+            if ctrl[1] == 1 and ctrl[2] != os.getpid():
+                try:
+                    os.kill(int(ctrl[2]), 0)
+                    alive = True
+                except OSError:
+                    alive = False
+                if alive:
+                    del ctrl
+                    old.close()
+                    raise HokuyoException('Bus %s already has a running '
+                                          'publisher' % name)
+            del ctrl
+            old.close()
+            old.unlink()
+            self._shm = shared_memory.SharedMemory(name, True, size)
+        buf = self._shm.buf
+        flags = FLAG_INTENSITY if with_intensity else 0
+        BUS_HEADER.pack_into(
+            buf, 0, BUS_MAGIC, flags, slots, nbeams, laser.amin, laser.amax,
+            laser.aforw, laser.ares, laser.dmin, laser.dmax, self.start,
+            self.end, grouping, float(laser.scan_freq),
+            str(laser.model).encode('ascii', 'replace')[:16])
+        self._ctrl = np.ndarray(3, '<i8', buf, BUS_CONTROL)
+        self._slots = np.ndarray(slots, dtype, buf, BUS_SLOTS)
+        self._slots['seq'] = 0
+        self._ctrl[:] = (0, 1, os.getpid())
+        self.seq = 0 #: Sequence number of the last published scan
+        self._stop = False
+
+    def publish(self, timestamp, scan):
+        '''Writes scan into the next slot of the ring buffer
+
+        Parameters
+        ----------
+        timestamp : int
+            Timestamp of the measurment
+        scan : ndarray
+            Array with measured distances, or distances and intensities
+        '''
+        seq = self.seq + 1
+        slot = self._slots[seq % len(self._slots)]
+        slot['seq'] = -1
+        slot['timestamp'] = timestamp
+        slot['scan'] = scan
+        slot['check'] = _checksum(seq, timestamp, slot['scan'])
+        slot['seq'] = seq
+        self._ctrl[0] = seq
+        self.seq = seq
+
+    def run(self, scans=0, skips=0):
+        '''Publishes scans from continuous measurment of the laser until
+        `scans` scans are published (0 means forever) or `stop` is called
+        from another thread'''
+        self._stop = False
+        if self.with_intensity:
+            gen = self.laser.iter_intens(scans, self.start, self.end,
+                                         self.grouping, skips)
+        else:
+            gen = self.laser.iter_dist(scans, self.start, self.end,
+                                       self.grouping, skips)
+        self._logger.info('Publishing scans to the bus %s' % self.name)
+        try:
+            for scan, timestamp, _ in gen:
+                self.publish(timestamp, scan)
+                if self._stop:
+                    break
+        finally:
+            gen.close()
+
+    def stop(self):
+        '''Requests `run` to stop after the current scan'''
+        self._stop = True
+
+    def close(self, laser=True):
+        '''Marks the bus as stopped and destroys the shared memory block.
+        Attached subscribers raise exception on the next read. If `laser`
+        is True the wrapped laser is closed too.'''
+        if self._shm is not None:
+            self._ctrl[1] = 2
+            del self._ctrl, self._slots
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        if laser:
+            self.laser.close()
+
+
+class ScanSubscriber(object):
+    '''Reads scans published by `ScanPublisher` from the shared memory bus.
+    It offers the measurment methods of `HokuyoLX`, so it can be passed to
+    `SLAM` or `Lidar` instead of it. Every measurment returns a scan which
+    was not yet returned by this subscriber, waiting for it if necessary.
+    Single measurments return the newest scan, while generators yield all
+    scans in order as long as the subscriber keeps up with the publisher.'''
+
+    _angles = None #: Cache of angle tables: (sensor parameters, tables)
+    _filter = HokuyoLX._filter
+    get_angles = HokuyoLX.get_angles
+
+    def __init__(self, name='hokuyo', timeout=5, poll=0.001):
+        '''Attaches to the bus.
+
+        Parameters
+        ----------
+        name : str, optional
+            Name of the shared memory block (the default is 'hokuyo')
+        timeout : float, optional
+            Timeout while waiting for the next scan in seconds
+            (the default is 5)
+        poll : float, optional
+            Polling interval while waiting for the next scan in seconds
+            (the default is 0.001)
+        '''
+        super(ScanSubscriber, self).__init__()
+        self.name = name
+        self.timeout = timeout
+        self.poll = poll
+        try:
+            self._shm = _attach(name)
+        except FileNotFoundError:
+            raise HokuyoException('Bus %s does not exist' % name)
+        buf = self._shm.buf
+        (magic, flags, nslots, nbeams, self.amin, self.amax, self.aforw,
+         self.ares, self.dmin, self.dmax, self.start, self.end, self.grouping,
+         self.scan_freq, model) = BUS_HEADER.unpack_from(buf, 0)
+        if magic != BUS_MAGIC:
+            self._shm.close()
+            raise HokuyoException('Shared memory %s is not a scan bus' % name)
+        self.model = model.rstrip(b'\x00').decode('ascii', 'replace')
+        self.with_intensity = bool(flags & FLAG_INTENSITY)
+        self._ctrl = np.ndarray(3, '<i8', buf, BUS_CONTROL)
+        slots = np.ndarray(nslots, _slot_dtype(nbeams, self.with_intensity),
+                           buf, BUS_SLOTS)
+        self._seqs = slots['seq']
+        self._stamps = slots['timestamp']
+        self._checks = slots['check']
+        self._scans = slots['scan']
+        self._scans.flags.writeable = False
+        self.seq = 0 #: Sequence number of the last returned scan
+        self.dropped = 0 #: Number of published scans this subscriber missed
+
+    def _wait(self):
+        '''Waits until scan newer than the last returned one is published and
+        returns its sequence number'''
+        deadline = time.time() + self.timeout
+        while True:
+            seq = int(self._ctrl[0])
+            if seq > self.seq:
+                return seq
+            if self._ctrl[1] != 1:
+                raise HokuyoException('Publisher of the bus %s has stopped' %
+                                      self.name)
+            if time.time() > deadline:
+                raise HokuyoException('Timeout while waiting for the next '
+                                      'scan')
+            time.sleep(self.poll)
+
+    def _read(self, process=None, newest=True, copy=False):
+        '''Returns the newest scan, or if `newest` is False the oldest unread
+        scan still kept in the ring buffer, as a view into the shared memory.
+        If `process` is given it is applied to the scan before checking that
+        the slot was not rewritten meanwhile. If `copy` is True the slot is
+        copied once, the checksum is verified on the copy and `process` is
+        applied to the copy, so it never sees a partly written scan.'''
+        while True:
+            seq = self._wait()
+            nslots = len(self._seqs)
+            if newest:
+                first = seq
+            else:
+                first = max(self.seq + 1, seq - nslots + 2)
+            i = first % nslots
+            if self._seqs[i] != first:
+                continue
+            timestamp = int(self._stamps[i])
+            raw = self._scans[i].copy() if copy else self._scans[i]
+            if _checksum(first, timestamp, raw) != self._checks[i]:
+                continue
+            scan = raw if process is None else process(raw)
+            if not copy and self._seqs[i] != first:
+                continue
+            self.dropped += first - self.seq - 1
+            self.seq = first
+            return timestamp, scan
+
+    def valid(self, seq=None):
+        '''Checks that the scan with the given sequence number (the default
+        is the last returned one) was not overwritten yet, i.e. that views
+        returned for it still hold its data'''
+        seq = self.seq if seq is None else seq
+        return seq > 0 and self._seqs[seq % len(self._seqs)] == seq
+
+    def get_latest_scan(self):
+        '''Returns the newest published scan without waiting. Returns tuple
+        of sequence number, timestamp and copy of the scan, or None if
+        nothing was published yet.'''
+        while True:
+            seq = int(self._ctrl[0])
+            if seq == 0:
+                return None
+            i = seq % len(self._seqs)
+            timestamp = int(self._stamps[i])
+            scan = self._scans[i].copy()
+            if (_checksum(seq, timestamp, scan) == self._checks[i] and
+                    self._seqs[i] == seq):
+                return seq, timestamp, scan
+
+    def _check_params(self, start, end, grouping):
+        if ((start is not None and start != self.start) or
+                (end is not None and end != self.end) or
+                grouping not in (0, self.grouping)):
+            raise HokuyoException('Scan parameters differ from the published '
+                                  'ones')
+
+    def get_dist(self, start=None, end=None, grouping=0):
+        '''Returns the next scan with distances, see `HokuyoLX.get_dist`.
+        Scan is a read-only view into the shared memory, which is valid until
+        the ring buffer wraps around, see `valid`.'''
+        self._check_params(start, end, grouping)
+        return self._read(self._dist)
+
+    def get_intens(self, start=None, end=None, grouping=0):
+        '''Returns the next scan with distances and intensities as a view
+        into the shared memory, see `get_dist`'''
+        self._check_params(start, end, grouping)
+        if not self.with_intensity:
+            raise HokuyoException('Bus was published without intensities')
+        return self._read()
+
+    def _dist(self, scan):
+        return scan[:, 0] if scan.ndim == 2 else scan
+
+    def get_filtered_dist(self, start=None, end=None, grouping=0,
+                          dmin=None, dmax=None, out=None, split=False):
+        '''Returns the next scan with distances filtered, see
+        `HokuyoLX.get_filtered_dist`'''
+        self._check_params(start, end, grouping)
+        return self._read(lambda scan: self._filter(
+            self._dist(scan), self.start, self.end, self.grouping, dmin, dmax,
+            out=out, split=split), copy=True)
+
+    def get_filtered_intens(self, start=None, end=None, grouping=0,
+                            dmin=None, dmax=None, imin=None, imax=None,
+                            out=None, split=False):
+        '''Returns the next scan with distances and intensities filtered, see
+        `HokuyoLX.get_filtered_intens`'''
+        self._check_params(start, end, grouping)
+        if not self.with_intensity:
+            raise HokuyoException('Bus was published without intensities')
+        return self._read(lambda scan: self._filter(
+            scan, self.start, self.end, self.grouping, dmin, dmax, imin, imax,
+            out, split), copy=True)
+
+    def _iter(self, process, scans, skips, copy=False):
+        '''Yields published scans in order, scans which were overwritten
+        before being read are counted in `dropped`'''
+        n = 0
+        while True:
+            for _ in range(skips):
+                self._wait()
+                self.seq += 1
+            ts, scan = self._read(process, False, copy)
+            n += 1
+            pending = scans - n if scans else 0
+            yield scan, ts, pending
+            if scans and pending == 0:
+                break
+
+    def iter_dist(self, scans=0, start=None, end=None, grouping=0, skips=0):
+        '''Generator yielding published distances in order, see
+        `HokuyoLX.iter_dist`'''
+        self._check_params(start, end, grouping)
+        return self._iter(self._dist, scans, skips)
+
+    def iter_intens(self, scans=0, start=None, end=None, grouping=0, skips=0):
+        '''Generator yielding published distances and intensities in order,
+        see `HokuyoLX.iter_intens`'''
+        self._check_params(start, end, grouping)
+        if not self.with_intensity:
+            raise HokuyoException('Bus was published without intensities')
+        return self._iter(None, scans, skips)
+
+    def iter_filtered_dist(self, scans=0, start=None, end=None, grouping=0,
+                           skips=0, dmin=None, dmax=None, out=None,
+                           split=False):
+        '''Generator yielding published distances filtered in order, see
+        `HokuyoLX.iter_filtered_dist`'''
+        self._check_params(start, end, grouping)
+        return self._iter(lambda scan: self._filter(
+            self._dist(scan), self.start, self.end, self.grouping, dmin, dmax,
+            out=out, split=split), scans, skips, copy=True)
+
+    def close(self):
+        '''Detaches from the bus'''
+        if self._shm is not None:
+            del self._ctrl, self._seqs, self._stamps, self._checks
+            del self._scans
+            self._shm.close()
+            self._shm = None
+
+
+def main():
+    '''Runs publisher owning the sensor from the command line'''
+    parser = argparse.ArgumentParser(
+        description='Publish Hokuyo scans to a shared memory bus')
+    parser.add_argument('--name', default='hokuyo',
+                        help='name of the shared memory block')
+    parser.add_argument('--slots', type=int, default=16,
+                        help='number of scans kept in the ring buffer')
+    parser.add_argument('--host', default=HokuyoLX.addr[0])
+    parser.add_argument('--port', type=int, default=HokuyoLX.addr[1])
+    parser.add_argument('--intensity', action='store_true',
+                        help='publish intensities too')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    laser = HokuyoLX(addr=(args.host, args.port))
+    publisher = ScanPublisher(laser, args.name, args.slots, args.intensity)
+    try:
+        publisher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        publisher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+'''Model of the sensor clock used for conversion of sensor timestamps to
+UNIX time.
+
+Sensor timestamps are 24 bit millisecond counters which overflow every
+~4.66 hours and drift relative to the local clock. `SensorClock` unwraps them
+and converts them using a linear model::
+
+    t = tzero + s + drift*(s - sref)
+
+The offset is fitted from a few time requests during time synchronization.
+These span too little time to resolve the drift, which is fitted by linear
+regression once the reception times of scans, which refine the model
+continuously, span at least `min_span`. The sensor never has to leave the
+measurment state to resync.
+'''
+from collections import deque
+import numpy as np
+
+
+class SensorClock(object):
+    '''Linear model of the sensor clock relative to the local clock'''
+
+    tzero = 0 #: Local time in ms of the sensor time zero
+    drift = 0. #: Relative drift of the sensor clock
+    sref = 0 #: Sensor time at which the drift is zero
+    tn = 0 #: Sensor timestamp overflow counter
+    latency = None #: Minimal delay between measurment and reception in ms
+    fitted = False #: Was the model fitted or anchored already?
+
+    def __init__(self, tolerance=300, window=40, history=120, min_span=10000):
+        '''Creates new clock model.
+
+        Parameters
+        ----------
+        tolerance : int, optional
+            Error of the model in milliseconds after which it is anchored
+            again to the recieved scans (the default is 300)
+        window : int, optional
+            Number of scans from which the one with the smallest delay is
+            taken for refinement of the model (the default is 40)
+        history : int, optional
+            Number of windows used for refinement (the default is 120)
+        min_span : int, optional
+            Minimal span of sensor time in ms required for estimation of
+            drift (the default is 10000)
+        '''
+        super(SensorClock, self).__init__()
+        self.tolerance = tolerance
+        self.window = window
+        self.min_span = min_span
+        self._points = deque(maxlen=history)
+        self._last = None
+        self._best = None
+        self._count = 0
+
+    def reset(self):
+        '''Forgets fitted model'''
+        self.tzero = 0
+        self.drift = 0.
+        self.sref = 0
+        self.tn = 0
+        self.latency = None
+        self.fitted = False
+        self._points.clear()
+        self._last = None
+        self._best = None
+        self._count = 0
+
+    def unwrap(self, ts):
+        '''Converts 24 bit sensor timestamp into monotonic sensor time taking
+        into account timestamp overflows'''
+        if self._last is not None and self._last - ts > 1 << 23:
+            self.tn += 1
+        self._last = ts
+        return ts + self.tn*(1 << 24)
+
+    def to_local(self, s):
+        '''Converts unwrapped sensor time to the local UNIX time in ms'''
+        return int(round(self.tzero + s + self.drift*(s - self.sref)))
+
+    def fit(self, sensor, local):
+        '''Fits the model to the pairs of sensor and local times. Drift is
+        estimated only if the samples span at least `min_span`, otherwise
+        it is set to zero and only the offset is fitted (as for the few
+        requests of time synchronization).
+
+        Parameters
+        ----------
+        sensor : array_like
+            Unwrapped sensor times in ms
+        local : array_like
+            Corresponding local UNIX times in ms
+        '''
+        sensor = np.asarray(sensor, np.float64)
+        diff = np.asarray(local, np.float64) - sensor
+        self.sref = int(sensor[0])
+        if len(sensor) > 2 and np.ptp(sensor) >= self.min_span:
+            self.drift, self.tzero = np.polyfit(sensor - self.sref, diff, 1)
+        else:
+            self.drift = 0.
+            self.tzero = np.mean(diff)
+        self.fitted = True
+        self.latency = None
+        self._points.clear()
+        self._best = None
+        self._count = 0
+
+    def update(self, s, t):
+        '''Refines the model with the scan measured at sensor time `s` and
+        recieved at local time `t` (both in ms). Returns the model error
+        in ms if it exceeded `tolerance` and the model was anchored again,
+        otherwise None.'''
+        if not self.fitted:
+            self.tzero = t - s
+            self.sref = s
+            self.fitted = True
+        delay = t - self.to_local(s)
+        if self._best is None or delay < self._best[2]:
+            self._best = (s, t, delay)
+        self._count += 1
+        if self._count < self.window:
+            return None
+        s, t, delay = self._best
+        self._best = None
+        self._count = 0
+        if self.latency is None:
+            self.latency = delay
+        error = delay - self.latency
+        if abs(error) > self.tolerance:
+            self.tzero += error
+            self._points.clear()
+            self._points.append((s, t))
+            return error
+        self._points.append((s, t))
+        sensor = np.array([p[0] for p in self._points], np.float64)
+        diff = np.array([p[1] for p in self._points], np.float64) - sensor
+        if len(sensor) > 2 and np.ptp(sensor) >= self.min_span:
+            self.drift, tzero = np.polyfit(sensor - self.sref, diff, 1)
+        else:
+            tzero = np.mean(diff - self.drift*(sensor - self.sref))
+        self.tzero = tzero - self.latency
+        return None
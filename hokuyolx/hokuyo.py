@@ -1,12 +1,14 @@
 '''HokuyoLX class code'''
 import socket
 import logging
+import threading
 import time
 import numpy as np
 from codecs import encode, decode
 from .exceptions import HokuyoException, HokuyoStatusException
 from .exceptions import HokuyoChecksumMismatch
 from .statuses import activation_statuses, laser_states, tsync_statuses
+from .clock import SensorClock
 
 class HokuyoLX(object):
     '''Class for working with Hokuyo laser rangefinders, specifically
@@ -21,15 +23,26 @@ class HokuyoLX(object):
     aforw = 540 #: Step number of the front direction
     scan_freq = 40 #: Scanning frequency in Hz
     model = 'UST-10LX' #: Sensor model
-    tzero = 0 #: Sensor start time
-    tn = 0 #: Sensor timestamp overflow counter
+    clock = None #: Model of the sensor clock (`SensorClock` instance)
     convert_time = True #: To convert timestamps to UNIX time or not?
 
     _sock = None #: TCP connection socket to the sensor
     _logger = None #: Logger instance for performing logging operations
+    _rbuf = None #: Preallocated receive buffer
+    _rview = None #: Memoryview of the receive buffer
+    _rstart = 0 #: Start of the unprocessed data inside the receive buffer
+    _rend = 0 #: End of the recieved data inside the receive buffer
+    _rscan = 0 #: Position from which to search for the message terminator
+    _stream_thread = None #: Background thread of the continuous measurment
+    _stream_cond = None #: Condition guarding the latest scan slot
+    _stream_stop = False #: Request for the background thread to stop
+    _stream_params = None #: Parameters of the running continuous measurment
+    _stream_error = None #: Exception which terminated the background thread
+    _latest = None #: Latest scan slot: (seq, local time, timestamp, scan)
+    _angles = None #: Cache of angle tables: (sensor parameters, tables)
 
     def __init__(self, activate=True, info=True, tsync=True, addr=None,
-                 buf=512, timeout=5, time_tolerance=300, logger=None,
+                 buf=16384, timeout=5, time_tolerance=300, logger=None,
                  convert_time=True):
         '''Creates new object for communications with the sensor.
 
@@ -45,14 +58,15 @@ class HokuyoLX(object):
             IP address and port of the sensor (the default is
             `('192.168.0.10', 10940)`)
         buf : int, optional
-            Buffer size for recieving messages from the sensor
-            (the default is 512)
+            Initial size of the preallocated buffer for recieving messages
+            from the sensor, grown automatically if a message does not fit
+            in it (the default is 16384)
         timeout : int, optional
             Timeout limit for connection with the sensor in seconds
             (the default is 5)
         time_tolerance : int, optinal
-            Time tolerance before attempting time synchronization in
-            milliseconds (the default is 300)
+            Error of the clock model in milliseconds after which it is
+            anchored again to the recieved scans (the default is 300)
         logger : `logging._logger` instance, optional
             Logger instance, if none is provided new instance is created
         convert_time : bool
@@ -62,10 +76,14 @@ class HokuyoLX(object):
         if addr is not None:
             self.addr = addr
         self.buf = buf
+        self._rbuf = bytearray(buf)
+        self._rview = memoryview(self._rbuf)
         self.timeout = timeout
         self._logger = logging.getLogger('hokuyo') if logger is None else logger
         self.time_tolerance = time_tolerance
+        self.clock = SensorClock(time_tolerance)
         self.convert_time = convert_time
+        self._stream_cond = threading.Condition()
         self._connect_to_laser(False)
         if tsync:
             self.time_sync()
@@ -100,32 +118,68 @@ class HokuyoLX(object):
         return sum([(ord(char) - 0x30) << (6*(len(chars) - i - 1))
                     for i, char in enumerate(chars)])
 
+    @staticmethod
+    def _decode_scan(payload):
+        '''Vectorized decoding of the scan data part of a message.
+
+        `payload` is the raw bytes of the data blocks separated by line feeds
+        (the trailing line feed is optional). Every block consists of up to
+        64 data chars followed by a checksum char. All checksums are verified
+        in one pass, after that 6 bit triplets are combined into `uint32`
+        values, giving the same result as applying `_check_sum` and
+        `_convert2int` block by block.
+        '''
+        raw = np.frombuffer(payload, np.uint8)
+        if raw.size and raw[-1] != 0x0a:
+            raw = np.append(raw, np.uint8(0x0a))
+        ends = np.flatnonzero(raw == 0x0a)
+        if ends.size == 0:
+            return np.empty(0, np.uint32)
+        starts = np.empty_like(ends)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        if np.any(ends - starts < 2):
+            raise HokuyoException('Wrong length of scan data block')
+        sums_pos = ends - 1
+
+        chars = raw.astype(np.uint32)
+        chars[ends] = 0
+        sums = np.add.reduceat(chars, starts) - chars[sums_pos]
+        calc = (sums & 0x3f) + 0x30
+        bad = np.flatnonzero(calc != chars[sums_pos])
+        if bad.size:
+            i = bad[0]
+            raise HokuyoChecksumMismatch(
+                'For message %s sum mismatch: %s vs %s' %
+                (decode(raw[starts[i]:sums_pos[i]].tobytes(), 'ascii'),
+                 chr(calc[i]), chr(raw[sums_pos[i]])))
+
+        keep = np.ones(raw.size, bool)
+        keep[ends] = False
+        keep[sums_pos] = False
+        data = chars[keep]
+        if data.size % 3 != 0:
+            raise HokuyoException('Wrong length of scan data')
+        data -= 0x30
+        data = data.reshape((-1, 3))
+        return (data[:, 0] << 12) | (data[:, 1] << 6) | data[:, 2]
+
     def _convert2ts(self, chars, convert=None):
-        '''Converts sensor timestamp in the form of chars to
-        the UNIX timestamp. If resulting timestamp differs from local timestamp
-        to more than `self.time_tolerance` performs time syncronization or
-        detects sensor timestamp overflow and adjiusts to it.'''
+        '''Converts sensor timestamp in the form of chars to the UNIX
+        timestamp using the clock model, which is refined by every converted
+        timestamp. Timestamp overflows are handled by the model and if it
+        differs from local time more than `self.time_tolerance` it is
+        anchored again to the recieved scans, without leaving measurment
+        state for time synchronization.'''
         ts = self._convert2int(self._check_sum(chars))
         if not (self.convert_time if convert is None else convert):
             return ts
-        logging.debug('Sensor timestamp: %d', ts)
-        t = self.tzero + ts + self._tn*(1 << 24)
-        logging.debug('Converted timestamp: %d (t0: %d, tn: %d)',
-            t, self.tzero, self._tn)
-        dt = int(time.time()*1000) - t
-        logging.debug('Delta t with local time: %d', dt)
-        if abs(dt) > self.time_tolerance:
-            diff = (1 << 24) - self.time_tolerance
-            if dt > diff and self.tzero != 0:
-                self._logger.warning('Timestamp overflow detected, '
-                                    '%d -- %d' % (dt, diff))
-                self._tn += 1
-            else:
-                self._logger.warning(
-                    'Time difference %d is too big. Resyncing...',  dt)
-                self.time_sync()
-            return self._convert2ts(chars)
-        return t
+        s = self.clock.unwrap(ts)
+        error = self.clock.update(s, time.time()*1000)
+        if error is not None:
+            self._logger.warning('Time difference %d ms is too big, '
+                                 'clock model was adjusted' % error)
+        return self.clock.to_local(s)
 
     #: Low level connection methods
 
@@ -134,6 +188,7 @@ class HokuyoLX(object):
         if close:
             self.close()
         self._logger.info('Connecting to the laser')
+        self._rstart = self._rend = self._rscan = 0
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._sock.settimeout(self.timeout)
         try:
@@ -160,35 +215,91 @@ class HokuyoLX(object):
             raise HokuyoException('Failed to send all data to the sensor')
         return req
 
-    def _recv(self, header=None):
+    def _fill_buffer(self):
+        '''Reads available data from the socket into the receive buffer.
+        Pending bytes are moved to the beginning of the buffer when it runs
+        out of space and the buffer is grown if a message does not fit in it.
+        '''
+        size = len(self._rbuf)
+        if self._rstart == self._rend:
+            self._rstart = self._rend = self._rscan = 0
+        elif size - self._rend < size//4:
+            pending = self._rend - self._rstart
+            if pending > size//2:
+                rbuf = bytearray(2*size)
+                rbuf[:pending] = self._rview[self._rstart:self._rend]
+                self._rbuf, self._rview = rbuf, memoryview(rbuf)
+            else:
+                self._rbuf[:pending] = self._rbuf[self._rstart:self._rend]
+            self._rscan -= self._rstart
+            self._rstart, self._rend = 0, pending
+        n = self._sock.recv_into(self._rview[self._rend:])
+        if n == 0:
+            raise HokuyoException('Connection closed by the sensor')
+        self._rend += n
+
+    def _recv_frame(self):
+        '''Returns start and end positions inside the receive buffer of the next
+        message terminated by two line feeds. The end position is right after
+        the first of them, so every line of the message ends with a line feed.
+        Several messages recieved in one read are returned one by one without
+        touching the socket.'''
+        while True:
+            idx = self._rbuf.find(b'\n\n', self._rscan, self._rend)
+            if idx >= 0:
+                break
+            self._rscan = max(self._rstart, self._rend - 1)
+            self._fill_buffer()
+        start = self._rstart
+        self._rstart = self._rscan = idx + 2
+        return start, idx + 1
+
+    def _recv(self, header=None, nlines=None):
         '''Recieves data from the sensor and checks recieved data block
-        using given header.'''
+        using given header. Returns list of decoded message lines. If `nlines`
+        is given only the first `nlines` lines are decoded and the rest of
+        the message is appended to the list as a memoryview into the receive
+        buffer, which stays valid only until the next call.'''
         self._logger.debug('Recieving data from sensor')
         if self._sock is None:
             raise HokuyoException('Not connected to the laser')
         try:
             while True:
-                data = b''
-                while not data.endswith(b'\n\n'):
-                    data += self._sock.recv(self.buf)
-                self._logger.debug('Recieved data: %s' % data)
-                split_data = decode(data[:-2], 'ascii').split('\n')
+                start, end = self._recv_frame()
+                if self._logger.isEnabledFor(logging.DEBUG):
+                    self._logger.debug('Recieved data: %s',
+                                       bytes(self._rview[start:end]))
+                split_data = []
+                pos = start
+                while pos < end and (nlines is None or
+                                     len(split_data) < nlines):
+                    eol = self._rbuf.find(b'\n', pos, end)
+                    split_data.append(decode(self._rview[pos:eol], 'ascii'))
+                    pos = eol + 1
                 if header is not None and split_data[0] != header:
                     self._logger.warning(
-                        'Discarded data due header mismatch: %s' % data)
+                        'Discarded data due header mismatch: %s',
+                        split_data[0])
                     continue
+                if nlines is not None:
+                    split_data.append(self._rview[pos:end])
                 break
         except socket.timeout:
             raise HokuyoException('Connection timeout')
         return split_data
 
-    def _send_req(self, cmd, params='', string=''):
-        '''Sends given command to the sensor and awaits response to it.'''
+    def _send_req(self, cmd, params='', string='', nlines=None):
+        '''Sends given command to the sensor and awaits response to it.
+        `nlines` is passed to `_recv` and counts the echo and status lines.'''
         self._logger.debug(
             'Performing request; cmd: %s, params: %s, string: %s',
             cmd, params, string)
+        if (self.is_streaming() and
+                threading.current_thread() is not self._stream_thread):
+            raise HokuyoException('Sensor is busy with continuous '
+                                  'measurment, call `stop_stream` first')
         header = self._send_cmd(cmd, params, string)
-        resp = self._recv(header)
+        resp = self._recv(header, nlines)
         if resp.pop(0) != header:
             raise HokuyoException('Response header mismatch')
         status_str = resp.pop(0)
@@ -215,7 +326,9 @@ class HokuyoLX(object):
         Returns
         -------
         ndarray
-            List of angles in radians
+            List of angles in radians. Tables are cached for every set of
+            parameters and rebuilt when sensor parameters change, so the
+            returned array is read-only.
 
         Examples
         --------
@@ -223,47 +336,70 @@ class HokuyoLX(object):
         array([-1.17809725, -1.17591558, -1.17373392, ...,  1.17373392,
             1.17591558,  1.17809725])
         '''
-        start = self.amin if start is None else start
-        end = self.amax if end is None else end
-        grouping = 1 if grouping == 0 else grouping
+        key = (self.amin, self.amax, self.ares, self.aforw)
+        if self._angles is None or self._angles[0] != key:
+            self._angles = (key, {})
+        cache = self._angles[1]
+        angles = cache.get((start, end, grouping))
+        if angles is not None:
+            return angles
 
         num = self.amax - self.amin + 1
         space = np.linspace(self.amin, self.amax, num) - self.aforw
         angles = 2*np.pi*space/self.ares
-        return angles[start:end+1:grouping]
+        angles = angles[
+            self.amin if start is None else start:
+            (self.amax if end is None else end) + 1:
+            1 if grouping == 0 else grouping].copy()
+        angles.flags.writeable = False
+        cache[(start, end, grouping)] = angles
+        return angles
 
     def _process_scan_data(self, data, with_intensity):
-        '''Converts raw scan data into ndarray with neccecary shape'''
-        raw_data = ''.join([self._check_sum(block) for block in data])
-        if len(raw_data) % 3 != 0:
-            raise HokuyoException('Wrong length of scan data')
-        scan = np.array([
-            self._convert2int(raw_data[3*i:3*i+3])
-            for i in range(len(raw_data)//3)], np.uint32)
+        '''Converts raw scan data bytes into ndarray with neccecary shape'''
+        scan = self._decode_scan(data)
         if with_intensity:
             return scan.reshape((len(scan)//2, 2))
         return scan
 
     def _filter(self, scan, start=None, end=None, grouping=0,
-                dmin=None, dmax=None, imin=None, imax=None):
+                dmin=None, dmax=None, imin=None, imax=None,
+                out=None, split=False):
         '''Filters scan measured for given parameters and filters it for
         given `dmin`, `dmax`, `imin` and `imax`. Note that `imin` and `imax`
-        should be only used for scans with intensities'''
+        should be only used for scans with intensities. If `out` is given
+        filtered data is written into its first rows and view of them is
+        returned. If `split` is True tuple of separate arrays with angles,
+        distances and intensities is returned instead, which are views
+        without copying if nothing was filtered out.'''
         angles = self.get_angles(start, end, grouping)
         if scan.ndim == 1:
-            tpl = (angles, scan)
+            cols = (angles, scan)
         elif scan.ndim == 2:
-            tpl = (angles, scan[:, 0], scan[:, 1])
+            cols = (angles, scan[:, 0], scan[:, 1])
         else:
             raise HokuyoException('Unexpected scan dimensions')
-        data = np.vstack(tpl).T
         dmin = self.dmin if dmin is None else dmin
         dmax = self.dmax if dmax is None else dmax
-        data = data[(data[:, 1] >= dmin) & (data[:, 1] <= dmax)]
+        mask = (cols[1] >= dmin) & (cols[1] <= dmax)
         if imin is not None:
-            data = data[data[:, 2] >= imin]
+            mask &= cols[2] >= imin
         if imax is not None:
-            data = data[data[:, 2] <= imax]
+            mask &= cols[2] <= imax
+        if split:
+            if mask.all():
+                return cols
+            return tuple(col[mask] for col in cols)
+        num = np.count_nonzero(mask)
+        if out is None:
+            out = np.empty((num, len(cols)))
+        elif out.shape[0] < num or out.shape[1:] != (len(cols), ):
+            raise HokuyoException('Output buffer shape should be at least '
+                                  '(%d, %d)' % (num, len(cols)))
+        data = out[:num]
+        whole = num == len(mask)
+        for i, col in enumerate(cols):
+            data[:, i] = col if whole else col[mask]
         return data
 
     #Control of sensor state
@@ -354,13 +490,16 @@ class HokuyoLX(object):
         Valid only in the measurment state.'''
         start = self.amin if start is None else start
         end = self.amax if end is None else end
+        if self.is_streaming():
+            return self._stream_measurment(with_intensity, start, end,
+                                           grouping)
         params = '%0.4d%0.4d%0.2d' % (start, end, grouping)
         cmd = 'GE' if with_intensity else 'GD'
-        status, data = self._send_req(cmd, params)
+        status, data = self._send_req(cmd, params, nlines=3)
         if status != '00':
             raise HokuyoStatusException(status)
-        timestamp = self._convert2ts(data.pop(0))
-        scan = self._process_scan_data(data, with_intensity)
+        timestamp = self._convert2ts(data[0])
+        scan = self._process_scan_data(data[1], with_intensity)
         return timestamp, scan
 
     def get_dist(self, start=None, end=None, grouping=0):
@@ -410,7 +549,7 @@ class HokuyoLX(object):
         return self._single_measurment(True, start, end, grouping)
 
     def get_filtered_dist(self, start=None, end=None, grouping=0,
-                          dmin=None, dmax=None):
+                          dmin=None, dmax=None, out=None, split=False):
         '''Measure distances for the given parameters and perform basic
         filtering. Returns array with angles and distances.
 
@@ -430,6 +569,13 @@ class HokuyoLX(object):
         dmax : int,  optional
             Maximum distance for filtering (the default is None,
             which implies `self.dmax`)
+        out : ndarray, optional
+            Preallocated float array with at least as many rows as measured
+            steps and 2 columns to write the result into (the default is
+            None, which allocates new array)
+        split : bool, optional
+            Return tuple of separate arrays with angles and distances
+            instead of one array (the default is False)
 
         Returns
         -------
@@ -439,10 +585,12 @@ class HokuyoLX(object):
             Array with measured distances and angles
         '''
         ts, scan = self.get_dist(start, end, grouping)
-        return ts, self._filter(scan, start, end, grouping, dmin, dmax)
+        return ts, self._filter(scan, start, end, grouping, dmin, dmax,
+                                out=out, split=split)
 
     def get_filtered_intens(self, start=None, end=None, grouping=0,
-                            dmin=None, dmax=None, imin=None, imax=None):
+                            dmin=None, dmax=None, imin=None, imax=None,
+                            out=None, split=False):
         '''Measure distances and intensities for the given parameters and
         perform basic filtering. Returns array with angles, distances and
         intensities.
@@ -469,6 +617,13 @@ class HokuyoLX(object):
         imax : int,  optional
             Maximum distance for filtering (the default is None,
             which disables maximum intensity filter)
+        out : ndarray, optional
+            Preallocated float array with at least as many rows as measured
+            steps and 3 columns to write the result into (the default is
+            None, which allocates new array)
+        split : bool, optional
+            Return tuple of separate arrays with angles, distances and intensities
+            instead of one array (the default is False)
 
         Returns
         -------
@@ -479,7 +634,7 @@ class HokuyoLX(object):
         '''
         ts, scan = self.get_intens(start, end, grouping)
         return ts, self._filter(scan, start, end, grouping,
-                                dmin, dmax, imin, imax)
+                                dmin, dmax, imin, imax, out, split)
 
     #Continous measurments
 
@@ -498,9 +653,7 @@ class HokuyoLX(object):
             raise HokuyoStatusException(status)
         self._logger.info('Starting scan response cycle')
         while True:
-            data = self._recv()
-            self._logger.debug('Recieved data in the scan response cycle: %s' %
-                              data)
+            data = self._recv(nlines=3)
             header = data.pop(0)
             # TODO add string part check for header
             req = cmd + params[:-2]
@@ -517,7 +670,7 @@ class HokuyoLX(object):
                 raise HokuyoStatusException(status)
             timestamp = self._convert2ts(data.pop(0))
 
-            scan = self._process_scan_data(data, with_intensity)
+            scan = self._process_scan_data(data.pop(0), with_intensity)
             self._logger.info('Got new scan, yielding...')
             yield (scan, timestamp, pending)
 
@@ -588,7 +741,8 @@ class HokuyoLX(object):
         return self._iter_meas(True, scans, start, end, grouping, skips)
 
     def iter_filtered_dist(self, scans=0, start=None, end=None, grouping=0,
-                           skips=0, dmin=None, dmax=None):
+                           skips=0, dmin=None, dmax=None, out=None,
+                           split=False):
         '''Generator for taking continous measurment of distances with
         additional filtering. If `scan` is equal to 0 infinite number of scans
         will be taken until laser is switched to the standby state.
@@ -617,6 +771,13 @@ class HokuyoLX(object):
         dmax : int,  optional
             Maximum distance for filtering (the default is None,
             which implies `self.dmax`)
+        out : ndarray, optional
+            Preallocated float array with at least as many rows as measured
+            steps and 2 columns to write the result into (the default is
+            None, which allocates new array), the same array is reused for every scan
+        split : bool, optional
+            Return tuple of separate arrays with angles and distances
+            instead of one array (the default is False)
 
         Yields
         -------
@@ -627,12 +788,13 @@ class HokuyoLX(object):
         '''
         gen = self.iter_dist(scans, start, end, grouping, skips)
         for scan, timestamp, pending in gen:
-            scan = self._filter(scan, start, end, grouping, dmin, dmax)
+            scan = self._filter(scan, start, end, grouping, dmin, dmax,
+                                out=out, split=split)
             yield (scan, timestamp, pending)
 
     def iter_filtered_intens(self, scans=0, start=None, end=None, grouping=0,
                              skips=0, dmin=None, dmax=None,
-                             imin=None, imax=None):
+                             imin=None, imax=None, out=None, split=False):
         '''Generator for taking continous measurment of distances and
         intensities with additional filtering. If `scan` is equal to 0 infinite
         number of scans will be taken until laser is switched to the standby
@@ -668,6 +830,13 @@ class HokuyoLX(object):
         imax : int,  optional
             Maximum distance for filtering (the default is None,
             which disables maximum intensity filter)
+        out : ndarray, optional
+            Preallocated float array with at least as many rows as measured
+            steps and 3 columns to write the result into (the default is
+            None, which allocates new array), the same array is reused for every scan
+        split : bool, optional
+            Return tuple of separate arrays with angles, distances and intensities
+            instead of one array (the default is False)
 
         Yields
         -------
@@ -679,9 +848,185 @@ class HokuyoLX(object):
         gen = self.iter_intens(scans, start, end, grouping, skips)
         for scan, timestamp, pending in gen:
             scan = self._filter(scan, start, end, grouping,
-                                dmin, dmax, imin, imax)
+                                dmin, dmax, imin, imax, out, split)
             yield (scan, timestamp, pending)
 
+    #Background continuous measurment
+
+    def _stream_loop(self, with_intensity, start, end, grouping, skips):
+        '''Body of the background thread: runs continuous measurment and
+        publishes every scan into the latest scan slot'''
+        seq = 0
+        try:
+            gen = self._iter_meas(with_intensity, 0, start, end,
+                                  grouping, skips)
+            for scan, timestamp, _ in gen:
+                seq += 1
+                with self._stream_cond:
+                    self._latest = (seq, time.time(), timestamp, scan)
+                    self._stream_cond.notify_all()
+                if self._stream_stop:
+                    break
+            gen.close()
+            self.standby()
+        except Exception as e:
+            self._logger.error('Continuous measurment stopped: %s', e)
+            self._stream_error = e
+        finally:
+            with self._stream_cond:
+                self._stream_thread = None
+                self._stream_cond.notify_all()
+
+    def start_stream(self, with_intensity=False, start=None, end=None,
+                     grouping=0, skips=0):
+        '''Starts continuous measurment in a background thread. Each recieved
+        scan is stored into the latest scan slot, which can be read without
+        waiting using `get_latest_scan` or awaited with `wait_next_scan`.
+        While the stream is running `get_dist`, `get_intens` and
+        their filtered versions return the latest scan instead of requesting
+        a new one from the sensor, other requests are not allowed.
+
+        Parameters
+        ----------
+        with_intensity : bool, optional
+            Measure with intensities or only distances (the default is False)
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        skips : int, optional
+            Number of scans to skip (the default is 0, 0 means all scans
+            will be published, 1 - every second, 2 - every third, etc.)
+        '''
+        if self.is_streaming():
+            raise HokuyoException('Continuous measurment is already running')
+        start = self.amin if start is None else start
+        end = self.amax if end is None else end
+        self._logger.info('Starting background continuous measurment')
+        with self._stream_cond:
+            self._latest = None
+            self._stream_error = None
+            self._stream_stop = False
+            self._stream_params = (with_intensity, start, end, grouping)
+            self._stream_thread = threading.Thread(
+                target=self._stream_loop, name='hokuyo-stream',
+                args=(with_intensity, start, end, grouping, skips))
+            self._stream_thread.daemon = True
+            self._stream_thread.start()
+
+    def stop_stream(self, activate=True):
+        '''Stops background continuous measurment and waits for its thread
+        to finish.
+
+        Parameters
+        ----------
+        activate : bool, optional
+            Switch the sensor back to the measurement state, so that single
+            measurments can be taken (the default is True)
+        '''
+        thread = self._stream_thread
+        if thread is None:
+            return
+        self._logger.info('Stopping background continuous measurment')
+        self._stream_stop = True
+        thread.join()
+        if activate and self._sock is not None:
+            self.activate()
+
+    def is_streaming(self):
+        '''Returns True if background continuous measurment is running'''
+        return self._stream_thread is not None
+
+    def _check_stream(self):
+        '''Raises exception if the background thread failed'''
+        if self._stream_error is not None:
+            raise HokuyoException('Continuous measurment failed: %s' %
+                                  self._stream_error)
+
+    def get_latest_scan(self, max_age_ms=None):
+        '''Returns the latest scan recieved by the background thread without
+        waiting for the sensor.
+
+        Parameters
+        ----------
+        max_age_ms : int, optional
+            Maximum age of the scan in milliseconds measured by the local
+            clock (the default is None, which disables the age check)
+
+        Returns
+        -------
+        seq : int
+            Sequence number of the scan, incremented for every new scan
+        timestamp : int
+            Timestamp of the measurment
+        scan : ndarray
+            Array with measured distances (and intensities if enabled)
+
+        None is returned if there is no scan yet or the latest scan is older
+        than `max_age_ms`.
+        '''
+        self._check_stream()
+        latest = self._latest
+        if latest is None:
+            return None
+        seq, recv_time, timestamp, scan = latest
+        if (max_age_ms is not None and
+                (time.time() - recv_time)*1000 > max_age_ms):
+            return None
+        return seq, timestamp, scan
+
+    def wait_next_scan(self, after=None, timeout=None):
+        '''Blocks until a scan newer than `after` is recieved by the
+        background thread.
+
+        Parameters
+        ----------
+        after : int, optional
+            Sequence number of the last seen scan (the default is None,
+            which implies the sequence number of the current latest scan)
+        timeout : float, optional
+            Maximum waiting time in seconds (the default is None, which
+            implies `self.timeout`)
+
+        Returns
+        -------
+        seq : int
+            Sequence number of the scan
+        timestamp : int
+            Timestamp of the measurment
+        scan : ndarray
+            Array with measured distances (and intensities if enabled)
+        '''
+        timeout = self.timeout if timeout is None else timeout
+        with self._stream_cond:
+            if after is None:
+                after = 0 if self._latest is None else self._latest[0]
+            ok = self._stream_cond.wait_for(
+                lambda: (self._stream_thread is None or
+                         (self._latest is not None and
+                          self._latest[0] > after)), timeout)
+            latest = self._latest
+        self._check_stream()
+        if not ok or latest is None or latest[0] <= after:
+            raise HokuyoException('Timeout while waiting for the next scan')
+        return latest[0], latest[2], latest[3]
+
+    def _stream_measurment(self, with_intensity, start, end, grouping):
+        '''Returns the latest scan from the background thread in place of
+        the single measurment, waiting only for the very first scan'''
+        if self._stream_params != (with_intensity, start, end, grouping):
+            raise HokuyoException(
+                'Requested scan parameters differ from the parameters of '
+                'the running continuous measurment')
+        latest = self.get_latest_scan()
+        if latest is None:
+            latest = self.wait_next_scan(0)
+        return latest[1], latest[2]
+
     #Time synchronization methods
 
     def _tsync_cmd(self, code):
@@ -726,18 +1071,24 @@ class HokuyoLX(object):
         self._logger.info('Exiting time sync mode')
         return self._tsync_cmd(2)
 
-    def time_sync(self, N=10, dt=0.1):
-        '''Performs time synchronization by doing `tsync_get`requests each `dt`
-        seconds N times. After that it finds mean time shift, saving it into
-        `self.tzero`. This value also can be interpreted as the time when
-        the sensor was turned in.
+    def time_sync(self, N=5, dt=0.):
+        '''Performs time synchronization by doing `tsync_get` requests
+        each `dt` seconds N times. The offset of the sensor clock is fitted
+        to the sensor times and midpoints of the requests and saved into
+        `self.clock`, the drift is left at zero. The requests span only a
+        few milliseconds (~100 ms even with `dt`), while the timestamps
+        have 1 ms resolution and a few ms of request jitter, so a slope
+        fitted to them would be off by ~1e-2, two orders of magnitude more
+        than the drift of the sensor crystal (~1e-5..1e-4). The drift is
+        fitted later, once the scan timestamps used to refine the model
+        span at least `clock.min_span` (10 s by default).
 
         Parameters
         ----------
         N : int, optional
-            Number of times to request time from the sensor (the default is 10)
+            Number of times to request time from the sensor (the default is 5)
         dt : float, optional
-            Time between time requests (the default is 0.1)
+            Time between time requests (the default is 0)
         '''
         self._logger.info('Starting time synchronization.')
         self._force_standby()
@@ -748,14 +1099,20 @@ class HokuyoLX(object):
                 (description, code))
 
         self._logger.info('Collecting timestamps...')
-        tzero_list = []
+        self.clock.reset()
+        sensor, local = [], []
         for _ in range(N):
-            tzero_list.append(time.time()*1000 - self.tsync_get())
-            time.sleep(dt)
-        self.tzero = int(np.mean(np.rint(np.array(tzero_list))))
-        self._tn = 0
-
-        self._logger.info('Time sync done, t0: %d ms' % self.tzero)
+            t0 = time.time()
+            ts = self.tsync_get()
+            t1 = time.time()
+            sensor.append(self.clock.unwrap(ts))
+            local.append((t0 + t1)*500)
+            if dt:
+                time.sleep(dt)
+        self.clock.fit(sensor, local)
+
+        self._logger.info('Time sync done, t0: %d ms, drift: %g' %
+                          (self.tzero, self.clock.drift))
 
         code, description = self.tsync_exit()
         if code != '00':
@@ -763,6 +1120,16 @@ class HokuyoLX(object):
                 'Failed to exit time sync mode: %s (%s)' %
                 (description, code))
 
+    @property
+    def tzero(self):
+        '''Local UNIX time in ms of the sensor time zero'''
+        return int(round(self.clock.tzero))
+
+    @property
+    def tn(self):
+        '''Sensor timestamp overflow counter'''
+        return self.clock.tn
+
     #Sensor information
 
     def _process_info_line(self, line):
@@ -920,6 +1287,8 @@ class HokuyoLX(object):
 
     def close(self):
         '''Disconnects from the sensor closing TCP socket'''
+        if self.is_streaming():
+            self.stop_stream(False)
         if self._sock is None:
             self._logger.info('Close: socket already closed')
             return
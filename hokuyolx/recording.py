@@ -0,0 +1,425 @@
+'''Recording of scans into compact binary logs and their replay.
+
+Log layout (little-endian):
+
+- fixed 128 byte header (`LOG_HEADER`) with sensor parameters and scan
+  parameters (start, end, grouping),
+- angle table, `float64` per beam,
+- fixed size records: `int64` timestamp, `float64` local UNIX time of
+  reception, `uint16` ranges per beam and, if enabled, `uint16` intensities.
+
+Records are only ever appended, so a log which was cut short (e.g. by power
+loss) stays readable up to its last complete record. As all records have the
+same size `ReplayLaser` maps the file into memory and seeks in constant time,
+so logs of any length are never loaded into RAM.
+
+Usage example:
+
+>>> from hokuyolx import HokuyoLX
+>>> from hokuyolx.recording import ScanRecorder, ReplayLaser
+>>> laser = ScanRecorder(HokuyoLX(), 'run.hkl')
+>>> timestamp, scan = laser.get_filtered_dist() # recorded
+>>> laser.close()
+>>> replay = ReplayLaser('run.hkl', realtime=True)
+>>> timestamp, scan = replay.get_filtered_dist() # same scan as above
+'''
+import os
+import struct
+import time
+import numpy as np
+from .hokuyo import HokuyoLX
+from .exceptions import HokuyoException
+
+#: Magic bytes at the beginning of every log
+LOG_MAGIC = b'HKYSCAN\x00'
+#: Version of the log format
+LOG_VERSION = 1
+#: Header layout: magic, version, flags, number of beams, amin, amax, aforw,
+#: ares, dmin, dmax, start, end, grouping, scan frequency, model
+LOG_HEADER = struct.Struct('<8sHHI9id16s')
+#: Size reserved for the header
+LOG_HEADER_SIZE = 128
+#: Flag set when records contain intensities
+FLAG_INTENSITY = 1
+
+
+def _record_dtype(nbeams, with_intensity):
+    '''Returns numpy dtype of one log record'''
+    fields = [('timestamp', '<i8'), ('time', '<f8'),
+              ('ranges', '<u2', (nbeams,))]
+    if with_intensity:
+        fields.append(('intens', '<u2', (nbeams,)))
+    return np.dtype(fields)
+
+
+class ScanRecorder(object):
+    '''Wrapper around `HokuyoLX` which appends every measured scan to a binary
+    log. It offers the measurment methods of the wrapped laser, so it can be
+    passed to `SLAM` or `Lidar` instead of it, all other attributes are taken
+    from the wrapped laser.'''
+
+    _last = None #: Timestamp of the last recorded scan
+
+    def __init__(self, laser, path, with_intensity=False, start=None,
+                 end=None, grouping=0, append=True):
+        '''Creates new recorder.
+
+        Parameters
+        ----------
+        laser : `HokuyoLX` instance
+            Laser to take measurments with
+        path : str
+            Path of the log file
+        with_intensity : bool, optional
+            Record intensities too? (the default is False)
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `laser.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `laser.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        append : bool, optional
+            Append to the existing log with the same parameters instead of
+            overwriting it (the default is True)
+        '''
+        super(ScanRecorder, self).__init__()
+        self.laser = laser
+        self.path = path
+        self.with_intensity = with_intensity
+        self.start = laser.amin if start is None else start
+        self.end = laser.amax if end is None else end
+        self.grouping = grouping
+        angles = laser.get_angles(self.start, self.end, grouping)
+        self._dtype = _record_dtype(len(angles), with_intensity)
+        header = self._make_header(angles)
+        if (append and os.path.exists(path) and
+                os.path.getsize(path) >= len(header)):
+            with open(path, 'rb') as f:
+                if f.read(len(header)) != header:
+                    raise HokuyoException('Existing log %s was recorded with '
+                                          'other parameters' % path)
+            size = os.path.getsize(path)
+            complete = size - (size - len(header)) % self._dtype.itemsize
+            self._file = open(path, 'r+b', buffering=0)
+            self._file.truncate(complete)
+            if complete > len(header):
+                self._file.seek(complete - self._dtype.itemsize)
+                last = np.frombuffer(self._file.read(self._dtype.itemsize),
+                                     self._dtype)
+                self._last = int(last['timestamp'][0])
+            self._file.seek(complete)
+        else:
+            self._file = open(path, 'wb', buffering=0)
+            self._file.write(header)
+        self.count = 0 #: Number of scans recorded by this recorder
+
+    def _make_header(self, angles):
+        '''Returns header and angle table bytes'''
+        laser = self.laser
+        flags = FLAG_INTENSITY if self.with_intensity else 0
+        head = LOG_HEADER.pack(
+            LOG_MAGIC, LOG_VERSION, flags, len(angles), laser.amin,
+            laser.amax, laser.aforw, laser.ares, laser.dmin, laser.dmax,
+            self.start, self.end, self.grouping, float(laser.scan_freq),
+            str(laser.model).encode('ascii', 'replace')[:16])
+        head = head.ljust(LOG_HEADER_SIZE, b'\x00')
+        return head + np.asarray(angles, '<f8').tobytes()
+
+    def __getattr__(self, name):
+        return getattr(self.laser, name)
+
+    def record(self, timestamp, scan):
+        '''Appends scan to the log, unless it has the timestamp of the last
+        recorded scan: while streaming, measurments return the latest scan
+        again until the next one arrives, and it is recorded only once.
+        Returns True if the scan was recorded.
+
+        Parameters
+        ----------
+        timestamp : int
+            Timestamp of the measurment
+        scan : ndarray
+            Array with measured distances, or distances and intensities
+        '''
+        if timestamp == self._last:
+            return False
+        self._last = timestamp
+        rec = np.zeros(1, self._dtype)
+        rec['timestamp'] = timestamp
+        rec['time'] = time.time()
+        scan = np.asarray(scan)
+        if scan.ndim == 2:
+            rec['ranges'] = np.minimum(scan[:, 0], 0xffff)
+            if self.with_intensity:
+                rec['intens'] = np.minimum(scan[:, 1], 0xffff)
+        else:
+            rec['ranges'] = np.minimum(scan, 0xffff)
+        self._file.write(rec.tobytes())
+        self.count += 1
+        return True
+
+    def _check_params(self, start, end, grouping):
+        if ((start is not None and start != self.start) or
+                (end is not None and end != self.end) or
+                grouping not in (0, self.grouping)):
+            raise HokuyoException('Recorder only takes measurments with '
+                                  'the parameters it was created with')
+
+    def _measure(self):
+        if self.with_intensity:
+            ts, scan = self.laser.get_intens(self.start, self.end,
+                                             self.grouping)
+        else:
+            ts, scan = self.laser.get_dist(self.start, self.end,
+                                           self.grouping)
+        self.record(ts, scan)
+        return ts, scan
+
+    def get_dist(self, start=None, end=None, grouping=0):
+        '''Measures and records distances, see `HokuyoLX.get_dist`'''
+        self._check_params(start, end, grouping)
+        ts, scan = self._measure()
+        return ts, (scan[:, 0] if scan.ndim == 2 else scan)
+
+    def get_intens(self, start=None, end=None, grouping=0):
+        '''Measures and records distances and intensities, see
+        `HokuyoLX.get_intens`'''
+        self._check_params(start, end, grouping)
+        if not self.with_intensity:
+            raise HokuyoException('Recorder was created without intensities')
+        return self._measure()
+
+    def get_filtered_dist(self, start=None, end=None, grouping=0,
+                          dmin=None, dmax=None):
+        '''Measures and records distances and returns them filtered, see
+        `HokuyoLX.get_filtered_dist`'''
+        ts, scan = self.get_dist(start, end, grouping)
+        return ts, self.laser._filter(scan, self.start, self.end,
+                                      self.grouping, dmin, dmax)
+
+    def get_filtered_intens(self, start=None, end=None, grouping=0,
+                            dmin=None, dmax=None, imin=None, imax=None):
+        '''Measures and records distances and intensities and returns them
+        filtered, see `HokuyoLX.get_filtered_intens`'''
+        ts, scan = self.get_intens(start, end, grouping)
+        return ts, self.laser._filter(scan, self.start, self.end,
+                                      self.grouping, dmin, dmax, imin, imax)
+
+    def iter_dist(self, scans=0, start=None, end=None, grouping=0, skips=0):
+        '''Continuous measurment of distances with recording, see
+        `HokuyoLX.iter_dist`'''
+        self._check_params(start, end, grouping)
+        if self.with_intensity:
+            gen = self.laser.iter_intens(scans, self.start, self.end,
+                                         self.grouping, skips)
+        else:
+            gen = self.laser.iter_dist(scans, self.start, self.end,
+                                       self.grouping, skips)
+        for scan, timestamp, pending in gen:
+            self.record(timestamp, scan)
+            yield (scan[:, 0] if scan.ndim == 2 else scan), timestamp, pending
+
+    def iter_filtered_dist(self, scans=0, start=None, end=None, grouping=0,
+                           skips=0, dmin=None, dmax=None):
+        '''Continuous measurment of filtered distances with recording, see
+        `HokuyoLX.iter_filtered_dist`'''
+        for scan, timestamp, pending in self.iter_dist(scans, start, end,
+                                                       grouping, skips):
+            scan = self.laser._filter(scan, self.start, self.end,
+                                      self.grouping, dmin, dmax)
+            yield scan, timestamp, pending
+
+    def close(self, laser=True):
+        '''Closes the log and, if `laser` is True, the wrapped laser'''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if laser:
+            self.laser.close()
+
+
+class ReplayLaser(object):
+    '''Laser which replays scans from a log written by `ScanRecorder`. It
+    offers the measurment methods of `HokuyoLX`, every measurment returns the
+    next recorded scan. The log is memory-mapped, so only the scans which are
+    replayed are read from the disk.'''
+
+    _angles = None #: Cache of angle tables: (sensor parameters, tables)
+    _filter = HokuyoLX._filter
+    get_angles = HokuyoLX.get_angles
+
+    def __init__(self, path, realtime=False, speed=1., loop=False):
+        '''Opens log for replay.
+
+        Parameters
+        ----------
+        path : str
+            Path of the log file
+        realtime : bool, optional
+            Pace replay according to the recorded timestamps? If False scans
+            are returned as fast as possible (the default is False)
+        speed : float, optional
+            Replay speed factor for the real-time mode (the default is 1)
+        loop : bool, optional
+            Restart from the beginning after the last scan instead of raising
+            an exception (the default is False)
+        '''
+        super(ReplayLaser, self).__init__()
+        self.path = path
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        with open(path, 'rb') as f:
+            head = f.read(LOG_HEADER_SIZE)
+            if len(head) < LOG_HEADER.size:
+                raise HokuyoException('File %s is not a scan log' % path)
+            (magic, version, flags, nbeams, self.amin, self.amax, self.aforw,
+             self.ares, self.dmin, self.dmax, self.start, self.end,
+             self.grouping, self.scan_freq, model) = LOG_HEADER.unpack(
+                 head[:LOG_HEADER.size])
+            if magic != LOG_MAGIC:
+                raise HokuyoException('File %s is not a scan log' % path)
+            if version != LOG_VERSION:
+                raise HokuyoException('Unsupported log version %d' % version)
+            self.model = model.rstrip(b'\x00').decode('ascii', 'replace')
+            self.with_intensity = bool(flags & FLAG_INTENSITY)
+            self.angles = np.fromfile(f, '<f8', nbeams)
+        offset = LOG_HEADER_SIZE + 8*nbeams
+        dtype = _record_dtype(nbeams, self.with_intensity)
+        count = (os.path.getsize(path) - offset)//dtype.itemsize
+        if count > 0:
+            self._records = np.memmap(path, dtype, 'r', offset, (count,))
+        else:
+            self._records = np.zeros(0, dtype)
+        self._pos = 0
+        self._pace = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def tell(self):
+        '''Returns index of the next scan to be replayed'''
+        return self._pos
+
+    def seek(self, index):
+        '''Moves replay to the scan with the given index, negative indices
+        count from the end'''
+        n = len(self._records)
+        if index < 0:
+            index += n
+        if not 0 <= index <= n:
+            raise HokuyoException('Scan index %d is out of range' % index)
+        self._pos = index
+        self._pace = None
+
+    def seek_time(self, timestamp):
+        '''Moves replay to the first scan with timestamp not earlier than
+        `timestamp`'''
+        self.seek(int(np.searchsorted(self._records['timestamp'], timestamp)))
+
+    def timestamps(self):
+        '''Returns memory-mapped view of all recorded timestamps'''
+        return self._records['timestamp']
+
+    def _next(self):
+        '''Returns next record, pacing it in the real-time mode'''
+        if self._pos >= len(self._records):
+            if not self.loop or not len(self._records):
+                raise HokuyoException('End of the scan log')
+            self.seek(0)
+        rec = self._records[self._pos]
+        self._pos += 1
+        if self.realtime:
+            ts = int(rec['timestamp'])
+            now = time.time()
+            if self._pace is None:
+                self._pace = (now, ts)
+            else:
+                delay = (self._pace[0] + (ts - self._pace[1])/1000./self.speed
+                         - now)
+                if delay > 0:
+                    time.sleep(delay)
+        return rec
+
+    def _check_params(self, start, end, grouping):
+        if ((start is not None and start != self.start) or
+                (end is not None and end != self.end) or
+                grouping not in (0, self.grouping)):
+            raise HokuyoException('Scan parameters differ from the recorded '
+                                  'ones')
+
+    def get_dist(self, start=None, end=None, grouping=0):
+        '''Returns the next recorded distances, see `HokuyoLX.get_dist`'''
+        self._check_params(start, end, grouping)
+        rec = self._next()
+        return int(rec['timestamp']), rec['ranges'].astype(np.uint32)
+
+    def get_intens(self, start=None, end=None, grouping=0):
+        '''Returns the next recorded distances and intensities, see
+        `HokuyoLX.get_intens`'''
+        self._check_params(start, end, grouping)
+        if not self.with_intensity:
+            raise HokuyoException('Log was recorded without intensities')
+        rec = self._next()
+        scan = np.column_stack((rec['ranges'], rec['intens']))
+        return int(rec['timestamp']), scan.astype(np.uint32)
+
+    def get_filtered_dist(self, start=None, end=None, grouping=0,
+                          dmin=None, dmax=None):
+        '''Returns the next recorded distances filtered, see
+        `HokuyoLX.get_filtered_dist`'''
+        ts, scan = self.get_dist(start, end, grouping)
+        return ts, self._filter(scan, self.start, self.end, self.grouping,
+                                dmin, dmax)
+
+    def get_filtered_intens(self, start=None, end=None, grouping=0,
+                            dmin=None, dmax=None, imin=None, imax=None):
+        '''Returns the next recorded distances and intensities filtered, see
+        `HokuyoLX.get_filtered_intens`'''
+        ts, scan = self.get_intens(start, end, grouping)
+        return ts, self._filter(scan, self.start, self.end, self.grouping,
+                                dmin, dmax, imin, imax)
+
+    def _iter(self, get, scans):
+        n = 0
+        while self._pos < len(self._records) or self.loop:
+            ts, scan = get()
+            n += 1
+            pending = scans - n if scans else 0
+            yield scan, ts, pending
+            if scans and pending == 0:
+                break
+
+    def iter_dist(self, scans=0, start=None, end=None, grouping=0, skips=0):
+        '''Generator replaying recorded distances, see `HokuyoLX.iter_dist`.
+        If `scans` is 0 all remaining scans are replayed.'''
+        self._check_params(start, end, grouping)
+        gen = self._iter(self.get_dist, scans*(skips + 1))
+        for i, item in enumerate(gen):
+            if i % (skips + 1) == 0:
+                yield item
+
+    def iter_intens(self, scans=0, start=None, end=None, grouping=0, skips=0):
+        '''Generator replaying recorded distances and intensities, see
+        `HokuyoLX.iter_intens`'''
+        self._check_params(start, end, grouping)
+        gen = self._iter(self.get_intens, scans*(skips + 1))
+        for i, item in enumerate(gen):
+            if i % (skips + 1) == 0:
+                yield item
+
+    def iter_filtered_dist(self, scans=0, start=None, end=None, grouping=0,
+                           skips=0, dmin=None, dmax=None):
+        '''Generator replaying recorded distances filtered, see
+        `HokuyoLX.iter_filtered_dist`'''
+        for scan, ts, pending in self.iter_dist(scans, start, end, grouping,
+                                                skips):
+            scan = self._filter(scan, self.start, self.end, self.grouping,
+                                dmin, dmax)
+            yield scan, ts, pending
+
+    def close(self):
+        '''Releases the memory-mapped log'''
+        self._records = np.zeros(0, self._records.dtype)
@@ -0,0 +1,535 @@
+'''Local stand-in for Hokuyo UST laser rangefinders. It speaks the subset of
+SCIP 2.0 used by `HokuyoLX` over TCP, so that the driver and everything built
+on top of it can be exercised and benchmarked without the physical sensor.
+
+Ranges are ray-cast from a 2D world made of polygons (in meters) at the
+configured scan rate, sensor timestamps can be given an offset and a drift
+and faults (lost replies, unstable status, checksum errors) can be injected.
+
+Usage example:
+
+>>> from hokuyolx import HokuyoLX
+>>> from hokuyolx.simulator import FakeHokuyo, box_world
+>>> with FakeHokuyo(box_world(4, 3), scan_freq=100) as fake:
+...     laser = HokuyoLX(addr=fake.addr)
+...     timestamp, scan = laser.get_filtered_dist()
+
+It can also be started from the command line:
+
+    python -m hokuyolx.simulator --port 10940 --freq 40
+'''
+import socketserver
+import threading
+import logging
+import random
+import time
+import numpy as np
+from codecs import encode, decode
+
+#: Range reported for beams which did not hit anything (no echo)
+NO_ECHO = 65533
+
+
+def with_sum(msg):
+    '''Appends SCIP checksum char to the given string'''
+    return msg + chr((sum(bytearray(encode(msg, 'ascii'))) & 0x3f) + 0x30)
+
+
+def encode_int(value, nchars):
+    '''Encodes integer as `nchars` chars using 6 bit encoding'''
+    return ''.join(chr(((value >> 6*(nchars - i - 1)) & 0x3f) + 0x30)
+                   for i in range(nchars))
+
+
+def encode_scan(values):
+    '''Encodes scan values as 3 char groups and splits them into data blocks
+    of 64 chars with checksums. Returns list of blocks.'''
+    v = np.asarray(values, np.uint32).ravel()
+    chars = np.empty((v.size, 3), np.uint8)
+    chars[:, 0] = ((v >> 12) & 0x3f) + 0x30
+    chars[:, 1] = ((v >> 6) & 0x3f) + 0x30
+    chars[:, 2] = (v & 0x3f) + 0x30
+    raw = decode(chars.tobytes(), 'ascii')
+    return [with_sum(raw[i:i + 64]) for i in range(0, len(raw), 64)]
+
+
+def box_world(width, height, obstacles=()):
+    '''Returns world made of a rectangular room of `width` x `height` meters
+    centered at the origin and optional polygonal `obstacles`'''
+    w, h = width/2., height/2.
+    return [[(-w, -h), (w, -h), (w, h), (-w, h)]] + list(obstacles)
+
+
+class FakeHokuyo(object):
+    '''TCP server emulating Hokuyo UST laser rangefinder'''
+
+    dmin = 20 #: Minimum measurable distance (in millimeters)
+    dmax = 30000 #: Maximum measurable distance (in millimeters)
+    ares = 1440 #: Angular resolution (number of partitions in 360 degrees)
+    amin = 0 #: Minimum step number of the scanning area
+    amax = 1080 #: Maximum step number of the scanning area
+    aforw = 540 #: Step number of the front direction
+    model = 'UST-10LX' #: Sensor model
+
+    _server = None #: Underlying TCP server
+    _thread = None #: Thread serving connections
+
+    def __init__(self, world=None, pose=(0., 0., 0.), addr=('127.0.0.1', 0),
+                 scan_freq=40, noise=0., intensity=1000, clock_offset=0,
+                 clock_drift=0., faults=None, seed=None, logger=None):
+        '''Creates new fake sensor, the server is started by `start`.
+
+        Parameters
+        ----------
+        world : list, optional
+            List of polygons, each is a list of (x, y) vertices in meters
+            (the default is None, which implies 10 x 10 m room)
+        pose : tuple or callable, optional
+            Sensor pose (x, y, theta) in meters and radians, or a callable
+            taking time in seconds since start and returning the pose
+            (the default is (0, 0, 0))
+        addr : tuple, optional
+            Address to listen on, port 0 picks a free port
+            (the default is `('127.0.0.1', 0)`)
+        scan_freq : float, optional
+            Scanning frequency in Hz, may be well above the real sensor
+            (the default is 40)
+        noise : float, optional
+            Standard deviation of gaussian range noise in millimeters
+            (the default is 0)
+        intensity : int, optional
+            Intensity reported for beams which hit the world
+            (the default is 1000)
+        clock_offset : int, optional
+            Sensor clock value at start in milliseconds (the default is 0)
+        clock_drift : float, optional
+            Relative drift of the sensor clock, e.g. 1e-4 makes it run
+            0.01% fast (the default is 0)
+        faults : dict, optional
+            Probabilities of faults per scan reply, keys are 'timeout'
+            (reply is dropped), 'unstable' (reply with status 0M) and
+            'checksum' (reply with corrupted checksum)
+        seed : int, optional
+            Seed for noise and fault generation
+        logger : `logging._logger` instance, optional
+            Logger instance, if none is provided new instance is created
+        '''
+        super(FakeHokuyo, self).__init__()
+        self.world = box_world(10, 10) if world is None else world
+        self.pose = pose
+        self.scan_freq = scan_freq
+        self.noise = noise
+        self.intensity = intensity
+        self.clock_offset = clock_offset
+        self.clock_drift = clock_drift
+        self.faults = dict(faults or {})
+        self._forced = {}
+        self._rand = random.Random(seed)
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._logger = (logging.getLogger('hokuyo.simulator')
+                        if logger is None else logger)
+        self._listen = addr
+        self._t0 = time.monotonic()
+        self.set_world(self.world)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def addr(self):
+        '''Address the server is listening on'''
+        return self._server.server_address[:2]
+
+    def start(self):
+        '''Starts serving connections in a background thread'''
+        fake = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                _Session(fake, self.request).run()
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer(self._listen, Handler)
+        self._server.daemon_threads = True
+        self._t0 = time.monotonic()
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='fake-hokuyo')
+        self._thread.daemon = True
+        self._thread.start()
+        self._logger.info('Fake sensor listening on %s:%d', *self.addr)
+
+    def stop(self):
+        '''Stops the server'''
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = self._thread = None
+
+    def serve_forever(self):
+        '''Starts the server and blocks until interrupted'''
+        self.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    #World and measurments
+
+    def set_world(self, world):
+        '''Replaces world polygons'''
+        starts, ends = [], []
+        for poly in world:
+            pts = np.asarray(poly, float)
+            starts.append(pts)
+            ends.append(np.roll(pts, -1, axis=0))
+        self.world = world
+        with self._lock:
+            self._seg_a = np.vstack(starts) if starts else np.empty((0, 2))
+            self._seg_b = np.vstack(ends) if ends else np.empty((0, 2))
+
+    def force_fault(self, kind, count=1):
+        '''Forces next `count` scan replies to have the given fault:
+        'timeout', 'unstable' or 'checksum' '''
+        with self._lock:
+            self._forced[kind] = self._forced.get(kind, 0) + count
+
+    def _next_fault(self):
+        '''Returns fault to apply to the next scan reply or None'''
+        with self._lock:
+            for kind in ('timeout', 'unstable', 'checksum'):
+                if self._forced.get(kind):
+                    self._forced[kind] -= 1
+                    return kind
+            for kind in ('timeout', 'unstable', 'checksum'):
+                if self._rand.random() < self.faults.get(kind, 0):
+                    return kind
+        return None
+
+    def elapsed(self):
+        '''Seconds since the server start'''
+        return time.monotonic() - self._t0
+
+    def timestamp(self):
+        '''Current value of the 24 bit sensor clock in milliseconds'''
+        ms = self.clock_offset + self.elapsed()*1000*(1 + self.clock_drift)
+        return int(ms) & 0xffffff
+
+    def get_angles(self):
+        '''Beam angles of all steps in the sensor frame'''
+        steps = np.arange(self.amin, self.amax + 1)
+        return 2*np.pi*(steps - self.aforw)/self.ares
+
+    def measure(self, with_intensity=False):
+        '''Ray-casts all beams of the sensor against the world from the
+        current pose. Returns distances (and intensities) in millimeters'''
+        pose = self.pose(self.elapsed()) if callable(self.pose) else self.pose
+        x, y, theta = pose
+        ang = self.get_angles() + theta
+        d = np.column_stack((np.cos(ang), np.sin(ang)))
+        with self._lock:
+            a, b = self._seg_a, self._seg_b
+        e = b - a
+        ap = a - np.array([x, y])
+        denom = np.outer(d[:, 0], e[:, 1]) - np.outer(d[:, 1], e[:, 0])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (ap[:, 0]*e[:, 1] - ap[:, 1]*e[:, 0])/denom
+            u = (np.outer(d[:, 1], ap[:, 0]) -
+                 np.outer(d[:, 0], ap[:, 1]))/denom
+        hit = (denom != 0) & (t > 0) & (u >= 0) & (u <= 1)
+        t = np.where(hit, t, np.inf)
+        dist = t.min(axis=1)*1000 if t.shape[1] else np.full(len(d), np.inf)
+        if self.noise:
+            dist = dist + self._rng.normal(0, self.noise, dist.shape)
+        no_echo = ~np.isfinite(dist) | (dist > self.dmax)
+        dist = np.where(no_echo, NO_ECHO,
+                        np.clip(np.nan_to_num(dist), 0, self.dmax))
+        dist = dist.astype(np.uint32)
+        if not with_intensity:
+            return dist
+        intens = np.where(no_echo, 0, self.intensity).astype(np.uint32)
+        return np.column_stack((dist, intens))
+
+    def parameters(self):
+        '''Sensor internal parameters as reported by PP command'''
+        return [('MODL', self.model), ('DMIN', self.dmin),
+                ('DMAX', self.dmax), ('ARES', self.ares),
+                ('AMIN', self.amin), ('AMAX', self.amax),
+                ('AFRT', self.aforw), ('SCAN', int(self.scan_freq*60))]
+
+
+class _Session(object):
+    '''Single client connection to the fake sensor'''
+
+    def __init__(self, fake, sock):
+        self.fake = fake
+        self.sock = sock
+        self.state = '000'
+        self.laser_on = False
+        self._wlock = threading.Lock()
+        self._stream = None
+        self._stop = threading.Event()
+
+    def send(self, echo, status, lines=()):
+        '''Sends reply with given echo, status and data lines'''
+        msg = echo + '\n' + with_sum(status) + '\n'
+        msg += ''.join(line + '\n' for line in lines) + '\n'
+        with self._wlock:
+            self.sock.sendall(encode(msg, 'ascii'))
+
+    def run(self):
+        buf = b''
+        try:
+            while True:
+                data = self.sock.recv(4096)
+                if not data:
+                    break
+                buf += data
+                while b'\n' in buf:
+                    line, buf = buf.split(b'\n', 1)
+                    line = decode(line, 'ascii').rstrip('\r')
+                    if line:
+                        self.handle(line)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.stop_stream()
+
+    def handle(self, line):
+        cmd = line[:3] if line.startswith('%') else line[:2]
+        params = line[len(cmd):].split(';', 1)[0]
+        self.fake._logger.debug('Fake sensor got: %s', line)
+        handler = getattr(self, 'cmd_' + cmd.replace('%', 'P'), None)
+        if handler is None:
+            self.send(line, '0E')
+        else:
+            handler(line, params)
+
+    def scan_lines(self, with_intensity, start, end, grouping):
+        '''Returns timestamp line and data blocks for one scan, together
+        with the fault to apply'''
+        fake = self.fake
+        scan = fake.measure(with_intensity)
+        scan = scan[start - fake.amin:end - fake.amin + 1]
+        if grouping > 1:
+            n = len(scan)//grouping*grouping
+            groups = scan[:n].reshape((-1, grouping) + scan.shape[1:])
+            scan = groups.min(axis=1)
+        lines = [with_sum(encode_int(fake.timestamp(), 4))]
+        lines += encode_scan(scan)
+        fault = fake._next_fault()
+        if fault == 'checksum':
+            blk = lines[1]
+            lines[1] = blk[:-1] + chr(((ord(blk[-1]) - 0x30 + 1) & 0x3f) + 0x30)
+        return lines, fault
+
+    def parse_scan_params(self, params, n):
+        try:
+            start, end = int(params[0:4]), int(params[4:8])
+            grouping = int(params[8:10])
+            rest = [int(params[10:11]), int(params[11:13])] if n == 5 else []
+        except ValueError:
+            return None
+        if len(params) != (10 if n == 3 else 13):
+            return None
+        if not (self.fake.amin <= start <= end <= self.fake.amax):
+            return None
+        return [start, end, max(grouping, 1)] + rest
+
+    #Commands
+
+    def cmd_BM(self, line, params):
+        if self.state == '002':
+            self.send(line, '10')
+        elif self.laser_on:
+            self.send(line, '02')
+        else:
+            self.laser_on = True
+            self.state = '003'
+            self.send(line, '00')
+
+    def cmd_QT(self, line, params):
+        self.stop_stream()
+        self.laser_on = False
+        self.state = '000'
+        self.send(line, '00')
+
+    def cmd_TM(self, line, params):
+        if params == '0':
+            if self.state == '002':
+                self.send(line, '02')
+            else:
+                self.state = '002'
+                self.send(line, '00')
+        elif params == '1':
+            if self.state != '002':
+                self.send(line, '04')
+            else:
+                ts = with_sum(encode_int(self.fake.timestamp(), 4))
+                self.send(line, '00', [ts])
+        elif params == '2':
+            if self.state != '002':
+                self.send(line, '03')
+            else:
+                self.state = '000'
+                self.send(line, '00')
+        else:
+            self.send(line, '01')
+
+    def cmd_PST(self, line, params):
+        self.send(line, '00', [with_sum(self.state)])
+
+    def cmd_PP(self, line, params):
+        lines = []
+        for key, value in self.fake.parameters():
+            item = '%s:%s' % (key, value)
+            lines.append(item + ';' + with_sum(item)[-1])
+        self.send(line, '00', lines)
+
+    def cmd_VV(self, line, params):
+        items = ['VEND:Fake Hokuyo', 'PROD:%s' % self.fake.model,
+                 'FIRM:1.0.0', 'PROT:SCIP 2.0', 'SERI:00000000']
+        self.send(line, '00', [i + ';' + with_sum(i)[-1] for i in items])
+
+    def cmd_II(self, line, params):
+        items = ['MODL:%s' % self.fake.model,
+                 'LASR:%s' % ('ON' if self.laser_on else 'OFF'),
+                 'SCSP:%d' % int(self.fake.scan_freq*60),
+                 'MESM:Measuring by Normal Mode',
+                 'TIME:%s' % encode_int(self.fake.timestamp(), 4),
+                 'STAT:Stable 000 no error.']
+        self.send(line, '00', [i + ';' + with_sum(i)[-1] for i in items])
+
+    def _single(self, line, params, with_intensity):
+        parsed = self.parse_scan_params(params, 3)
+        if parsed is None:
+            self.send(line, '0H')
+            return
+        if not self.laser_on or self.state == '002':
+            self.send(line, '10')
+            return
+        #like the real sensor, answer with the next scan of the rotation
+        period = 1./self.fake.scan_freq
+        elapsed = self.fake.elapsed()
+        time.sleep((elapsed//period + 1)*period - elapsed)
+        lines, fault = self.scan_lines(with_intensity, *parsed)
+        if fault == 'timeout':
+            return
+        if fault == 'unstable':
+            self.send(line, '0M')
+            return
+        self.send(line, '00', lines)
+
+    def cmd_GD(self, line, params):
+        self._single(line, params, False)
+
+    def cmd_GE(self, line, params):
+        self._single(line, params, True)
+
+    def _multi(self, line, params, with_intensity):
+        parsed = self.parse_scan_params(params, 5)
+        if parsed is None:
+            self.send(line, '0H')
+            return
+        if self.state == '002':
+            self.send(line, '10')
+            return
+        self.stop_stream()
+        self.laser_on = True
+        self.state = '004'
+        self.send(line, '00')
+        self._stop.clear()
+        self._stream = threading.Thread(
+            target=self._stream_loop, args=(line, with_intensity, parsed))
+        self._stream.daemon = True
+        self._stream.start()
+
+    def _stream_loop(self, line, with_intensity, parsed):
+        start, end, grouping, skips, scans = parsed
+        cmd, _, string = line.partition(';')
+        prefix = cmd[:-2]
+        suffix = ';' + string if string else ''
+        period = 1./self.fake.scan_freq
+        deadline = time.monotonic()
+        sent = 0
+        n = 0
+        while not self._stop.is_set():
+            deadline += period
+            delay = deadline - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            n += 1
+            if (n - 1) % (skips + 1):
+                continue
+            remaining = max(scans - sent - 1, 0) if scans else 0
+            echo = '%s%0.2d%s' % (prefix, remaining, suffix)
+            lines, fault = self.scan_lines(with_intensity, start, end,
+                                           grouping)
+            try:
+                if fault == 'timeout':
+                    pass
+                elif fault == 'unstable':
+                    self.send(echo, '0M')
+                else:
+                    self.send(echo, '99', lines)
+                    sent += 1
+            except (ConnectionError, OSError):
+                break
+            if scans and sent >= scans:
+                self.state = '003'
+                break
+
+    def stop_stream(self):
+        if self._stream is not None:
+            self._stop.set()
+            if self._stream is not threading.current_thread():
+                self._stream.join()
+            self._stream = None
+
+    def cmd_MD(self, line, params):
+        self._multi(line, params, False)
+
+    def cmd_ME(self, line, params):
+        self._multi(line, params, True)
+
+    def cmd_RS(self, line, params):
+        self.cmd_QT(line, params)
+
+    def cmd_RT(self, line, params):
+        self.cmd_QT(line, params)
+
+    def cmd_PSL(self, line, params):
+        self.stop_stream()
+        self.laser_on = False
+        self.state = '005'
+        self.send(line, '00')
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Fake Hokuyo UST sensor')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=10940)
+    parser.add_argument('--freq', type=float, default=40,
+                        help='scan frequency in Hz')
+    parser.add_argument('--room', type=float, nargs=2, default=(10, 10),
+                        metavar=('W', 'H'), help='room size in meters')
+    parser.add_argument('--noise', type=float, default=0,
+                        help='range noise in millimeters')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    FakeHokuyo(box_world(*args.room), addr=(args.host, args.port),
+               scan_freq=args.freq, noise=args.noise).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ import matplotlib
 matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
 from hokuyolx import HokuyoLX
+from hokuyolx.bus import ScanSubscriber
 
 #LiDAR Ethernet on ArmPi (set once here or via persistent netplan/dhcpcd on the robot)
 _LIDAR_IFACE = "end0"
@@ -41,9 +42,12 @@ def ensure_lidar_network():
 
 #######################################################
 class Lidar:
-    def __init__(self):
+    def __init__(self, bus_name=None):
         try:
-            self.laser = HokuyoLX()
+            if bus_name:
+                self.laser = ScanSubscriber(bus_name) #scans published by another process (python -m hokuyolx.bus)
+            else:
+                self.laser = HokuyoLX()
         except Exception as e:
             print(f"Error initializing HokuyoLX: {e}")
             raise
@@ -107,8 +111,10 @@ class Lidar:
                 print(f"Error closing laser: {e}")
 
 def main():
-    ensure_lidar_network()
-    myLidar = Lidar()
+    bus_name = sys.argv[1] if len(sys.argv) > 1 else None #e.g. python lidar.py hokuyo to view scans from the scan bus
+    if bus_name is None:
+        ensure_lidar_network()
+    myLidar = Lidar(bus_name)
     myLidar.run()
 
 if __name__ == "__main__":
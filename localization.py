@@ -0,0 +1,305 @@
+import json
+import math
+import os
+import sys
+import time
+import logging
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+
+from odometry import relative_pose
+
+####################################################
+logger = logging.getLogger(__name__)
+
+class LikelihoodField:
+    """Likelihood field sensor model of a saved occupancy map.
+
+    The distance of every cell to the nearest occupied cell is computed once with distance_transform_edt and
+    turned into a table of beam endpoint log-likelihoods log(z_hit * N(d; 0, sigma_hit) + z_rand), so scoring
+    a beam is one table lookup. Endpoints outside the map score as if max_dist_m away from any obstacle.
+    """
+
+    def __init__(
+        self,
+        prob: np.ndarray,
+        resolution: float,
+        origin: tuple[float, float],
+        extent: tuple[int, int, int, int] | None = None,
+        occupied_threshold: float = 0.65,
+        sigma_hit: float = 0.05,
+        z_hit: float = 0.9,
+        max_dist_m: float = 1.0,
+    ):
+        prob = np.asarray(prob, dtype=float)
+        if prob.ndim != 2:
+            raise ValueError(f"Map must be 2D (H,W), got shape {prob.shape}")
+        if resolution <= 0 or sigma_hit <= 0 or not (0 < z_hit < 1):
+            raise ValueError(f"Invalid sensor model: resolution={resolution}, sigma_hit={sigma_hit}, z_hit={z_hit}")
+        self.prob = prob
+        self.resolution = float(resolution)
+        self.origin = np.asarray(origin, dtype=float).reshape(2)  #world (0, 0) is at cell origin / resolution
+        if extent is None:
+            extent = (0, prob.shape[0], 0, prob.shape[1])
+        self.extent = tuple(int(v) for v in extent)  #(row0, row1, col0, col1) of prob, as SLAM.get_map_extent
+        self.occupied = prob >= occupied_threshold
+        if not np.any(self.occupied):
+            raise ValueError("Map has no occupied cells to localize against")
+        self.distance = np.minimum(distance_transform_edt(~self.occupied, sampling=self.resolution), max_dist_m)
+        z_rand = 1.0 - z_hit
+        self.log_likelihood = np.log(
+            z_hit * np.exp(-0.5 * (self.distance / sigma_hit)**2) + z_rand
+        ).astype(np.float32)
+        self._table = self.log_likelihood.ravel()
+        self._outside = np.float32(math.log(z_hit * math.exp(-0.5 * (max_dist_m / sigma_hit)**2) + z_rand))
+        #cell (col, row) of world (x, y) is floor((x, y) / resolution + offset), as SLAM.world_to_cell rounds
+        self._offset = self.origin / self.resolution - np.array([self.extent[2], self.extent[0]]) + 0.5
+
+    @classmethod
+    def load(cls, npy_path: str, resolution: float = 0.05, width_m: float = 20.0, height_m: float = 20.0, **kwargs) -> "LikelihoodField":
+        """Load a map saved by SLAM.save_map_visualization. Its frame is read from the .json written next to
+        the .npy; maps saved without one are taken to cover the initial width_m x height_m area of SLAM."""
+        prob = np.load(npy_path)
+        meta_path = os.path.splitext(npy_path)[0] + ".json"
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            resolution, origin, extent = meta["resolution"], meta["origin"], meta["extent"]
+        else:
+            logger.warning(f"No {meta_path}, assuming the map covers the initial {width_m}x{height_m}m SLAM area")
+            origin, extent = (width_m / 2, height_m / 2), None
+        return cls(prob, resolution, origin, extent, **kwargs)
+
+    def lookup(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Log-likelihoods of beam endpoints at world coordinates x, y (any matching shapes)."""
+        h, w = self.log_likelihood.shape
+        col = np.floor(x / self.resolution + self._offset[0]).astype(np.intp)
+        row = np.floor(y / self.resolution + self._offset[1]).astype(np.intp)
+        inside = (col >= 0) & (col < w) & (row >= 0) & (row < h)
+        values = self._table[np.where(inside, row * w + col, 0)]
+        return np.where(inside, values, self._outside)
+
+    def free_cells_xy(self, max_prob: float = 0.35) -> np.ndarray:
+        """World (x, y) of the centers of the free cells, (N,2)."""
+        row, col = np.nonzero(self.prob < max_prob)
+        cells = np.column_stack((col + self.extent[2], row + self.extent[0]))
+        return cells * self.resolution - self.origin
+
+def kld_sample_size(bins: np.ndarray, error: float, z: float) -> np.ndarray:
+    """Particles KLD-sampling needs so the error between the sampled and true posterior stays below error
+    with probability given by the standard normal quantile z, for every number of occupied histogram bins."""
+    k = np.maximum(np.asarray(bins, dtype=float) - 1, 1)
+    a = 2.0 / (9.0 * k)
+    return k / (2 * error) * (1 - a + np.sqrt(a) * z)**3
+
+class MonteCarloLocalizer:
+    """Particle filter localizing the robot on a fixed map (Monte Carlo localization).
+
+    Every update moves the particles by the motion prior plus noise; without one the robot is assumed to keep
+    the motion between its last two estimates once the filter converged (spread below max_spread_m). It then
+    scores all particles against up to max_beams beams of the scan in one array operation on the likelihood
+    field, and resamples once the effective sample size drops below resample_threshold of the particles.
+    Resampling is adaptive (KLD-sampling): it draws particles until they cover enough histogram bins of
+    bin_m x bin_m x bin_deg, between min_particles and max_particles, so a converged filter runs on a few
+    hundred particles and a lost one spreads thousands.
+    """
+
+    def __init__(
+        self,
+        field: LikelihoodField,
+        min_particles: int = 100,
+        max_particles: int = 5000,
+        max_beams: int = 60,
+        beam_weight: float = 0.1,
+        motion_noise_m: float = 0.03,
+        motion_noise_deg: float = 2.0,
+        odometry_noise: float = 0.2,
+        kld_error: float = 0.05,
+        kld_z: float = 2.33,
+        bin_m: float = 0.2,
+        bin_deg: float = 10.0,
+        resample_threshold: float = 0.5,
+        max_spread_m: float = 0.5,
+        seed: int | None = None,
+    ):
+        if not (0 < min_particles <= max_particles):
+            raise ValueError(f"Need 0 < min_particles <= max_particles, got {min_particles}, {max_particles}")
+        if max_beams < 1 or beam_weight <= 0:
+            raise ValueError(f"max_beams and beam_weight must be positive, got {max_beams}, {beam_weight}")
+        self.field = field
+        self.min_particles = int(min_particles)
+        self.max_particles = int(max_particles)
+        self.max_beams = int(max_beams)  #beams scored per scan, spread evenly over the scan
+        self.beam_weight = float(beam_weight)  #beams are not independent: their log-likelihoods are scaled down
+        self.motion_noise = np.array([motion_noise_m, motion_noise_m, math.radians(motion_noise_deg)])  #per update
+        self.odometry_noise = float(odometry_noise)  #extra noise per unit of predicted motion
+        self.kld_error = float(kld_error)
+        self.kld_z = float(kld_z)
+        self._bin_size = np.array([bin_m, bin_m, math.radians(bin_deg)])
+        self.resample_threshold = float(resample_threshold)
+        self.max_spread_m = float(max_spread_m)
+        self._rng = np.random.default_rng(seed)
+        self.particles = np.zeros((self.max_particles, 3))  #(N,3) x, y, theta
+        self.weights = np.full(self.max_particles, 1.0 / self.max_particles)
+        self.last_update = {}  #particles, beams, neff, resampled, spread_m, time_ms of the last update
+        self._last_pose = None  #estimate of the last update, if the filter had converged
+        self._velocity = None  #motion between the last two converged estimates (robot frame)
+
+    def __len__(self) -> int:
+        return len(self.particles)
+
+    def init_pose(self, pose: tuple, sigma_m: float = 0.1, sigma_deg: float = 5.0):
+        """Start from a known pose: max_particles drawn around it."""
+        noise = self._rng.normal(0.0, [sigma_m, sigma_m, math.radians(sigma_deg)], (self.max_particles, 3))
+        self._set(np.asarray(pose, dtype=float) + noise)
+        self._last_pose = self._velocity = None
+
+    def init_global(self):
+        """Start from an unknown pose: max_particles spread over the free cells of the map."""
+        free = self.field.free_cells_xy()
+        if len(free) == 0:
+            raise ValueError("Map has no free cells to spread particles over")
+        xy = free[self._rng.integers(len(free), size=self.max_particles)]
+        xy += self._rng.uniform(-0.5, 0.5, xy.shape) * self.field.resolution
+        theta = self._rng.uniform(-np.pi, np.pi, self.max_particles)
+        self._set(np.column_stack((xy, theta)))
+        self._last_pose = self._velocity = None
+
+    def _set(self, particles: np.ndarray):
+        particles[:, 2] = (particles[:, 2] + np.pi) % (2 * np.pi) - np.pi
+        self.particles = particles
+        self.weights = np.full(len(particles), 1.0 / len(particles))
+
+    def predict(self, delta: tuple | None = None):
+        """Move every particle by the robot-frame pose delta (None = unknown motion) plus noise."""
+        n = len(self.particles)
+        sigma = self.motion_noise
+        if delta is not None:
+            dx, dy, dth = delta
+            sigma = sigma + self.odometry_noise * np.array([math.hypot(dx, dy), math.hypot(dx, dy), abs(dth)])
+        else:
+            dx, dy, dth = 0.0, 0.0, 0.0
+        move = np.array([dx, dy, dth]) + self._rng.normal(0.0, 1.0, (n, 3)) * sigma
+        p = self.particles
+        c, s = np.cos(p[:, 2]), np.sin(p[:, 2])
+        p[:, 0] += c * move[:, 0] - s * move[:, 1]
+        p[:, 1] += s * move[:, 0] + c * move[:, 1]
+        p[:, 2] = (p[:, 2] + move[:, 2] + np.pi) % (2 * np.pi) - np.pi
+
+    def correct(self, points_robot: np.ndarray) -> float:
+        """Weight the particles by the scan (N,2 robot frame, m). Returns the effective sample size."""
+        beams = np.asarray(points_robot, dtype=float)
+        if len(beams) > self.max_beams:
+            beams = beams[np.linspace(0, len(beams) - 1, self.max_beams).astype(int)]
+        p = self.particles
+        c, s = np.cos(p[:, 2:3]), np.sin(p[:, 2:3])
+        #(particles, beams) endpoints in the world frame
+        x = p[:, 0:1] + c * beams[:, 0] - s * beams[:, 1]
+        y = p[:, 1:2] + s * beams[:, 0] + c * beams[:, 1]
+        log_w = self.beam_weight * self.field.lookup(x, y).sum(axis=1, dtype=float) + np.log(self.weights)
+        w = np.exp(log_w - log_w.max())
+        self.weights = w / w.sum()
+        return float(1.0 / np.sum(self.weights**2))
+
+    def resample(self) -> int:
+        """KLD-sampling: draw particles (systematic resampling in random order) until they fill enough
+        histogram bins for kld_error, at least min_particles. Returns the new number of particles.
+
+        A converged filter needs a few hundred particles, so a batch of twice the current particles is drawn
+        first and max_particles only if that is not enough.
+        """
+        cumulative = np.cumsum(self.weights)
+        cumulative[-1] = 1.0
+        batch = min(self.max_particles, 2 * max(len(self.particles), self.min_particles))
+        for size in (batch, self.max_particles) if batch < self.max_particles else (batch,):
+            positions = (self._rng.random() + np.arange(size)) / size
+            drawn = self.particles[np.searchsorted(cumulative, positions)][self._rng.permutation(size)]
+            bins = np.floor(drawn / self._bin_size).astype(np.int64)
+            bins -= bins.min(axis=0)
+            span = bins.max(axis=0) + 1
+            _, first = np.unique((bins[:, 0] * span[1] + bins[:, 1]) * span[2] + bins[:, 2], return_index=True)
+            new_bin = np.zeros(size, dtype=bool)
+            new_bin[first] = True
+            need = np.maximum(kld_sample_size(np.cumsum(new_bin), self.kld_error, self.kld_z), self.min_particles)
+            enough = np.flatnonzero(np.arange(1, size + 1) >= need)
+            if len(enough):
+                break
+        n = int(enough[0]) + 1 if len(enough) else size
+        self._set(drawn[:n].copy())
+        return n
+
+    def estimate(self) -> tuple[float, float, float]:
+        """Weighted mean pose of the particles (circular mean of theta)."""
+        w = self.weights
+        x, y = w @ self.particles[:, :2]
+        theta = math.atan2(w @ np.sin(self.particles[:, 2]), w @ np.cos(self.particles[:, 2]))
+        return float(x), float(y), theta
+
+    def spread(self) -> float:
+        """Weighted std. dev. (m) of the particle positions; small once the filter converged."""
+        w = self.weights
+        mean = w @ self.particles[:, :2]
+        return float(math.sqrt(w @ np.sum((self.particles[:, :2] - mean)**2, axis=1)))
+
+    def update(self, points_robot: np.ndarray, delta: tuple | None = None) -> tuple[float, float, float]:
+        """Predict with delta (None = constant velocity), correct with the scan, resample if needed. Returns
+        the pose estimate."""
+        start = time.perf_counter()
+        self.predict(self._velocity if delta is None else delta)
+        n = len(self.particles)
+        neff = self.correct(points_robot)
+        pose = self.estimate()
+        spread = self.spread()
+        if spread < self.max_spread_m:
+            self._velocity = None if self._last_pose is None else relative_pose(self._last_pose, pose)
+            self._last_pose = pose
+        else:
+            self._last_pose = self._velocity = None
+        resampled = neff < self.resample_threshold * n
+        if resampled:
+            self.resample()
+        self.last_update = {
+            "particles": n,
+            "beams": min(len(points_robot), self.max_beams),
+            "neff": neff,
+            "resampled": resampled,
+            "spread_m": spread,
+            "time_ms": (time.perf_counter() - start) * 1e3,
+        }
+        return pose
+
+def main():
+    """Localize a replayed scan log on a saved map:
+
+    python localization.py maps/lidar_map_YYYYmmdd_HHMMSS.npy run.hkl [x y theta_deg]
+
+    Without a start pose the particles start spread over the whole map.
+    """
+    from hokuyolx.recording import ReplayLaser
+    from slam import SLAM
+
+    if len(sys.argv) not in (3, 6):
+        print(main.__doc__)
+        return
+    field = LikelihoodField.load(sys.argv[1])
+    localizer = MonteCarloLocalizer(field)
+    if len(sys.argv) == 6:
+        x, y, theta = (float(v) for v in sys.argv[3:])
+        localizer.init_pose((x, y, math.radians(theta)))
+    else:
+        localizer.init_global()
+    laser = ReplayLaser(sys.argv[2])
+    slam = SLAM(submap_keyframes=0)
+    try:
+        for k in range(len(laser)):
+            x, y, theta = localizer.update(slam.get_scan_points(laser))
+            info = localizer.last_update
+            print(
+                f"{k:5d}: x={x:.2f}m y={y:.2f}m theta={math.degrees(theta):.1f}° spread {info['spread_m']:.2f}m, "
+                f"{info['particles']} particles, {info['time_ms']:.1f}ms"
+            )
+    finally:
+        laser.close()
+
+if __name__ == '__main__':
+    main()
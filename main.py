@@ -9,6 +9,9 @@ from config import Config
 from direct_drive import MecanumChassis
 from lidar import Lidar
 from slam import SLAM
+from odometry import MecanumMotionModel
+from localization import LikelihoodField, MonteCarloLocalizer
+from hokuyolx.recording import ScanRecorder
 #######################################################
 
 def main():
@@ -18,18 +21,68 @@ def main():
     lidar = None
     slam = None
     laser = None
+    motion_model = None
+    localizer = None
     
     try:
         chassis = MecanumChassis()
-        lidar = Lidar()
+        lidar = Lidar(cfg.lidar_bus_name or None)
 
         try:
-            slam = SLAM(resolution=cfg.slam_resolution)
+            if cfg.slam_odometry:
+                if cfg.slam_odometry_gains_path and os.path.exists(cfg.slam_odometry_gains_path):
+                    motion_model = MecanumMotionModel.load(cfg.slam_odometry_gains_path)
+                else:
+                    motion_model = MecanumMotionModel()
+                print(f"Odometry motion prior gains: {motion_model.gains}")
+            if cfg.localization_map_path:
+                field = LikelihoodField.load(cfg.localization_map_path, resolution=cfg.slam_resolution)
+                localizer = MonteCarloLocalizer(field, max_particles=cfg.localization_max_particles)
+                if cfg.localization_initial_pose is None:
+                    localizer.init_global()
+                else:
+                    x, y, theta = cfg.localization_initial_pose
+                    localizer.init_pose((x, y, math.radians(theta)))
+                print(f"Localizing on map: {cfg.localization_map_path} (no mapping)")
+            slam = SLAM(
+                resolution=cfg.slam_resolution,
+                grid_dtype=cfg.slam_grid_dtype,
+                max_resident_tiles=cfg.slam_max_resident_tiles or None,
+                tile_spill_dir=cfg.slam_tile_spill_dir or None,
+                icp_method=cfg.slam_icp_method,
+                icp_max_iter=cfg.slam_icp_max_iter,
+                icp_tol=cfg.slam_icp_tol,
+                submap_keyframes=cfg.slam_submap_keyframes,
+                submap_voxel_m=cfg.slam_submap_voxel_m,
+                keyframe_distance_m=cfg.slam_keyframe_distance_m,
+                keyframe_angle_deg=cfg.slam_keyframe_angle_deg,
+                downsample_leaf_m=cfg.slam_downsample_leaf_m,
+                downsample_max_points=cfg.slam_downsample_max_points or None,
+                correlative_mode=cfg.slam_correlative_mode,
+                correlative_window_m=cfg.slam_correlative_window_m,
+                correlative_window_deg=cfg.slam_correlative_window_deg,
+                motion_model=motion_model,
+                pose_graph=cfg.slam_pose_graph,
+                loop_closure_radius_m=cfg.slam_loop_closure_radius_m,
+                loop_closure_min_gap=cfg.slam_loop_closure_min_gap,
+                static_threshold_m=cfg.slam_static_threshold_m or None,
+                static_threshold_deg=cfg.slam_static_threshold_deg,
+                async_mapping=cfg.slam_async_mapping,
+                mapping_queue_size=cfg.slam_mapping_queue_size,
+                distance_field_max_m=cfg.slam_distance_field_max_m or None,
+                localizer=localizer,
+            )
             laser = lidar.get_laser()
             
             if laser is None:
                 print("Error: Failed to get laser instance")
                 return
+
+            if cfg.lidar_streaming and not cfg.lidar_bus_name:
+                laser.start_stream()
+            if cfg.scan_log_path:
+                laser = ScanRecorder(laser, cfg.scan_log_path)
+                print(f"Recording scans to: {cfg.scan_log_path}")
             
             print("Starting SLAM with autonomous exploration...")
             print(f"Mode: {cfg.exploration_mode}")
@@ -39,11 +92,19 @@ def main():
             success_count = slam.explore_waypoints(chassis, laser, cfg)
             
             print(f"\nSLAM completed: {success_count} scans processed successfully")
+            print(f"Scans matched: {slam.scans_processed}, skipped while static: {slam.scans_skipped}")
             
-            if slam is not None:
+            if localizer is not None:
+                x, y, theta = slam.get_pose()
+                print(f"Final pose: x={x:.2f}m y={y:.2f}m theta={math.degrees(theta):.1f}°, "
+                      f"particle spread {localizer.spread():.2f}m")
+            elif slam is not None:
                 try:
+                    slam.flush_mapping()
+                    if slam.flush_pose_graph():
+                        print(f"Map rebuilt from the pose graph: {slam.loop_closures} loop closures")
                     map_prob = slam.get_map_prob()
-                    print(f"Map generated: shape={map_prob.shape}")
+                    print(f"Map generated: shape={map_prob.shape}, cells (row0, row1, col0, col1)={slam.get_map_extent()}")
                     x, y, theta = slam.get_pose()
                     print(f"Final pose: x={x:.2f}m y={y:.2f}m theta={math.degrees(theta):.1f}°")
 
@@ -74,6 +135,12 @@ def main():
         import traceback
         traceback.print_exc()
     finally:
+        try:
+            if slam is not None:
+                slam.stop_tracking()
+        except Exception as e:
+            print(f"Error stopping SLAM tracking: {e}")
+
         try:
             if laser is not None:
                 laser.close()
@@ -86,5 +153,13 @@ def main():
         except Exception as e:
             print(f"Error stopping motors: {e}")
 
+        try:
+            if motion_model is not None and cfg.slam_odometry_samples_path and motion_model.samples:
+                n = len(motion_model.samples)
+                motion_model.save_samples(cfg.slam_odometry_samples_path)
+                print(f"Saved {n} odometry calibration samples to: {cfg.slam_odometry_samples_path}")
+        except Exception as e:
+            print(f"Error saving odometry samples: {e}")
+
 if __name__ == "__main__":
     main()
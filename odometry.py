@@ -0,0 +1,196 @@
+import json
+import math
+import os
+import sys
+import logging
+import numpy as np
+
+####################################################
+logger = logging.getLogger(__name__)
+
+#nominal gains of the body velocities per command unit: forward (m/s), strafe (m/s), rotation (rad/s);
+#positive strafe drives right (-y) and positive rotation turns counterclockwise. Calibrate them on the robot.
+DEFAULT_GAINS = (0.001, -0.001, 0.005)
+
+def wheel_speeds(forward: float, strafe: float, rotation: float) -> list:
+    """Wheel speeds [fl, fr, bl, br] MecanumChassis.drive_xy sets for a command, including its scaling to +-100."""
+    speeds = [
+        forward + strafe - rotation,
+        forward - strafe + rotation,
+        forward - strafe - rotation,
+        forward + strafe + rotation,
+    ]
+    max_val = max(abs(s) for s in speeds)
+    if max_val > 100:
+        scale = 100 / max_val
+        speeds = [int(s * scale) for s in speeds]
+    return [max(-100, min(100, s)) for s in speeds]
+
+def effective_command(forward: float, strafe: float, rotation: float) -> tuple[float, float, float]:
+    """(forward, strafe, rotation) the wheels actually execute after drive_xy saturates them."""
+    fl, fr, bl, br = wheel_speeds(forward, strafe, rotation)
+    return (fl + fr + bl + br) / 4, (fl - fr - bl + br) / 4, (-fl + fr - bl + br) / 4
+
+def integrate_twist(vx: float, vy: float, omega: float, dt: float) -> tuple[float, float, float]:
+    """Pose delta (robot frame) after moving dt seconds with constant body velocities."""
+    dth = omega * dt
+    if abs(dth) < 1e-9:
+        return vx * dt, vy * dt, dth
+    s, c = math.sin(dth), math.cos(dth)
+    return (vx * s + vy * (c - 1)) / omega, (vx * (1 - c) + vy * s) / omega, dth
+
+def compose(a: tuple, b: tuple) -> tuple[float, float, float]:
+    """Pose b (given in the frame of pose a) in the frame a is given in."""
+    c, s = math.cos(a[2]), math.sin(a[2])
+    theta = a[2] + b[2]
+    return a[0] + c * b[0] - s * b[1], a[1] + s * b[0] + c * b[1], math.atan2(math.sin(theta), math.cos(theta))
+
+def relative_pose(a: tuple, b: tuple) -> tuple[float, float, float]:
+    """Pose b in the frame of pose a (inverse of compose)."""
+    c, s = math.cos(a[2]), math.sin(a[2])
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    dth = b[2] - a[2]
+    return c * dx + s * dy, -s * dx + c * dy, math.atan2(math.sin(dth), math.cos(dth))
+
+class MecanumMotionModel:
+    """Motion prior from the commands sent to MecanumChassis.drive_xy.
+
+    Commands are integrated into a predicted pose delta in the robot frame until the next scan takes it.
+    The prediction seeds scan matching and gates its solutions: a match may differ from the prediction by
+    gate_m + gate_ratio * predicted distance and gate_deg + gate_ratio * predicted turn at most.
+    """
+
+    def __init__(
+        self,
+        gains: tuple[float, float, float] = DEFAULT_GAINS,
+        gate_m: float = 0.15,
+        gate_deg: float = 10.0,
+        gate_ratio: float = 0.5,
+        max_samples: int = 5000,
+    ):
+        self.gains = tuple(float(g) for g in gains)
+        self.gate_m = float(gate_m)
+        self.gate_rad = math.radians(gate_deg)
+        self.gate_ratio = float(gate_ratio)
+        self.max_samples = int(max_samples)
+        self.samples = []  #(segments, observed delta) pairs for calibration
+        self._delta = (0.0, 0.0, 0.0)
+        self._segments = []  #(forward, strafe, rotation, duration) effective commands since the last take()
+
+    def predict_delta(self, forward: float, strafe: float, rotation: float, duration: float) -> tuple[float, float, float]:
+        """Robot-frame pose delta of driving a command for duration seconds."""
+        f, s, r = effective_command(forward, strafe, rotation)
+        kf, ks, kr = self.gains
+        return integrate_twist(kf * f, ks * s, kr * r, duration)
+
+    def command(self, forward: float, strafe: float, rotation: float, duration: float):
+        """Record a command driven for duration seconds."""
+        if duration <= 0:
+            return
+        self._delta = compose(self._delta, self.predict_delta(forward, strafe, rotation, duration))
+        self._segments.append((*effective_command(forward, strafe, rotation), float(duration)))
+
+    def take(self) -> tuple[tuple[float, float, float], list]:
+        """Return (predicted delta, command segments) since the last call and start over."""
+        delta, segments = self._delta, self._segments
+        self._delta, self._segments = (0.0, 0.0, 0.0), []
+        return delta, segments
+
+    def gate(self, predicted: tuple, measured: tuple) -> bool:
+        """True if a measured delta (scan matching) agrees with the predicted one."""
+        dist = math.hypot(predicted[0], predicted[1])
+        err = math.hypot(measured[0] - predicted[0], measured[1] - predicted[1])
+        turn = measured[2] - predicted[2]
+        turn_err = abs(math.atan2(math.sin(turn), math.cos(turn)))
+        return (
+            err <= self.gate_m + self.gate_ratio * dist
+            and turn_err <= self.gate_rad + self.gate_ratio * abs(predicted[2])
+        )
+
+    def add_sample(self, segments: list, observed: tuple):
+        """Keep commands and the delta scan matching observed for them, for calibrate()."""
+        if segments:
+            self.samples.append(([tuple(seg) for seg in segments], tuple(float(v) for v in observed)))
+            del self.samples[:-self.max_samples]
+
+    def calibrate(self, samples: list | None = None, min_samples: int = 10) -> dict:
+        """Fit the gains to (segments, observed delta) samples by least squares and use them.
+
+        Each axis is fitted to the command integrated over time, a first-order model that holds for the short
+        motions between scans. Returns the gains, RMS residuals and number of samples used.
+        """
+        samples = self.samples if samples is None else samples
+        if len(samples) < min_samples:
+            raise ValueError(f"Need at least {min_samples} samples to calibrate, got {len(samples)}")
+        #commands integrated over time (N,3)
+        u = np.array([np.sum([np.multiply(seg[:3], seg[3]) for seg in segs], axis=0) for segs, _ in samples])
+        obs = np.array([delta for _, delta in samples], dtype=float)
+        gains, rms = [], []
+        for axis in range(3):
+            x = u[:, axis]
+            if np.dot(x, x) < 1e-12:
+                gains.append(self.gains[axis])  #axis never commanded: keep the current gain
+                rms.append(float("nan"))
+                continue
+            k = float(np.dot(x, obs[:, axis]) / np.dot(x, x))
+            gains.append(k)
+            rms.append(float(np.sqrt(np.mean((obs[:, axis] - k * x)**2))))
+        self.gains = tuple(gains)
+        logger.info(f"Calibrated motion model gains: {self.gains} (RMS {rms}) from {len(samples)} samples")
+        return {"gains": self.gains, "rms": tuple(rms), "samples": len(samples)}
+
+    def save(self, path: str):
+        """Save gains and gate settings as JSON."""
+        with open(path, "w") as f:
+            json.dump({
+                "gains": list(self.gains),
+                "gate_m": self.gate_m,
+                "gate_deg": math.degrees(self.gate_rad),
+                "gate_ratio": self.gate_ratio,
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "MecanumMotionModel":
+        """Model with the settings saved by save()."""
+        with open(path) as f:
+            data = json.load(f)
+        return cls(
+            gains=tuple(data["gains"]),
+            gate_m=data.get("gate_m", 0.15),
+            gate_deg=data.get("gate_deg", 10.0),
+            gate_ratio=data.get("gate_ratio", 0.5),
+        )
+
+    def save_samples(self, path: str):
+        """Append the calibration samples to a JSON lines file (one run after another) and forget them."""
+        with open(path, "a") as f:
+            for segments, observed in self.samples:
+                f.write(json.dumps({"segments": segments, "observed": observed}) + "\n")
+        self.samples = []
+
+def load_samples(path: str) -> list:
+    """Calibration samples saved by MecanumMotionModel.save_samples."""
+    samples = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                samples.append(([tuple(seg) for seg in data["segments"]], tuple(data["observed"])))
+    return samples
+
+def main():
+    """Fit motion model gains to samples recorded during SLAM runs:
+
+    python odometry.py samples.jsonl [gains.json]
+    """
+    if len(sys.argv) < 2:
+        print(main.__doc__)
+        return
+    out = sys.argv[2] if len(sys.argv) > 2 else "odometry_gains.json"
+    model = MecanumMotionModel.load(out) if os.path.exists(out) else MecanumMotionModel()
+    result = model.calibrate(load_samples(sys.argv[1]))
+    model.save(out)
+    print(f"Gains {result['gains']} (RMS {result['rms']}) from {result['samples']} samples saved to {out}")
+
+if __name__ == '__main__':
+    main()
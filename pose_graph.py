@@ -0,0 +1,150 @@
+import math
+import logging
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+####################################################
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIGMA = (0.05, 0.05, math.radians(2.0))  #std. dev. of relative pose measurements: x (m), y (m), theta (rad)
+
+def wrap_angle(a):
+    """Wrap angle(s) in radians to [-pi, pi)."""
+    return (np.asarray(a) + np.pi) % (2 * np.pi) - np.pi
+
+class PoseGraph:
+    """2D pose graph: keyframe poses (nodes) linked by relative pose measurements (edges).
+
+    An edge (i, j, z) measures pose j in the frame of pose i. optimize() minimizes the information-weighted
+    squared errors of all edges with Levenberg-Marquardt on a scipy.sparse system, so it scales to thousands
+    of keyframes. The first node is held fixed.
+    """
+
+    def __init__(self):
+        self.poses = np.empty((0, 3))  #(N,3) x, y, theta
+        self._i = []
+        self._j = []
+        self._z = []
+        self._info = []  #3x3 information matrices
+        self.loop_edges = 0  #number of edges added with loop=True
+
+    def __len__(self) -> int:
+        return len(self.poses)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self._i)
+
+    def add_node(self, pose) -> int:
+        """Add a pose, returning its index."""
+        self.poses = np.vstack((self.poses, np.asarray(pose, dtype=float).reshape(1, 3)))
+        return len(self.poses) - 1
+
+    def add_edge(self, i: int, j: int, z, sigma: tuple[float, float, float] = DEFAULT_SIGMA, loop: bool = False):
+        """Add measurement z = (x, y, theta) of pose j in the frame of pose i with std. dev. sigma."""
+        if not (0 <= i < len(self) and 0 <= j < len(self)) or i == j:
+            raise ValueError(f"Invalid edge {i} -> {j} in graph of {len(self)} nodes")
+        self._i.append(int(i))
+        self._j.append(int(j))
+        self._z.append(np.asarray(z, dtype=float).reshape(3))
+        self._info.append(np.diag(1.0 / np.square(np.asarray(sigma, dtype=float))))
+        if loop:
+            self.loop_edges += 1
+
+    def candidates(self, index: int, radius: float, min_gap: int) -> np.ndarray:
+        """Indices of nodes within radius (m) of node index, at least min_gap nodes older, nearest first."""
+        older = index - int(min_gap)
+        if older <= 0:
+            return np.empty(0, dtype=int)
+        xy = self.poses[:older, :2]
+        d = np.hypot(*(xy - self.poses[index, :2]).T)
+        near = np.flatnonzero(d <= radius)
+        return near[np.argsort(d[near])]
+
+    def _linearize(self, poses: np.ndarray):
+        """Errors (E,3) and Jacobians (E,3,3) w.r.t. pose i and pose j of all edges at poses."""
+        i, j = np.array(self._i), np.array(self._j)
+        z = np.array(self._z)
+        pi, pj = poses[i], poses[j]
+        c, s = np.cos(pi[:, 2]), np.sin(pi[:, 2])
+        dx, dy = pj[:, 0] - pi[:, 0], pj[:, 1] - pi[:, 1]
+        e = np.column_stack((
+            c * dx + s * dy - z[:, 0],
+            -s * dx + c * dy - z[:, 1],
+            wrap_angle(pj[:, 2] - pi[:, 2] - z[:, 2]),
+        ))
+        E = len(i)
+        Ji = np.zeros((E, 3, 3))
+        Ji[:, 0, 0], Ji[:, 0, 1] = -c, -s
+        Ji[:, 1, 0], Ji[:, 1, 1] = s, -c
+        Ji[:, 0, 2] = -s * dx + c * dy
+        Ji[:, 1, 2] = -c * dx - s * dy
+        Ji[:, 2, 2] = -1.0
+        Jj = np.zeros((E, 3, 3))
+        Jj[:, 0, 0], Jj[:, 0, 1] = c, s
+        Jj[:, 1, 0], Jj[:, 1, 1] = -s, c
+        Jj[:, 2, 2] = 1.0
+        return i, j, e, Ji, Jj
+
+    def chi2(self, poses: np.ndarray | None = None) -> float:
+        """Sum of information-weighted squared edge errors."""
+        if not self._i:
+            return 0.0
+        _, _, e, _, _ = self._linearize(self.poses if poses is None else poses)
+        return float(np.einsum("ei,eij,ej->", e, np.array(self._info), e))
+
+    def _system(self, poses: np.ndarray) -> tuple[sparse.csr_matrix, np.ndarray]:
+        """Sparse normal equations H dx = -b of the linearized problem."""
+        i, j, e, Ji, Jj = self._linearize(poses)
+        info = np.array(self._info)
+        n = 3 * len(poses)
+        blocks, rows, cols = [], [], []
+        r = np.arange(3)
+        for A, B, a, b in ((Ji, Ji, i, i), (Ji, Jj, i, j), (Jj, Ji, j, i), (Jj, Jj, j, j)):
+            #3x3 block J_a^T info J_b at rows 3a.., cols 3b..
+            blocks.append(np.einsum("eki,ekl,elj->eij", A, info, B).ravel())
+            rows.append(np.broadcast_to(3 * a[:, None, None] + r[:, None], (len(a), 3, 3)).ravel())
+            cols.append(np.broadcast_to(3 * b[:, None, None] + r[None, :], (len(b), 3, 3)).ravel())
+        H = sparse.coo_matrix(
+            (np.concatenate(blocks), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n)
+        ).tocsr()
+        g = np.zeros(n)
+        Oe = np.einsum("eij,ej->ei", info, e)
+        np.add.at(g, (3 * i[:, None] + r).ravel(), np.einsum("eki,ek->ei", Ji, Oe).ravel())
+        np.add.at(g, (3 * j[:, None] + r).ravel(), np.einsum("eki,ek->ei", Jj, Oe).ravel())
+        return H, g
+
+    def optimize(self, max_iter: int = 20, tol: float = 1e-6, fixed: int = 0) -> dict:
+        """Optimize all poses but node fixed by Levenberg-Marquardt. Returns iterations and chi2 before/after."""
+        chi2 = chi2_start = self.chi2()
+        if len(self) < 2 or not self._i:
+            return {"iterations": 0, "chi2_before": chi2, "chi2_after": chi2}
+        free = np.setdiff1d(np.arange(3 * len(self)), 3 * fixed + np.arange(3))
+        lam = 1e-4
+        poses = self.poses.copy()
+        it = 0
+        for it in range(1, max_iter + 1):
+            H, g = self._system(poses)
+            H = H[free][:, free]
+            diag = H.diagonal()
+            improved = False
+            while lam < 1e10:
+                step = spsolve((H + sparse.diags(lam * diag)).tocsc(), -g[free])
+                trial = poses.copy()
+                trial.ravel()[free] += step
+                trial[:, 2] = wrap_angle(trial[:, 2])
+                trial_chi2 = self.chi2(trial)
+                if np.isfinite(trial_chi2) and trial_chi2 < chi2:
+                    poses, lam, improved = trial, max(lam / 10, 1e-12), True
+                    break
+                lam *= 10
+            if not improved:
+                break
+            converged = chi2 - trial_chi2 < tol * max(chi2, 1e-12) or np.max(np.abs(step)) < tol
+            chi2 = trial_chi2
+            if converged:
+                break
+        self.poses = poses
+        logger.debug(f"Pose graph optimized: {len(self)} nodes, {self.num_edges} edges, chi2 {chi2_start:.3g} -> {chi2:.3g}")
+        return {"iterations": it, "chi2_before": chi2_start, "chi2_after": chi2}
@@ -1,18 +1,35 @@
+import json
 import math
 import time
 import os
+import queue
 import random
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict, deque
 import numpy as np
+from scipy.ndimage import distance_transform_edt
 from scipy.spatial import cKDTree
 import logging
 import matplotlib
 import matplotlib.pyplot as plt
 
 from config import Config
+from localization import MonteCarloLocalizer
+from odometry import MecanumMotionModel, compose, relative_pose
+from pose_graph import PoseGraph
 
 ####################################################
 logger = logging.getLogger(__name__)
 
+MAP_TILE_CELLS = 64  #side (cells) of the map tiles the occupancy grid is stored and tracked in
+GRID_DTYPES = ("float64", "int16", "uint8")  #storage modes of the occupancy grid
+ICP_METHODS = ("point_to_point", "point_to_line")  #scan matchers selectable in SLAM
+CORRELATIVE_MODES = ("off", "init", "only")  #use of the correlative scan matcher: not at all, as ICP initializer, alone
+OCCUPIED_PROB = 0.65  #cells above this occupancy probability are obstacles of the distance field
+
 def normalize_angle_deg(deg: float) -> float:
     return ((float(deg) + 180.0) % 360.0) - 180.0
 
@@ -95,6 +112,15 @@ def polar_to_cartesian(angles_rad: np.ndarray, ranges_mm: np.ndarray) -> np.ndar
         logger.error(f"Error in polar_to_cartesian: {e}")
         raise RuntimeError(f"Failed to convert polar to cartesian: {e}") from e
 
+def scan_signature(points: np.ndarray, bins: int = 180) -> np.ndarray:
+    """Mean range (m) of robot-frame points per bearing bin of 360/bins degrees; NaN for empty bins."""
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    b = ((np.arctan2(points[:, 1], points[:, 0]) + np.pi) * (bins / (2 * np.pi))).astype(int) % bins
+    counts = np.bincount(b, minlength=bins)
+    sums = np.bincount(b, np.hypot(points[:, 0], points[:, 1]), minlength=bins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
 def apply_transform(points: np.ndarray, x: float, y: float, theta: float) -> np.ndarray:
     """Apply pose (x, y, theta) to points (N,2). Returns world-frame points."""
     try:
@@ -121,15 +147,82 @@ def apply_transform(points: np.ndarray, x: float, y: float, theta: float) -> np.
         logger.error(f"Error in apply_transform: {e}")
         raise RuntimeError(f"Failed to apply transform: {e}") from e
 
-def icp_2d(source: np.ndarray, target: np.ndarray, max_iter: int = 20, tol: float = 1e-4) -> tuple:
-    """ICP alignment. Returns (dx, dy, dtheta, aligned_points)."""
+def voxel_downsample(points: np.ndarray, voxel_m: float, centroid: bool = False) -> np.ndarray:
+    """Reduce points to one per voxel_m x voxel_m voxel: the first point of each voxel (points earlier in the
+    array win), or the centroid of its points if centroid=True. Output follows the first points' order."""
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(points) == 0 or voxel_m <= 0:
+        return points
+    k = np.floor(points / voxel_m).astype(np.int64)
+    #hash the two voxel coordinates into one int64 key
+    keys = (k[:, 0] << 32) ^ (k[:, 1] & 0xFFFFFFFF)
+    _, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    order = np.argsort(first)
+    if not centroid:
+        return points[first[order]]
+    sums = np.column_stack((
+        np.bincount(inverse.ravel(), weights=points[:, 0], minlength=len(first)),
+        np.bincount(inverse.ravel(), weights=points[:, 1], minlength=len(first)),
+    ))
+    return (sums / counts[:, None])[order]
+
+class ScanDownsampler:
+    """Voxel downsampling of scans ahead of ICP, with an optional point budget.
+
+    With max_points set, the leaf size grows (never below leaf_m) until a scan fits the budget and starts from
+    the previous scan's leaf, so cluttered scenes cost one or two vectorized passes and KD-tree queries stay bounded.
+    """
+
+    def __init__(self, leaf_m: float = 0.05, max_points: int | None = None, max_passes: int = 6):
+        if leaf_m < 0:
+            raise ValueError(f"leaf_m must be >= 0, got {leaf_m}")
+        if max_points is not None and max_points < 4:
+            raise ValueError(f"max_points must be >= 4 or None, got {max_points}")
+        self.leaf_m = float(leaf_m)
+        self.max_points = max_points
+        self.max_passes = max_passes
+        self.current_leaf_m = self.leaf_m  #leaf size used for the last scan
+
+    def __call__(self, points: np.ndarray) -> np.ndarray:
+        points = np.asarray(points, dtype=float)
+        if self.max_points is None:
+            return voxel_downsample(points, self.leaf_m, centroid=True)
+        if len(points) <= self.max_points and self.current_leaf_m <= self.leaf_m:
+            return voxel_downsample(points, self.leaf_m, centroid=True)
+        #relax towards leaf_m when the previous leaf leaves room in the budget
+        leaf = max(self.leaf_m, self.current_leaf_m * 0.9)
+        reduced = voxel_downsample(points, leaf, centroid=True)
+        for _ in range(self.max_passes):
+            if len(reduced) <= self.max_points:
+                break
+            #scan points lie along walls, so their count falls about linearly with the leaf size
+            leaf = max(leaf * len(reduced) / self.max_points, leaf * 1.05, 1e-3)
+            reduced = voxel_downsample(points, leaf, centroid=True)
+        self.current_leaf_m = leaf
+        return reduced
+
+def icp_2d(
+    source: np.ndarray,
+    target: np.ndarray,
+    max_iter: int = 20,
+    tol: float = 1e-4,
+    init: tuple[float, float, float] = (0.0, 0.0, 0.0),
+    info: dict | None = None,
+    tree: cKDTree | None = None,
+) -> tuple:
+    """Point-to-point ICP alignment starting from init.
+
+    Returns (x, y, theta, aligned_points), the pose of source in the target frame.
+    If info is given it is filled with iterations used, final RMS residual (m) of the inliers and their count.
+    tree is a prebuilt KD-tree of target (finite points only) to reuse instead of building one.
+    """
     try:
         src = np.asarray(source, dtype=float)
         target = np.asarray(target, dtype=float)
         
         if src.size == 0 or target.size == 0:
             logger.warning("Empty point clouds in ICP")
-            return 0.0, 0.0, 0.0, src
+            return float(init[0]), float(init[1]), float(init[2]), src
         
         if src.ndim != 2 or src.shape[1] != 2:
             raise ValueError(f"Source must be (N,2), got {src.shape}")
@@ -138,33 +231,39 @@ def icp_2d(source: np.ndarray, target: np.ndarray, max_iter: int = 20, tol: floa
         
         if len(src) < 4 or len(target) < 4:
             logger.warning(f"Insufficient points for ICP: src={len(src)}, target={len(target)}")
-            return 0.0, 0.0, 0.0, src
+            return float(init[0]), float(init[1]), float(init[2]), src
         
         #get rid of invalid points
         src_valid = np.all(np.isfinite(src), axis=1)
-        tgt_valid = np.all(np.isfinite(target), axis=1)
         src = src[src_valid]
-        target = target[tgt_valid]
+        if tree is None:
+            tgt_valid = np.all(np.isfinite(target), axis=1)
+            target = target[tgt_valid]
         
         if len(src) < 4 or len(target) < 4:
             logger.warning("Too few valid points after filtering")
-            return 0.0, 0.0, 0.0, src
+            return float(init[0]), float(init[1]), float(init[2]), src
         
-        try:
-            tree = cKDTree(target)
-        except Exception as e:
-            raise RuntimeError(f"Failed to build KDTree: {e}") from e
+        if tree is None:
+            try:
+                tree = cKDTree(target)
+            except Exception as e:
+                raise RuntimeError(f"Failed to build KDTree: {e}") from e
         
-        x, y, theta = 0.0, 0.0, 0.0
+        x, y, theta = (float(v) for v in init)
+        iterations, residual, inliers = 0, float("nan"), 0
         
         for iter_num in range(max_iter):
             try:
+                iterations = iter_num + 1
                 transformed = apply_transform(src, x, y, theta)
                 d, idx = tree.query(transformed, k=1)
                 
                 #filter outliers (1m threshold)
                 mask = d < 1.0
-                if np.sum(mask) < 4:
+                inliers = int(np.sum(mask))
+                residual = float(np.sqrt(np.mean(d[mask]**2))) if inliers else float("nan")
+                if inliers < 4:
                     logger.debug(f"ICP: insufficient inliers at iteration {iter_num}")
                     break
                 
@@ -204,8 +303,9 @@ def icp_2d(source: np.ndarray, target: np.ndarray, max_iter: int = 20, tol: floa
                     logger.warning(f"ICP: non-finite transform at iteration {iter_num}")
                     break
                 
-                x += dx
-                y += dy
+                #compose the increment with the current estimate
+                c, s = np.cos(dtheta), np.sin(dtheta)
+                x, y = c*x - s*y + dx, s*x + c*y + dy
                 theta += dtheta
                 
                 #normalize theta to [-pi, pi]
@@ -224,11 +324,140 @@ def icp_2d(source: np.ndarray, target: np.ndarray, max_iter: int = 20, tol: floa
             logger.error(f"Failed to apply final ICP transform: {e}")
             aligned = src
         
+        if info is not None:
+            info.update(iterations=iterations, residual=residual, inliers=inliers)
         return x, y, theta, aligned
     except Exception as e:
         logger.error(f"Error in icp_2d: {e}")
         raise RuntimeError(f"ICP alignment failed: {e}") from e
 
+def estimate_normals(
+    points: np.ndarray,
+    k: int = 6,
+    tree: cKDTree | None = None,
+    max_radius: float = 0.5,
+    max_flatness: float = 0.3,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Unit normals (N,2) of points from the covariance of their k nearest neighbours, and a mask of
+    points lying on a well-defined line (eigenvalue ratio <= max_flatness, neighbours within max_radius)."""
+    points = np.asarray(points, dtype=float)
+    if tree is None:
+        tree = cKDTree(points)
+    k = min(int(k), len(points))
+    d, idx = tree.query(points, k=k)
+    nb = points[idx] - points[idx].mean(axis=1, keepdims=True)
+    cxx = np.mean(nb[..., 0]**2, axis=1)
+    cyy = np.mean(nb[..., 1]**2, axis=1)
+    cxy = np.mean(nb[..., 0] * nb[..., 1], axis=1)
+    #closed-form eigen decomposition of the 2x2 covariances: the line runs along phi
+    phi = 0.5 * np.arctan2(2*cxy, cxx - cyy)
+    normals = np.column_stack((-np.sin(phi), np.cos(phi)))
+    mean = 0.5 * (cxx + cyy)
+    spread = np.hypot(0.5 * (cxx - cyy), cxy)
+    flatness = (mean - spread) / np.maximum(mean + spread, 1e-12)
+    valid = (flatness <= max_flatness) & (d[:, -1] <= max_radius)
+    return normals, valid
+
+def icp_point_to_line(
+    source: np.ndarray,
+    target: np.ndarray,
+    max_iter: int = 20,
+    tol: float = 1e-4,
+    init: tuple[float, float, float] = (0.0, 0.0, 0.0),
+    info: dict | None = None,
+    max_dist: float = 1.0,
+    min_gate: float = 0.05,
+    tree: cKDTree | None = None,
+    normals: tuple[np.ndarray, np.ndarray] | None = None,
+) -> tuple:
+    """Point-to-line ICP alignment starting from init.
+
+    Returns (x, y, theta, aligned_points), the pose of source in the target frame.
+    Minimizes distances of source points to the lines through their nearest target points (normals from
+    estimate_normals) by linearized least squares. Correspondences farther than max_dist are rejected; the
+    gate on the point-to-line distance adapts to 3 robust standard deviations of the residuals (not below
+    min_gate) and only ever tightens, so outliers drop out as the scans align without the inlier set oscillating.
+    If info is given it is filled with iterations used, final RMS point-to-line residual (m) and inlier count.
+    tree and normals (estimate_normals result) of target (finite points only) may be passed to reuse them.
+    """
+    try:
+        src = np.asarray(source, dtype=float)
+        target = np.asarray(target, dtype=float)
+        x, y, theta = (float(v) for v in init)
+
+        if src.ndim != 2 or src.shape[1] != 2:
+            raise ValueError(f"Source must be (N,2), got {src.shape}")
+        if target.ndim != 2 or target.shape[1] != 2:
+            raise ValueError(f"Target must be (N,2), got {target.shape}")
+
+        src = src[np.all(np.isfinite(src), axis=1)]
+        if tree is None:
+            target = target[np.all(np.isfinite(target), axis=1)]
+        if len(src) < 4 or len(target) < 4:
+            logger.warning(f"Insufficient points for ICP: src={len(src)}, target={len(target)}")
+            return x, y, theta, src
+
+        if tree is None:
+            try:
+                tree = cKDTree(target)
+            except Exception as e:
+                raise RuntimeError(f"Failed to build KDTree: {e}") from e
+        normals, flat = normals if normals is not None else estimate_normals(target, tree=tree)
+        if np.sum(flat) < 4:
+            logger.debug("ICP: too few target points on lines, falling back to point-to-point")
+            return icp_2d(source, target, max_iter=max_iter, tol=tol, init=init, info=info, tree=tree)
+
+        iterations, residual, inliers = 0, float("nan"), 0
+        gate = float(max_dist)
+        for iter_num in range(max_iter):
+            iterations = iter_num + 1
+            transformed = apply_transform(src, x, y, theta)
+            d, idx = tree.query(transformed, k=1, distance_upper_bound=max_dist)
+            ok = np.isfinite(d)
+            ok[ok] = flat[idx[ok]]
+            p = transformed[ok]
+            n = normals[idx[ok]]
+            r = np.einsum("ij,ij->i", p - target[idx[ok]], n)
+
+            if len(r) > 4:
+                gate = min(gate, max(3.0 * 1.4826 * float(np.median(np.abs(r))), min_gate))
+                keep = np.abs(r) <= gate
+                p, n, r = p[keep], n[keep], r[keep]
+            inliers = len(r)
+            if inliers < 4:
+                logger.debug(f"ICP: insufficient inliers at iteration {iter_num}")
+                break
+            residual = float(np.sqrt(np.mean(r**2)))
+
+            #linearized about the current estimate: r + J @ (dx, dy, dtheta), J = [n, n x p]
+            J = np.column_stack((n, n[:, 1]*p[:, 0] - n[:, 0]*p[:, 1]))
+            A = J.T @ J
+            #light damping keeps the step bounded along directions the scan does not constrain (corridors)
+            A[np.diag_indices(3)] += 1e-6 * max(np.trace(A), 1.0)
+            try:
+                dx, dy, dtheta = np.linalg.solve(A, -J.T @ r)
+            except np.linalg.LinAlgError as e:
+                logger.warning(f"ICP: solve failed at iteration {iter_num}: {e}")
+                break
+            if not all(np.isfinite([dx, dy, dtheta])):
+                logger.warning(f"ICP: non-finite transform at iteration {iter_num}")
+                break
+
+            c, s = np.cos(dtheta), np.sin(dtheta)
+            x, y = c*x - s*y + dx, s*x + c*y + dy
+            theta = float(np.arctan2(np.sin(theta + dtheta), np.cos(theta + dtheta)))
+
+            if abs(dx) < tol and abs(dy) < tol and abs(dtheta) < tol:
+                logger.debug(f"ICP converged at iteration {iter_num}")
+                break
+
+        if info is not None:
+            info.update(iterations=iterations, residual=residual, inliers=inliers)
+        return float(x), float(y), theta, apply_transform(src, x, y, theta)
+    except Exception as e:
+        logger.error(f"Error in icp_point_to_line: {e}")
+        raise RuntimeError(f"ICP alignment failed: {e}") from e
+
 def _bresenham(x0: int, y0: int, x1: int, y1: int):
     """Yield grid cells along line from (x0,y0) to (x1,y1)."""
     try:
@@ -263,6 +492,506 @@ def _bresenham(x0: int, y0: int, x1: int, y1: int):
         logger.error(f"Error in Bresenham line: {e}")
         yield (x0, y0)
 
+def _ray_cells(origin_ij: np.ndarray, hit_ij: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Cells crossed by the rays from origin_ij to every hit_ij, hit cells excluded. Returns (j, i) index arrays.
+
+    Rays are sampled once per cell along their major axis, so no cell repeats within a ray.
+    """
+    origin_ij = np.asarray(origin_ij, dtype=int).reshape(2)
+    d = np.asarray(hit_ij, dtype=int).reshape(-1, 2) - origin_ij
+    n = np.abs(d).max(axis=1)
+    total = int(n.sum())
+    if total == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    k = np.arange(total, dtype=np.float32) - np.repeat((np.cumsum(n) - n).astype(np.float32), n)
+    step = (d / np.maximum(n, 1)[:, None]).astype(np.float32)
+    j = np.repeat(step[:, 0], n) * k
+    i = np.repeat(step[:, 1], n) * k
+    return np.rint(j).astype(int) + origin_ij[0], np.rint(i).astype(int) + origin_ij[1]
+
+class RayLUT:
+    """Precomputed cell offsets of rays leaving the robot cell, per quantized ray direction.
+
+    Offsets of direction b are stored at [b*max_cells, (b+1)*max_cells) of the flat int16 arrays dj, di,
+    sampled once per cell along the major axis of the ray.
+    """
+
+    def __init__(self, resolution: float, max_range_m: float = 10.0, bins: int | None = None):
+        self.resolution = float(resolution)
+        self.max_cells = max(1, int(np.ceil(max_range_m / resolution)))
+        #enough directions to keep the lateral error at max range under half a cell
+        self.bins = int(bins) if bins else max(1440, int(np.ceil(2 * np.pi * self.max_cells)))
+        if self.max_cells >= 2**15:
+            raise ValueError(f"Ray LUT range too long for int16 offsets: {self.max_cells} cells")
+
+        ang = np.arange(self.bins) * (2 * np.pi / self.bins)
+        c, s = np.cos(ang), np.sin(ang)
+        major = np.maximum(np.abs(c), np.abs(s))
+        self.cells_per_cell = major.astype(np.float32)  #steps along the major axis per cell of range
+        k = np.arange(self.max_cells)
+        self.dj = np.rint(k[None, :] * (c / major)[:, None]).astype(np.int16).ravel()
+        self.di = np.rint(k[None, :] * (s / major)[:, None]).astype(np.int16).ravel()
+
+    def nbytes(self) -> int:
+        return self.dj.nbytes + self.di.nbytes + self.cells_per_cell.nbytes
+
+    def ray_cells(self, origin_ij: np.ndarray, rel_xy: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Cells crossed by rays from origin_ij along world-frame vectors rel_xy (m), end cells excluded."""
+        rel_xy = np.asarray(rel_xy, dtype=float).reshape(-1, 2)
+        b = np.rint(np.arctan2(rel_xy[:, 1], rel_xy[:, 0]) * (self.bins / (2 * np.pi))).astype(int) % self.bins
+        r = np.hypot(rel_xy[:, 0], rel_xy[:, 1]) / self.resolution
+        n = np.minimum(np.rint(r * self.cells_per_cell[b]).astype(int), self.max_cells)
+        total = int(n.sum())
+        if total == 0:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        idx = np.repeat(b * self.max_cells - (np.cumsum(n) - n), n) + np.arange(total)
+        return self.dj[idx].astype(int) + int(origin_ij[0]), self.di[idx].astype(int) + int(origin_ij[1])
+
+_RAY_LUT_CACHE_SIZE = 4
+_ray_lut_cache: "OrderedDict[tuple, RayLUT]" = OrderedDict()
+_ray_lut_lock = threading.Lock()
+
+def get_ray_lut(resolution: float, max_range_m: float = 10.0) -> RayLUT:
+    """Shared RayLUT for the given resolution and range, built on first use (LRU cache of a few tables)."""
+    key = (float(resolution), float(max_range_m))
+    with _ray_lut_lock:
+        lut = _ray_lut_cache.get(key)
+        if lut is None:
+            lut = RayLUT(resolution, max_range_m)
+            logger.debug(f"Built ray LUT {key}: {lut.bins} directions, {lut.nbytes() / 1e6:.1f} MB")
+            _ray_lut_cache[key] = lut
+            while len(_ray_lut_cache) > _RAY_LUT_CACHE_SIZE:
+                _ray_lut_cache.popitem(last=False)
+        else:
+            _ray_lut_cache.move_to_end(key)
+        return lut
+
+class Submap:
+    """Local map for scan matching: voxel-deduplicated world-frame points of the last keyframes.
+
+    The KD-tree (and normals for point-to-line ICP) is rebuilt only when a keyframe is added, in a background
+    thread if background=True; until it finishes, matching uses the previous tree.
+    """
+
+    def __init__(self, max_keyframes: int = 10, voxel_m: float = 0.05, with_normals: bool = False,
+                 background: bool = True):
+        self.keyframes = deque(maxlen=max(1, int(max_keyframes)))  #(pose, points_world), oldest first
+        self.voxel_m = float(voxel_m)
+        self.with_normals = with_normals
+        self.background = background
+        self.version = 0  #grows with every added keyframe
+        self.rebuilds = 0  #number of KD-tree builds
+        self._built = None  #(version, points, tree, normals)
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def __len__(self) -> int:
+        return len(self.keyframes)
+
+    def add(self, pose: np.ndarray, points_world: np.ndarray):
+        """Add a keyframe scan in world frame, dropping the oldest one beyond max_keyframes."""
+        with self._lock:
+            self.keyframes.append((np.array(pose, dtype=float), np.asarray(points_world, dtype=float)))
+            self.version += 1
+            if not self.background or self._built is None:
+                return
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._rebuild_latest, daemon=True)
+                self._worker.start()
+
+    def clear(self):
+        with self._lock:
+            self.keyframes.clear()
+            self.version += 1
+            self._built = None
+
+    def _build(self):
+        """Build (version, points, tree, normals) from the current keyframes."""
+        with self._lock:
+            version = self.version
+            scans = [points for _, points in reversed(self.keyframes)]
+        #newest keyframe first, so its points win in shared voxels
+        points = voxel_downsample(np.concatenate(scans), self.voxel_m) if scans else np.empty((0, 2))
+        points = points[np.all(np.isfinite(points), axis=1)]
+        tree = cKDTree(points) if len(points) else None
+        normals = estimate_normals(points, tree=tree) if self.with_normals and len(points) >= 4 else None
+        return version, points, tree, normals
+
+    def _rebuild_latest(self):
+        while True:
+            built = self._build()
+            with self._lock:
+                if self._built is None or built[0] > self._built[0]:
+                    self._built = built
+                    self.rebuilds += 1
+                if self._built[0] >= self.version:
+                    return
+
+    def get(self) -> tuple[np.ndarray, cKDTree | None, tuple | None]:
+        """Return (points, tree, normals) of the submap; built here on first use, or when background=False."""
+        with self._lock:
+            built = self._built
+        if built is None or (not self.background and built[0] < self.version):
+            built = self._build()
+            with self._lock:
+                self._built = built
+                self.rebuilds += 1
+        return built[1], built[2], built[3]
+
+class CorrelativeMatcher:
+    """Correlative scan matcher: exhaustive search of a pose window, scored on a likelihood grid of the target.
+
+    Candidate poses are rotations (all evaluated in one batch) times translations in cells of resolution.
+    Branch-and-bound runs over a pyramid of grids whose level h holds the maximum of 2^h x 2^h cells, so a
+    coarse candidate's score bounds the scores of all the translations it covers and most of the window is
+    pruned without being scored. Scores are mean likelihoods in [0, 1].
+    """
+
+    def __init__(
+        self,
+        resolution: float = 0.05,
+        linear_window_m: float = 0.5,
+        angular_window_deg: float = 30.0,
+        angular_step_deg: float | None = None,
+        depth: int = 4,
+        sigma_m: float | None = None,
+        min_score: float = 0.3,
+    ):
+        if resolution <= 0 or linear_window_m < 0 or angular_window_deg < 0:
+            raise ValueError("resolution must be positive and search windows non-negative")
+        self.resolution = float(resolution)
+        self.window = int(round(linear_window_m / resolution))  #linear window in cells
+        self.angular_window = math.radians(angular_window_deg)
+        self.angular_step = math.radians(angular_step_deg) if angular_step_deg else None  #None = from scan range
+        self.depth = max(0, int(depth))
+        self.sigma_m = float(sigma_m) if sigma_m else self.resolution
+        self.min_score = float(min_score)
+        self._pyramid = None  #likelihood grids, level h = max over 2^h x 2^h cells
+        self._origin = None  #world (x, y) of cell (0, 0)
+
+    def set_target(self, points_world: np.ndarray):
+        """Rasterize target points (world frame) into the likelihood grid and its pyramid."""
+        pts = np.asarray(points_world, dtype=float).reshape(-1, 2)
+        pts = pts[np.all(np.isfinite(pts), axis=1)]
+        if len(pts) == 0:
+            self._pyramid = None
+            return
+        #pad with zeros so that clipped indices and the top pyramid windows only ever see the border
+        pad = (1 << self.depth) + self.window + 2
+        lo = np.floor(pts.min(axis=0) / self.resolution).astype(int) - pad
+        hi = np.floor(pts.max(axis=0) / self.resolution).astype(int) + pad + 1
+        self._origin = lo * self.resolution
+        w, h = hi - lo
+        cells = np.floor(pts / self.resolution).astype(int) - lo
+        free = np.ones((h, w), dtype=bool)
+        free[cells[:, 1], cells[:, 0]] = False
+        d = distance_transform_edt(free) * self.resolution
+        grid = np.exp(-0.5 * (d / self.sigma_m)**2).astype(np.float32)
+        grid[:pad // 2, :] = grid[-(pad // 2):, :] = 0
+        grid[:, :pad // 2] = grid[:, -(pad // 2):] = 0
+        self._pyramid = [grid]
+        for level in range(1, self.depth + 1):
+            s = 1 << (level - 1)
+            g = self._pyramid[-1]
+            m = g.copy()
+            m[:, :-s] = np.maximum(m[:, :-s], g[:, s:])
+            m[:-s, :] = np.maximum(m[:-s, :], m[s:, :])
+            self._pyramid.append(m)
+
+    def _score(self, level: int, cands: np.ndarray) -> np.ndarray:
+        """Mean likelihood of candidates (M,3: rotation index, x offset, y offset in cells) on a pyramid level."""
+        grid = self._pyramid[level]
+        h, w = grid.shape
+        ix = np.clip(self._ix[cands[:, 0]] + cands[:, 1:2], 0, w - 1)
+        iy = np.clip(self._iy[cands[:, 0]] + cands[:, 2:3], 0, h - 1)
+        self._evaluated += len(cands)
+        return grid[iy, ix].mean(axis=1)
+
+    def _branch(self, cands: np.ndarray, scores: np.ndarray, level: int, best: list):
+        """Depth-first branch-and-bound over candidates of a level, best-scored first; best = [score, cand]."""
+        for k in np.argsort(-scores, kind="stable"):
+            if scores[k] <= best[0]:
+                return
+            if level == 0:
+                best[0], best[1] = float(scores[k]), cands[k]
+                return
+            s = 1 << (level - 1)
+            children = cands[k] + np.array([[0, 0, 0], [0, s, 0], [0, 0, s], [0, s, s]])
+            children = children[(children[:, 1] <= self.window) & (children[:, 2] <= self.window)]
+            self._branch(children, self._score(level - 1, children), level - 1, best)
+
+    def score(self, source: np.ndarray, pose: tuple[float, float, float]) -> float:
+        """Mean likelihood of robot-frame source points at pose on the likelihood grid, as match scores it."""
+        src = np.asarray(source, dtype=float).reshape(-1, 2)
+        src = src[np.all(np.isfinite(src), axis=1)]
+        if self._pyramid is None or len(src) == 0:
+            return 0.0
+        grid = self._pyramid[0]
+        h, w = grid.shape
+        pts = apply_transform(src, *pose) - self._origin
+        ix = np.clip(np.floor(pts[:, 0] / self.resolution).astype(np.int32), 0, w - 1)
+        iy = np.clip(np.floor(pts[:, 1] / self.resolution).astype(np.int32), 0, h - 1)
+        return float(grid[iy, ix].mean())
+
+    def match(
+        self,
+        source: np.ndarray,
+        init: tuple[float, float, float] = (0.0, 0.0, 0.0),
+        info: dict | None = None,
+    ) -> tuple:
+        """Best pose of robot-frame source points within the window around init. Returns (x, y, theta, aligned).
+
+        Returns init if no candidate scores at least min_score. If info is given it is filled with the score,
+        the number of rotations and of candidates evaluated.
+        """
+        try:
+            src = np.asarray(source, dtype=float).reshape(-1, 2)
+            src = src[np.all(np.isfinite(src), axis=1)]
+            x0, y0, th0 = (float(v) for v in init)
+            if self._pyramid is None or len(src) < 4:
+                logger.warning("Correlative matcher has no target or too few points")
+                if info is not None:
+                    info.update(score=0.0, rotations=0, candidates=0)
+                return x0, y0, th0, apply_transform(src, x0, y0, th0) if len(src) else src
+
+            step = self.angular_step
+            if step is None:
+                #rotation step moving the farthest point by about one cell
+                r = max(float(np.max(np.hypot(src[:, 0], src[:, 1]))), self.resolution)
+                step = math.acos(max(-1.0, 1.0 - self.resolution**2 / (2 * r * r)))
+            n = int(math.ceil(self.angular_window / step)) if self.angular_window > 0 else 0
+            angles = th0 + step * np.arange(-n, n + 1)
+
+            #all rotations in one batch: (K,N) base cell indices of the source at translation offset 0
+            c, s = np.cos(angles)[:, None], np.sin(angles)[:, None]
+            wx = c * src[:, 0] - s * src[:, 1] + (x0 - self._origin[0])
+            wy = s * src[:, 0] + c * src[:, 1] + (y0 - self._origin[1])
+            self._ix = np.floor(wx / self.resolution).astype(np.int32)
+            self._iy = np.floor(wy / self.resolution).astype(np.int32)
+            self._evaluated = 0
+
+            top = 1 << self.depth
+            offsets = np.arange(-self.window, self.window + 1, top)
+            k, ox, oy = np.meshgrid(np.arange(len(angles)), offsets, offsets, indexing="ij")
+            cands = np.column_stack((k.ravel(), ox.ravel(), oy.ravel()))
+            best = [self.min_score, None]
+            self._branch(cands, self._score(self.depth, cands), self.depth, best)
+
+            if info is not None:
+                info.update(score=best[0] if best[1] is not None else 0.0, rotations=len(angles),
+                            candidates=self._evaluated)
+            if best[1] is None:
+                return x0, y0, th0, apply_transform(src, x0, y0, th0)
+            k, ox, oy = (int(v) for v in best[1])
+            x, y = x0 + ox * self.resolution, y0 + oy * self.resolution
+            theta = float(np.arctan2(np.sin(angles[k]), np.cos(angles[k])))
+            return x, y, theta, apply_transform(src, x, y, theta)
+        except Exception as e:
+            logger.error(f"Error in correlative scan matching: {e}")
+            raise RuntimeError(f"Correlative scan matching failed: {e}") from e
+
+class DistanceField:
+    """Distance to the nearest occupied cell of every cell of a growing grid, maintained incrementally.
+
+    Dynamic brushfire (Lau et al., "Improved updating of Euclidean distance maps and Voronoi diagrams"): every
+    cell stores its nearest obstacle. Cells that stop being occupied start a raise wave clearing the cells whose
+    nearest obstacle they were; the cells bordering the cleared region and new obstacles then start a lower wave
+    that hands each cell its neighbors' obstacles if they are closer. The waves advance a whole front at a time
+    in NumPy and stop at max_dist_m, so an update costs in proportion to the cells whose distance changes, not
+    to the grid. Cells are addressed by global (row, col) as SLAM grid cells; the arrays cover extent.
+    """
+
+    #8-neighborhood
+    _DI = np.array([-1, -1, -1, 0, 0, 1, 1, 1])
+    _DJ = np.array([-1, 0, 1, -1, 1, -1, 0, 1])
+    _NONE = np.iinfo(np.int32).max  #squared distance of cells with no obstacle within max_dist_m
+
+    def __init__(self, resolution: float, extent: tuple[int, int, int, int], max_dist_m: float = 2.0):
+        if resolution <= 0 or max_dist_m <= 0:
+            raise ValueError(f"resolution and max_dist_m must be positive, got {resolution}, {max_dist_m}")
+        self.resolution = float(resolution)
+        self.max_dist_m = float(max_dist_m)
+        self._max2 = int(math.floor(max_dist_m / resolution))**2  #largest squared distance (cells) stored
+        self.extent = (0, 0, 0, 0)  #(row0, row1, col0, col1) covered by the arrays
+        self.occupied = np.zeros((0, 0), dtype=bool)
+        self._dist2 = np.zeros((0, 0), dtype=np.int32)  #squared distance (cells) to the nearest obstacle
+        self._obst_i = np.zeros((0, 0), dtype=np.int32)  #global row...
+        self._obst_j = np.zeros((0, 0), dtype=np.int32)  #...and column of the nearest obstacle
+        self._scale = np.sqrt(np.arange(self._max2 + 1)) * self.resolution  #squared cells -> m
+        self.updates = 0  #cells whose distance the waves changed, summed over all updates
+        self.fit(extent)
+
+    def fit(self, extent: tuple[int, int, int, int]):
+        """Grow the arrays to cover extent (row0, row1, col0, col1); distances propagate into the new cells."""
+        i0, i1, j0, j1 = self.extent
+        k0, k1, l0, l1 = (int(v) for v in extent)
+        if i1 > i0 and j1 > j0:
+            k0, k1, l0, l1 = min(i0, k0), max(i1, k1), min(j0, l0), max(j1, l1)
+        if (k0, k1, l0, l1) == self.extent:
+            return
+        old = (slice(i0 - k0, i1 - k0), slice(j0 - l0, j1 - l0))
+        shape = (k1 - k0, l1 - l0)
+        occupied = np.zeros(shape, dtype=bool)
+        dist2 = np.full(shape, self._NONE, dtype=np.int32)
+        obst_i = np.zeros(shape, dtype=np.int32)
+        obst_j = np.zeros(shape, dtype=np.int32)
+        occupied[old], dist2[old], obst_i[old], obst_j[old] = self.occupied, self._dist2, self._obst_i, self._obst_j
+        self.occupied, self._dist2, self._obst_i, self._obst_j = occupied, dist2, obst_i, obst_j
+        self.extent = (k0, k1, l0, l1)
+        if i1 > i0 and j1 > j0:
+            #the outer ring of the old arrays carries obstacles near the border into the new cells
+            ring = np.zeros(shape, dtype=bool)
+            ring[old] = True
+            ring[old][1:-1, 1:-1] = False
+            self._lower(np.flatnonzero(ring.ravel() & (dist2.ravel() != self._NONE)))
+
+    def reset(self, occupied: np.ndarray, extent: tuple[int, int, int, int]):
+        """Recompute the whole field from an occupancy grid covering extent (exact EDT)."""
+        occupied = np.asarray(occupied, dtype=bool)
+        self.extent = tuple(int(v) for v in extent)
+        self.occupied = occupied.copy()
+        shape = occupied.shape
+        if not occupied.any():
+            self._dist2 = np.full(shape, self._NONE, dtype=np.int32)
+            self._obst_i = np.zeros(shape, dtype=np.int32)
+            self._obst_j = np.zeros(shape, dtype=np.int32)
+            return
+        _, (ri, rj) = distance_transform_edt(~occupied, return_indices=True)
+        gi, gj = np.indices(shape)
+        dist2 = (gi - ri)**2 + (gj - rj)**2
+        self._dist2 = np.where(dist2 <= self._max2, dist2, self._NONE).astype(np.int32)
+        self._obst_i = (ri + self.extent[0]).astype(np.int32)
+        self._obst_j = (rj + self.extent[2]).astype(np.int32)
+
+    def update(self, rows: np.ndarray, cols: np.ndarray, occupied: np.ndarray) -> int:
+        """Set the occupancy of distinct cells (global row, col inside extent) and update the distances of the
+        cells it affects. Returns the number of cells whose distance changed."""
+        i0, _, j0, _ = self.extent
+        w = self.occupied.shape[1]
+        idx = (np.asarray(rows) - i0) * w + (np.asarray(cols) - j0)
+        occupied = np.asarray(occupied, dtype=bool)
+        occ = self.occupied.ravel()
+        flip = occ[idx] != occupied
+        if not flip.any():
+            return 0
+        idx, occupied = idx[flip], occupied[flip]
+        occ[idx] = occupied
+        added, removed = idx[occupied], idx[~occupied]
+        changed = 0
+        border = np.empty(0, dtype=np.intp)
+        if len(removed):
+            border, changed = self._raise(removed)
+        if len(added):
+            dist2 = self._dist2.ravel()
+            changed += int(np.sum(dist2[added] != 0))
+            dist2[added] = 0
+            self._obst_i.ravel()[added] = added // w + i0
+            self._obst_j.ravel()[added] = added % w + j0
+        changed += self._lower(np.union1d(added, border))
+        self.updates += changed
+        return changed
+
+    def _neighbors(self, front: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(source, neighbor) flat indices and neighbor (row, col) in the arrays of the in-bounds 8-neighbors
+        of the front cells."""
+        h, w = self.occupied.shape
+        fi, fj = np.divmod(front, w)
+        ni = (fi[:, None] + self._DI).ravel()
+        nj = (fj[:, None] + self._DJ).ravel()
+        ok = (ni >= 0) & (ni < h) & (nj >= 0) & (nj < w)
+        ni, nj = ni[ok], nj[ok]
+        return np.repeat(front, 8)[ok], ni * w + nj, ni, nj
+
+    def _raise(self, removed: np.ndarray) -> tuple[np.ndarray, int]:
+        """Clear the removed obstacles and every cell whose nearest obstacle is no longer occupied.
+        Returns the cells bordering the cleared region (they still have a valid obstacle) and the cells cleared."""
+        i0, _, j0, _ = self.extent
+        w = self.occupied.shape[1]
+        dist2, obst_i, obst_j = self._dist2.ravel(), self._obst_i.ravel(), self._obst_j.ravel()
+        occ = self.occupied.ravel()
+        dist2[removed] = self._NONE
+        cleared = len(removed)
+        front, border = removed, []
+        while len(front):
+            n = np.unique(self._neighbors(front)[1])
+            n = n[dist2[n] != self._NONE]
+            stale = ~occ[(obst_i[n] - i0) * w + (obst_j[n] - j0)]
+            border.append(n[~stale])
+            front = n[stale]
+            dist2[front] = self._NONE
+            cleared += len(front)
+        return np.unique(np.concatenate(border)) if border else np.empty(0, dtype=np.intp), cleared
+
+    def _lower(self, front: np.ndarray) -> int:
+        """Propagate the obstacles of the front cells to neighbors they are closer to. Returns cells changed."""
+        i0, _, j0, _ = self.extent
+        w = self.occupied.shape[1]
+        dist2, obst_i, obst_j = self._dist2.ravel(), self._obst_i.ravel(), self._obst_j.ravel()
+        changed = 0
+        while len(front):
+            src, n, ni, nj = self._neighbors(front)
+            oi, oj = obst_i[src], obst_j[src]
+            d2 = (ni + (i0 - oi))**2 + (nj + (j0 - oj))**2
+            closer = (d2 < dist2[n]) & (d2 <= self._max2)
+            n, d2, src = n[closer], d2[closer], src[closer]
+            if not len(n):
+                break
+            #a cell reached from several front cells takes the closest obstacle: sort by cell, then distance
+            order = np.argsort(n * (self._max2 + 1) + d2)
+            n, d2, src = n[order], d2[order], src[order]
+            first = np.concatenate(([True], n[1:] != n[:-1]))
+            front, src = n[first], src[first]
+            dist2[front], obst_i[front], obst_j[front] = d2[first], obst_i[src], obst_j[src]
+            changed += len(front)
+        return changed
+
+    def at(self, row: int, col: int) -> float:
+        """Distance (m) of cell (row, col) to the nearest obstacle; max_dist_m if none is closer or outside."""
+        i0, i1, j0, j1 = self.extent
+        if not (i0 <= row < i1 and j0 <= col < j1):
+            return self.max_dist_m
+        d2 = self._dist2[row - i0, col - j0]
+        return self.max_dist_m if d2 == self._NONE else float(self._scale[d2])
+
+    def lookup(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Distances (m) of cells (rows, cols of any matching shapes); max_dist_m as in at()."""
+        i0, i1, j0, j1 = self.extent
+        rows, cols = np.asarray(rows) - i0, np.asarray(cols) - j0
+        inside = (rows >= 0) & (rows < i1 - i0) & (cols >= 0) & (cols < j1 - j0)
+        d2 = self._dist2[np.where(inside, rows, 0), np.where(inside, cols, 0)]
+        valid = inside & (d2 != self._NONE)
+        return np.where(valid, self._scale[np.where(valid, d2, 0)], self.max_dist_m)
+
+    def get(self) -> np.ndarray:
+        """Distances (m) over extent as float32, max_dist_m beyond it."""
+        valid = self._dist2 != self._NONE
+        return np.where(valid, self._scale[np.where(valid, self._dist2, 0)], self.max_dist_m).astype(np.float32)
+
+class LatestScan:
+    """Stand-in for the laser while SLAM's tracking thread reads it: hands out the latest tracked scan,
+    so that the control loop never reads the sensor concurrently with the tracker."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._scan = None  #(timestamp, filtered scan)
+        self.count = 0  #scans published
+
+    def put(self, timestamp, scan: np.ndarray):
+        with self._cond:
+            self._scan = (timestamp, scan)
+            self.count += 1
+            self._cond.notify_all()
+
+    def get_filtered_dist(self, dmax: int | None = None, timeout: float = 1.0, **kwargs) -> tuple:
+        """Latest (timestamp, scan) with rows (angle, range) up to dmax; waits for the first scan."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._scan is not None, timeout):
+                raise RuntimeError("No scan from the tracking thread")
+            timestamp, scan = self._scan
+        if dmax is not None:
+            scan = scan[scan[:, 1] <= dmax]
+        return timestamp, scan
+
 class SLAM:
     def __init__(
         self,
@@ -273,6 +1002,33 @@ class SLAM:
         log_odds_min: float = -10.0,
         prob_hit: float = 0.7,
         prob_miss: float = 0.4,
+        ray_lut_range_m: float | None = 10.0,
+        grid_dtype: str = "float64",
+        max_resident_tiles: int | None = None,
+        tile_spill_dir: str | None = None,
+        icp_method: str = "point_to_point",
+        icp_max_iter: int = 20,
+        icp_tol: float = 1e-4,
+        submap_keyframes: int = 10,
+        submap_voxel_m: float = 0.05,
+        keyframe_distance_m: float = 0.2,
+        keyframe_angle_deg: float = 10.0,
+        downsample_leaf_m: float = 0.05,
+        downsample_max_points: int | None = None,
+        correlative_mode: str = "off",
+        correlative_window_m: float = 0.5,
+        correlative_window_deg: float = 30.0,
+        motion_model: MecanumMotionModel | None = None,
+        pose_graph: bool = False,
+        loop_closure_radius_m: float = 2.0,
+        loop_closure_min_gap: int = 30,
+        loop_closure_min_score: float = 0.6,
+        static_threshold_m: float | None = None,
+        static_threshold_deg: float = 1.0,
+        async_mapping: bool = False,
+        mapping_queue_size: int = 4,
+        distance_field_max_m: float | None = None,
+        localizer: MonteCarloLocalizer | None = None,
     ):
         try:
             if resolution <= 0 or not np.isfinite(resolution):
@@ -287,6 +1043,30 @@ class SLAM:
                 raise ValueError(f"prob_miss must be in (0,1), got {prob_miss}")
             if log_odds_min >= log_odds_max:
                 raise ValueError(f"log_odds_min ({log_odds_min}) must be < log_odds_max ({log_odds_max})")
+            if grid_dtype not in GRID_DTYPES:
+                raise ValueError(f"grid_dtype must be one of {GRID_DTYPES}, got {grid_dtype!r}")
+            if grid_dtype == "uint8" and not (log_odds_min < 0 < log_odds_max):
+                raise ValueError("uint8 grid needs log_odds_min < 0 < log_odds_max")
+            if icp_method not in ICP_METHODS:
+                raise ValueError(f"icp_method must be one of {ICP_METHODS}, got {icp_method!r}")
+            if icp_max_iter < 1 or icp_tol <= 0:
+                raise ValueError(f"icp_max_iter and icp_tol must be positive, got {icp_max_iter}, {icp_tol}")
+            if correlative_mode not in CORRELATIVE_MODES:
+                raise ValueError(f"correlative_mode must be one of {CORRELATIVE_MODES}, got {correlative_mode!r}")
+            if submap_keyframes < 0:
+                raise ValueError(f"submap_keyframes must be >= 0, got {submap_keyframes}")
+            if max_resident_tiles is not None and max_resident_tiles < 1:
+                raise ValueError(f"max_resident_tiles must be positive or None, got {max_resident_tiles}")
+            if mapping_queue_size < 1:
+                raise ValueError(f"mapping_queue_size must be positive, got {mapping_queue_size}")
+            if distance_field_max_m is not None and distance_field_max_m <= 0:
+                raise ValueError(f"distance_field_max_m must be positive or None, got {distance_field_max_m}")
+            if static_threshold_m is not None and static_threshold_m <= 0:
+                raise ValueError(f"static_threshold_m must be positive or None, got {static_threshold_m}")
+            if loop_closure_radius_m <= 0 or loop_closure_min_gap < 1:
+                raise ValueError(
+                    f"loop_closure_radius_m and loop_closure_min_gap must be positive, got {loop_closure_radius_m}, {loop_closure_min_gap}"
+                )
             
             self.resolution = float(resolution)
             self.width_m = float(width_m)
@@ -298,39 +1078,209 @@ class SLAM:
             
             if nw <= 0 or nh <= 0:
                 raise ValueError(f"Invalid grid size: {nw}x{nh}")
-            if nw > 10000 or nh > 10000:
-                raise ValueError(f"Grid too large: {nw}x{nh}. Consider larger resolution.")
-            
-            self.grid = np.zeros((nh, nw), dtype=float)
+
+            #the map is unbounded: tiles of MAP_TILE_CELLS x MAP_TILE_CELLS cells keyed by (tile_row, tile_col)
+            #are allocated on first touch; width_m x height_m is only the area exported before it is explored
+            self._tiles = {}  #tiles held in memory
+            self._resident = OrderedDict()  #keys of the tiles in memory, least recently updated first
+            self._spilled = {}  #tile key -> .npy file of a tile evicted to disk
+            self.max_resident_tiles = max_resident_tiles  #None = never evict
+            self.tile_spill_dir = tile_spill_dir  #None = temporary directory removed with SLAM
+            self._extent = (0, nh, 0, nw)  #(row0, row1, col0, col1) covered by get_map()
+            self._map_lock = threading.RLock()  #guards the tiles against the mapping worker
+
+            #change tracking: map_version grows with every update_map that changes the grid
+            self.map_version = 0
+            self._tile_versions = {}  #version of the last change per tile
+            self._prob_tiles = {}  #cached float32 probabilities of resident tiles, refreshed on demand
+            self._prob_versions = {}  #version reflected by each cached tile
             self.log_odds_max = float(log_odds_max)
             self.log_odds_min = float(log_odds_min)
             
             try:
                 self.lp_hit = np.log(prob_hit / (1 - prob_hit))
-                self.lp_miss = np.log((1 - prob_miss) / prob_miss)
+                self.lp_miss = np.log(prob_miss / (1 - prob_miss))
             except (ValueError, ZeroDivisionError) as e:
                 raise ValueError(f"Invalid probability values: prob_hit={prob_hit}, prob_miss={prob_miss}") from e
             
             if not np.isfinite(self.lp_hit) or not np.isfinite(self.lp_miss):
                 raise ValueError("Computed log-probabilities are not finite")
+
+            self.grid_dtype = grid_dtype
+            self._init_storage()
+
+            #distance of every cell to the nearest occupied cell up to distance_field_max_m (None = not kept),
+            #updated from the cells each update_map flips between occupied and not
+            self._distance = DistanceField(
+                self.resolution, self._extent, distance_field_max_m
+            ) if distance_field_max_m else None
+            self._occupied_log_odds = math.log(OCCUPIED_PROB / (1 - OCCUPIED_PROB))
             
+            #ray-cast free space through precomputed offsets (None = cast every ray at runtime)
+            self.ray_lut_range_m = ray_lut_range_m
+            if ray_lut_range_m is not None:
+                threading.Thread(
+                    target=get_ray_lut, args=(self.resolution, ray_lut_range_m), daemon=True
+                ).start()
+
             self.pose = np.array([0.0, 0.0, 0.0])  #x, y, theta world
             self._prev_points = None  #prev scan in world frame for ICP
+            self.icp_method = icp_method
+            self.icp_max_iter = int(icp_max_iter)  #ICP iteration limit...
+            self.icp_tol = float(icp_tol)  #...and convergence tolerance on the pose increment (m, rad)
+            self.last_icp = {}  #method, scan_points, points, iterations, residual (m), inliers, time_ms of the last scan match
+
+            #scans are matched against a submap of the last keyframes (None = against the previous scan only);
+            #a scan becomes a keyframe once the robot moved keyframe_distance_m or turned keyframe_angle_deg
+            self._submap = Submap(
+                submap_keyframes, submap_voxel_m, with_normals=icp_method == "point_to_line"
+            ) if submap_keyframes else None
+            self.keyframe_distance_m = float(keyframe_distance_m)
+            self.keyframe_angle_rad = math.radians(keyframe_angle_deg)
+            self._keyframe_pose = None  #pose of the last keyframe
+
+            #ICP matches a voxel-downsampled copy of each scan (leaf 0 and no budget = full scan); the map uses the full scan
+            self._downsampler = ScanDownsampler(downsample_leaf_m, downsample_max_points)
+
+            #correlative search of a wide pose window around the last pose, alone or to initialize ICP
+            self.correlative_mode = correlative_mode
+            self._matcher = CorrelativeMatcher(
+                self.resolution, correlative_window_m, correlative_window_deg
+            ) if correlative_mode != "off" else None
+            self._matcher_target = None  #target the matcher's likelihood grid was built from
+            self.correlative_overrides = 0  #"init" scans where ICP left the correlative pose and was discarded
+
+            #commanded chassis motion predicts each scan's pose (initial guess) and gates the match (None = no prior)
+            self.motion_model = motion_model
+            self.odometry_rejections = 0  #matches rejected for disagreeing with the motion model
+
+            #localization-only mode: a particle filter localizes every scan on a saved map, the map is not updated
+            self.localizer = localizer
+
+            #split pipeline: process_scan only tracks the pose and queues scans for a mapping worker thread; the
+            #queue is bounded and drops its oldest scan when full, so tracking never waits for the map
+            self.async_mapping = async_mapping
+            self._map_queue = queue.Queue(maxsize=mapping_queue_size)  #(origin, world-frame points)
+            self._map_worker = None
+            self.mapping_dropped = 0  #scans dropped from a full mapping queue
+            #tracking thread (start_tracking) processing every scan of the laser at the sensor rate
+            self._tracker = None
+            self._tracking_stop = threading.Event()
+            self.latest_scan = None  #LatestScan handing the tracked scans to the control loop
+            self.tracked_scans = 0  #scans the tracking thread processed successfully
+            self.tracking_rate_hz = 0.0  #smoothed rate of the tracking thread
+
+            #scans taken while the robot stands still (or creeps) are skipped: no scan matching, no map update
+            self.static_threshold_m = static_threshold_m  #None = process every scan
+            self.static_threshold_rad = math.radians(static_threshold_deg)
+            self._static_signature = None  #scan_signature of the last processed scan
+            self.scans_processed = 0  #scans matched against the map
+            self.scans_skipped = 0  #scans skipped as static
+
+            #pose graph back-end (None = front-end only): keyframes become graph nodes; a worker thread verifies
+            #loop closures with the scan matchers, optimizes the graph and rebuilds the grid from the optimized
+            #keyframes, and the control thread adopts the result at its next scan
+            self._graph = PoseGraph() if pose_graph else None
+            self.loop_closure_radius_m = float(loop_closure_radius_m)  #keyframes this close are loop candidates
+            self.loop_closure_min_gap = int(loop_closure_min_gap)  #...if at least this many keyframes older
+            self.loop_closures = 0  #verified loop closures added to the graph
+            self.graph_optimizations = 0  #optimizations adopted by the control thread
+            self.last_optimization = {}  #nodes, edges, iterations, chi2_before, chi2_after, time_ms of the last one
+            self._graph_frontend = []  #front-end pose of each keyframe, kept in the frame of the current map
+            self._graph_scans = []  #downsampled robot-frame scan of each node (worker thread)
+            self._graph_queue = queue.Queue()  #(pose, odometry edge, scan) of keyframes for the worker
+            self._graph_lock = threading.Lock()
+            self._graph_result = None  #(nodes, optimized poses, rebuilt map, stats) not adopted yet
+            self._graph_worker = None
+            #loop closures are searched at twice the map resolution; point-to-line ICP refines them
+            self._loop_matcher = CorrelativeMatcher(
+                2 * self.resolution, loop_closure_radius_m, 20.0, min_score=loop_closure_min_score
+            ) if pose_graph else None
+            #settings of the map-only SLAM the worker rebuilds the grid in
+            self._map_kwargs = dict(
+                resolution=resolution, width_m=width_m, height_m=height_m, log_odds_max=log_odds_max,
+                log_odds_min=log_odds_min, prob_hit=prob_hit, prob_miss=prob_miss,
+                ray_lut_range_m=ray_lut_range_m, grid_dtype=grid_dtype, submap_keyframes=0,
+                max_resident_tiles=max_resident_tiles, tile_spill_dir=tile_spill_dir,
+            )
             self._map_points = []  #accumulated points for map
             self._emergency_close_streak = Config.lidar_emergency_debounce_scans #number of consecutive scans at which the robot is too close to an obstacle
             
-            logger.info(f"SLAM initialized: grid={nh}x{nw}, resolution={resolution}m")
+            logger.info(f"SLAM initialized: grid={nh}x{nw} in {MAP_TILE_CELLS}x{MAP_TILE_CELLS} tiles, resolution={resolution}m")
         except Exception as e:
             logger.error(f"Failed to initialize SLAM: {e}")
             raise RuntimeError(f"SLAM initialization failed: {e}") from e
 
+    def _init_storage(self):
+        """Set up grid_dtype storage of the tiles; _unknown is the stored value of log-odds 0.
+
+        float64 stores log-odds directly. int16 stores fixed-point log-odds (log-odds * _q_scale) updated with
+        saturating adds. uint8 stores indices into the _levels table of log-odds values and is updated through
+        precomputed hit/miss tables, one update per cell and scan (a hit wins over misses), and converted to
+        probabilities through a table as well.
+        """
+        if self.grid_dtype == "int16":
+            self._q_scale = np.floor(32767 / max(abs(self.log_odds_min), abs(self.log_odds_max)))
+            self._q_min = int(np.ceil(self.log_odds_min * self._q_scale))
+            self._q_max = int(np.floor(self.log_odds_max * self._q_scale))
+            self._q_hit = int(round(self.lp_hit * self._q_scale))
+            self._q_miss = int(round(self.lp_miss * self._q_scale))
+            self._unknown = 0
+        elif self.grid_dtype == "uint8":
+            #level 127 is exactly log-odds 0 (unknown)
+            self._levels = np.concatenate((
+                np.linspace(self.log_odds_min, 0.0, 128),
+                np.linspace(0.0, self.log_odds_max, 129)[1:],
+            ))
+            self._unknown = 127
+            self._hit_table = self._quantize_levels(self._levels + self.lp_hit)
+            self._miss_table = self._quantize_levels(self._levels + self.lp_miss)
+            self._prob_table = (1.0 - 1.0 / (1.0 + np.exp(self._levels))).astype(np.float32)
+        else:
+            self._unknown = 0.0
+
+    def _quantize_levels(self, log_odds: np.ndarray) -> np.ndarray:
+        """Nearest uint8 level of each log-odds value."""
+        log_odds = np.clip(log_odds, self.log_odds_min, self.log_odds_max)
+        idx = np.clip(np.searchsorted(self._levels, log_odds), 1, len(self._levels) - 1)
+        lower = log_odds - self._levels[idx - 1] < self._levels[idx] - log_odds
+        return (idx - lower).astype(np.uint8)
+
+    def _log_odds(self, block: np.ndarray) -> np.ndarray:
+        """Float log-odds of a block of tile storage."""
+        if self.grid_dtype == "int16":
+            return block / self._q_scale
+        if self.grid_dtype == "uint8":
+            return self._levels[block]
+        return block
+
+    def _apply_counts(self, sub: np.ndarray, hits: np.ndarray, misses: np.ndarray) -> np.ndarray:
+        """Apply per-cell hit/miss counts to the tile block sub in place. Returns mask of updated cells."""
+        updated = (hits > 0) | (misses > 0)
+        if self.grid_dtype == "int16":
+            q = sub.astype(np.int32)
+            q += hits * self._q_hit
+            q += misses * self._q_miss
+            np.clip(q, self._q_min, self._q_max, out=q)
+            sub[...] = q
+        elif self.grid_dtype == "uint8":
+            hit = hits > 0
+            miss = (misses > 0) & ~hit
+            sub[...] = np.where(hit, self._hit_table[sub], np.where(miss, self._miss_table[sub], sub))
+        else:
+            sub += self.lp_hit * hits
+            sub += self.lp_miss * misses
+            np.clip(sub, self.log_odds_min, self.log_odds_max, out=sub)
+        return updated
+
     def get_pose(self) -> tuple:
-        """Return (x, y, theta) in meters and radians."""
+        """Return (x, y, theta) in meters and radians, the latest tracked pose."""
         try:
             if not np.all(np.isfinite(self.pose)):
                 logger.warning("Pose contains non-finite values, returning zeros")
                 return 0.0, 0.0, 0.0
-            return float(self.pose[0]), float(self.pose[1]), float(self.pose[2])
+            x, y, theta = self.pose.copy()  #one copy: the tracking thread may be updating the pose
+            return float(x), float(y), float(theta)
         except Exception as e:
             logger.error(f"Error getting pose: {e}")
             return 0.0, 0.0, 0.0
@@ -357,7 +1307,7 @@ class SLAM:
             raise RuntimeError(f"Failed to convert world to cell: {e}") from e
 
     def in_bounds(self, ij: np.ndarray) -> np.ndarray:
-        """Check if grid indices are within bounds."""
+        """Check if grid indices are within the map extent covered by get_map(); see get_map_extent."""
         try:
             ij = np.asarray(ij, dtype=int)
             if ij.size == 0:
@@ -367,8 +1317,8 @@ class SLAM:
             if ij.shape[1] != 2:
                 raise ValueError(f"ij must be (N,2), got {ij.shape}")
             
-            h, w = self.grid.shape
-            return (ij[:, 0] >= 0) & (ij[:, 0] < w) & (ij[:, 1] >= 0) & (ij[:, 1] < h)
+            i0, i1, j0, j1 = self._extent
+            return (ij[:, 0] >= j0) & (ij[:, 0] < j1) & (ij[:, 1] >= i0) & (ij[:, 1] < i1)
         except Exception as e:
             logger.error(f"Error in in_bounds: {e}")
             return np.array([False] * len(ij) if ij.size > 0 else [], dtype=bool)
@@ -413,8 +1363,9 @@ class SLAM:
             logger.error(f"Error in get_scan_points: {e}")
             raise RuntimeError(f"Failed to get scan points: {e}") from e
 
-    def update_map(self, points_world: np.ndarray):
-        """Update occupancy grid with world-frame points (hits). Ray-cast misses from pose."""
+    def update_map(self, points_world: np.ndarray, origin: np.ndarray | None = None):
+        """Update occupancy grid with world-frame points (hits). Ray-cast misses from origin (world x, y of the
+        sensor; None = current pose) for every beam."""
         try:
             points_world = np.asarray(points_world, dtype=float)
             if points_world.size == 0:
@@ -431,56 +1382,44 @@ class SLAM:
                 if len(points_world) == 0:
                     return
             
+            origin = self.pose[:2].copy() if origin is None else np.asarray(origin, dtype=float).reshape(2)
             try:
-                origin_ij = self.world_to_cell(self.pose[:2].reshape(1, 2))[0]
+                origin_ij = self.world_to_cell(origin.reshape(1, 2))[0]
                 hit_ij = self.world_to_cell(points_world)
             except Exception as e:
                 raise RuntimeError(f"Failed to convert to grid coordinates: {e}") from e
             
-            h, w = self.grid.shape
-            for i in range(len(points_world)):
-                try:
-                    j, i_ = int(hit_ij[i, 0]), int(hit_ij[i, 1])
-                    if 0 <= j < w and 0 <= i_ < h:
-                        self.grid[i_, j] = np.clip(
-                            self.grid[i_, j] + self.lp_hit,
-                            self.log_odds_min,
-                            self.log_odds_max,
-                        )
-                except (IndexError, ValueError) as e:
-                    logger.debug(f"Skipping invalid hit index {i}: {e}")
-                    continue
-            
-            #Ray-cast free cells
-            step = max(1, len(points_world) // 50)
-            for i in range(0, len(points_world), step):
-                try:
-                    j, i_ = int(hit_ij[i, 0]), int(hit_ij[i, 1])
-                    origin_j, origin_i = int(origin_ij[0]), int(origin_ij[1])
-                    
-                    #skip if origin or hit is out of bounds
-                    if not (0 <= origin_j < w and 0 <= origin_i < h):
-                        continue
-                    if not (0 <= j < w and 0 <= i_ < h):
-                        continue
-                    
-                    for (jj, ii) in _bresenham(origin_j, origin_i, j, i_):
-                        if 0 <= jj < w and 0 <= ii < h:
-                            self.grid[ii, jj] = np.clip(
-                                self.grid[ii, jj] + self.lp_miss,
-                                self.log_odds_min,
-                                self.log_odds_max,
-                            )
-                except (ValueError, IndexError) as e:
-                    logger.debug(f"Skipping ray-cast for point {i}: {e}")
-                    continue
+            #Ray-cast free cells of every beam
+            if self.ray_lut_range_m is not None:
+                lut = get_ray_lut(self.resolution, self.ray_lut_range_m)
+                free_j, free_i = lut.ray_cells(origin_ij, points_world - origin)
+            else:
+                free_j, free_i = _ray_cells(origin_ij, hit_ij)
+
+            #accumulate all updates inside the bounding box of the scan, then apply them tile by tile
+            j0 = min(int(origin_ij[0]), int(hit_ij[:, 0].min()))
+            j1 = max(int(origin_ij[0]), int(hit_ij[:, 0].max())) + 1
+            i0 = min(int(origin_ij[1]), int(hit_ij[:, 1].min()))
+            i1 = max(int(origin_ij[1]), int(hit_ij[:, 1].max())) + 1
+            bw, bh = j1 - j0, i1 - i0
+
+            hit_idx = (hit_ij[:, 1] - i0)*bw + (hit_ij[:, 0] - j0)
+            free_ok = (free_j >= j0) & (free_j < j1) & (free_i >= i0) & (free_i < i1)
+            free_idx = (free_i[free_ok] - i0)*bw + (free_j[free_ok] - j0)
+
+            hits = np.bincount(hit_idx, minlength=bw*bh).reshape(bh, bw)
+            misses = np.bincount(free_idx, minlength=bw*bh).reshape(bh, bw)
+            with self._map_lock:
+                self._apply_block(i0, j0, hits, misses)
+                self._evict_idle()
         except Exception as e:
             logger.error(f"Error in update_map: {e}")
             raise RuntimeError(f"Failed to update map: {e}") from e
 
     def process_scan(self, points_robot: np.ndarray) -> bool:
         """
-        Run ICP vs previous scan, update pose, update map. Returns True if successful.
+        Run ICP vs the submap of recent keyframes (or the previous scan), update pose, update map. Returns True if successful.
+        Scans taken while the robot stands still are skipped (see static_threshold_m) and count as successful.
         """
         try:
             points_robot = np.asarray(points_robot, dtype=float)
@@ -497,28 +1436,100 @@ class SLAM:
                 logger.debug(f"Insufficient points for processing: {len(points_robot)}")
                 return False
             
+            if self._graph is not None:
+                self._apply_pose_graph()
+            prior, segments = self.motion_model.take() if self.motion_model is not None else (None, [])
+            if self.localizer is not None:
+                return self._localize(points_robot, prior)
+            
             #init with first scan
             if self._prev_points is None:
                 try:
                     self._prev_points = apply_transform(
                         points_robot, self.pose[0], self.pose[1], self.pose[2]
                     )
-                    self.update_map(self._prev_points)
+                    self._integrate(self._prev_points)
+                    self._add_keyframe(points_robot, self._prev_points)
+                    self._static_signature = scan_signature(points_robot)
                     logger.info("Initialized SLAM with first scan")
                     return True
                 except Exception as e:
                     logger.error(f"Failed to initialize with first scan: {e}")
                     return False
             
+            if self._is_static(points_robot, prior):
+                self.scans_skipped += 1
+                if prior is not None:
+                    self.pose[:] = compose(tuple(self.pose), prior)
+                return True
+            self.scans_processed += 1
+
             try:
-                target = self._prev_points
+                t0 = time.perf_counter()
+                if self._submap is not None:
+                    target, tree, normals = self._submap.get()
+                else:
+                    target, tree, normals = self._prev_points, None, None
                 if len(target) < 10:
                     logger.warning("Previous scan has insufficient points, skipping ICP")
                     return False
                 
-                dx, dy, dtheta, aligned = icp_2d(points_robot, target)
+                #ICP aligns the robot-frame scan to the world-frame target starting from the last pose,
+                #so it returns the new pose itself
+                source = self._downsampler(points_robot)
+                info = {"method": self.icp_method, "scan_points": len(points_robot), "points": len(source)}
+                #the odometry prediction, kept apart from init, which the correlative match may replace
+                predicted = tuple(self.pose) if prior is None else compose(tuple(self.pose), prior)
+                init = predicted
+                correlative = None  #accepted correlative match (x, y, theta, aligned) that initialized ICP
+                if self._matcher is not None:
+                    if target is not self._matcher_target:
+                        self._matcher.set_target(target)
+                        self._matcher_target = target
+                    match_info = {}
+                    x, y, theta, aligned = self._matcher.match(source, init, info=match_info)
+                    info["correlative_score"] = match_info["score"]
+                    if match_info["score"] < self._matcher.min_score:
+                        if self.correlative_mode == "only":
+                            logger.warning(f"Correlative match score {match_info['score']:.2f} too low, skipping")
+                            self.pose[:] = predicted
+                            return False
+                    else:
+                        init = (x, y, theta)
+                        correlative = (x, y, theta, aligned)
+                if self.correlative_mode == "only":
+                    info["method"] = "correlative"
+                elif self.icp_method == "point_to_line":
+                    x, y, theta, aligned = icp_point_to_line(
+                        source, target, self.icp_max_iter, self.icp_tol, init=init, info=info, tree=tree,
+                        normals=normals,
+                    )
+                else:
+                    x, y, theta, aligned = icp_2d(
+                        source, target, self.icp_max_iter, self.icp_tol, init=init, info=info, tree=tree
+                    )
+                if correlative is not None and self.correlative_mode == "init":
+                    #ICP may slide away from a good correlative pose (point-to-point ICP along a corridor):
+                    #keep the correlative pose if ICP moved farther than its quantization (about a cell) or fits
+                    #the likelihood grid worse. The correlative pose is the best of its grid cells, so a refined
+                    #pose may score up to ~0.01 less
+                    icp_score = self._matcher.score(source, (x, y, theta))
+                    if (
+                        not np.hypot(x - correlative[0], y - correlative[1]) <= 1.5 * self._matcher.resolution
+                        or icp_score < info["correlative_score"] - 0.02
+                    ):
+                        x, y, theta, aligned = correlative
+                        info["method"] = "correlative"
+                        self.correlative_overrides += 1
+                info["time_ms"] = (time.perf_counter() - t0) * 1e3
+                self.last_icp = info
+                logger.debug(
+                    f"Scan match {info['method']}: {info['points']}/{info['scan_points']} points, {info.get('iterations', 0)} iterations, "
+                    f"residual {info.get('residual', float('nan')) * 1000:.1f}mm, {info['time_ms']:.1f}ms"
+                )
+                dx, dy = x - self.pose[0], y - self.pose[1]
                 
-                if not all(np.isfinite([dx, dy, dtheta])):
+                if not all(np.isfinite([x, y, theta])):
                     logger.warning("ICP returned non-finite transform, skipping update")
                     return False
                 
@@ -526,20 +1537,33 @@ class SLAM:
                     logger.warning(f"Large ICP transform detected: dx={dx:.2f}, dy={dy:.2f}, skipping")
                     return False
                 
-                #update pose
-                self.pose[0] += dx
-                self.pose[1] += dy
-                self.pose[2] += dtheta
+                if prior is not None:
+                    measured = relative_pose(tuple(self.pose), (x, y, theta))
+                    if not self.motion_model.gate(prior, measured):
+                        #the match is an outlier: dead-reckon with the prediction and leave the map alone
+                        self.odometry_rejections += 1
+                        logger.warning(
+                            f"Scan match disagrees with odometry (match {measured[0]:.2f}, {measured[1]:.2f}, "
+                            f"{math.degrees(measured[2]):.1f}° vs predicted {prior[0]:.2f}, {prior[1]:.2f}, "
+                            f"{math.degrees(prior[2]):.1f}°), using prediction"
+                        )
+                        self.pose[:] = predicted
+                        return False
+                    self.motion_model.add_sample(segments, measured)
                 
-                self.pose[2] = np.arctan2(np.sin(self.pose[2]), np.cos(self.pose[2]))
+                #update pose
+                self.pose[:] = (x, y, np.arctan2(np.sin(theta), np.cos(theta)))
                 
                 #transform to world frame and update map
                 points_world = apply_transform(
                     points_robot, self.pose[0], self.pose[1], self.pose[2]
                 )
                 
-                self.update_map(points_world)
+                self._integrate(points_world)
                 self._prev_points = points_world
+                self._add_keyframe(points_robot, points_world)
+                if self.static_threshold_m is not None:
+                    self._static_signature = scan_signature(points_robot)
                 
                 return True
             except RuntimeError as e:
@@ -552,6 +1576,324 @@ class SLAM:
             logger.error(f"Error in process_scan: {e}")
             return False
 
+    def _localize(self, points_robot: np.ndarray, prior: tuple | None) -> bool:
+        """Localization-only process_scan: update the particle filter with the scan and take its estimate as
+        the pose. Static scans only move the particles by the motion prior."""
+        if self._is_static(points_robot, prior):
+            self.scans_skipped += 1
+            if prior is not None:
+                self.localizer.predict(prior)
+                self.pose[:] = self.localizer.estimate()
+            return True
+        self.scans_processed += 1
+        x, y, theta = self.localizer.update(points_robot, prior)
+        if not all(np.isfinite([x, y, theta])):
+            logger.warning("Localization returned a non-finite pose, skipping update")
+            return False
+        self.pose[:] = (x, y, theta)
+        if self.static_threshold_m is not None:
+            self._static_signature = scan_signature(points_robot)
+        info = self.localizer.last_update
+        logger.debug(
+            f"Localized: {info['particles']} particles, spread {info['spread_m'] * 1000:.0f}mm, {info['time_ms']:.1f}ms"
+        )
+        return True
+
+    def _integrate(self, points_world: np.ndarray):
+        """Update the map with a scan taken at the current pose, now or through the mapping worker."""
+        if not self.async_mapping:
+            self.update_map(points_world)
+            return
+        item = (self.pose[:2].copy(), points_world)
+        while True:
+            try:
+                self._map_queue.put_nowait(item)
+                break
+            except queue.Full:
+                self._drop_queued_scans(1)
+        if self._map_worker is None:
+            self._map_worker = threading.Thread(target=self._run_mapping, daemon=True)
+            self._map_worker.start()
+
+    def _drop_queued_scans(self, n: int | None = None) -> int:
+        """Drop the n oldest (None = all) scans waiting for the mapping worker. Returns the number dropped."""
+        dropped = 0
+        while n is None or dropped < n:
+            try:
+                self._map_queue.get_nowait()
+            except queue.Empty:
+                break
+            self._map_queue.task_done()
+            dropped += 1
+        self.mapping_dropped += dropped
+        return dropped
+
+    def _run_mapping(self):
+        """Mapping worker: integrate queued scans into the grid."""
+        while True:
+            origin, points_world = self._map_queue.get()
+            try:
+                self.update_map(points_world, origin=origin)
+            except Exception as e:
+                logger.error(f"Mapping worker failed to integrate a scan: {e}")
+            finally:
+                self._map_queue.task_done()
+
+    def flush_mapping(self):
+        """Wait until the mapping worker has integrated every queued scan."""
+        self._map_queue.join()
+
+    def start_tracking(self, laser, dmax: int = 10000) -> "LatestScan":
+        """Process every scan of laser in a thread, updating the pose at the sensor rate.
+
+        Returns a LatestScan to read scans from instead of the laser while tracking runs. Use with
+        async_mapping so that map updates do not slow tracking down.
+        """
+        if self._tracker is not None:
+            if not self._tracking_stop.is_set():
+                return self.latest_scan
+            if self._tracker.is_alive():
+                raise RuntimeError("Tracking thread is still stopping, call stop_tracking again")
+            self._tracker = None
+        self.latest_scan = LatestScan()
+        self._tracking_stop.clear()
+        self._tracker = threading.Thread(target=self._track, args=(laser, dmax), daemon=True)
+        self._tracker.start()
+        logger.info("Tracking thread started")
+        return self.latest_scan
+
+    def stop_tracking(self, timeout: float = 2.0):
+        """Stop the tracking thread and wait for it (the laser is free to use again once it returns)."""
+        if self._tracker is None:
+            return
+        self._tracking_stop.set()
+        self._tracker.join(timeout)
+        if self._tracker.is_alive():
+            #keep it, so that start_tracking does not run a second tracker on the same laser and pose
+            logger.warning(f"Tracking thread did not stop within {timeout}s, it may still use the laser")
+            return
+        self._tracker = None
+        logger.info(f"Tracking thread stopped after {self.tracked_scans} scans ({self.tracking_rate_hz:.1f}Hz)")
+
+    def _track(self, laser, dmax: int):
+        """Tracking thread: measure, publish and process scans until stop_tracking."""
+        last, last_timestamp = None, None
+        while not self._tracking_stop.is_set():
+            try:
+                timestamp, scan = laser.get_filtered_dist(dmax=dmax)
+                if scan is None or len(scan) == 0 or timestamp == last_timestamp:
+                    #a streaming laser returns its latest scan again until the next one arrives
+                    time.sleep(0.002)
+                    continue
+                last_timestamp = timestamp
+                scan = np.asarray(scan)
+                self.latest_scan.put(timestamp, scan)
+                if self.process_scan(polar_to_cartesian(scan[:, 0], scan[:, 1])):
+                    self.tracked_scans += 1
+                now = time.perf_counter()
+                if last is not None and now > last:
+                    self.tracking_rate_hz += 0.1 * (1.0 / (now - last) - self.tracking_rate_hz)
+                last = now
+            except Exception as e:
+                logger.error(f"Tracking thread failed to process a scan: {e}")
+                time.sleep(0.1)
+
+    def _is_static(self, points_robot: np.ndarray, prior: tuple | None, max_changed: float = 0.1) -> bool:
+        """True if the robot has not moved since the last processed scan: the motion prior (if any) predicts
+        less than static_threshold_m and static_threshold_deg, and fewer than max_changed of the bearing bins
+        of the scan signature changed by more than static_threshold_m."""
+        if self.static_threshold_m is None or self._static_signature is None:
+            return False
+        if prior is not None and (
+            math.hypot(prior[0], prior[1]) >= self.static_threshold_m or abs(prior[2]) >= self.static_threshold_rad
+        ):
+            return False
+        signature = scan_signature(points_robot, len(self._static_signature))
+        both = np.isfinite(signature) & np.isfinite(self._static_signature)
+        if np.sum(both) < len(signature) // 4:
+            return False
+        changed = np.abs(signature[both] - self._static_signature[both]) > self.static_threshold_m
+        return float(np.mean(changed)) < max_changed
+
+    def _add_keyframe(self, points_robot: np.ndarray, points_world: np.ndarray) -> bool:
+        """Add the scan to the submap and pose graph if the robot moved enough since the last keyframe.
+        Returns True if added."""
+        if self._submap is None and self._graph is None:
+            return False
+        if self._keyframe_pose is not None:
+            moved = np.hypot(*(self.pose[:2] - self._keyframe_pose[:2]))
+            turned = abs(np.arctan2(np.sin(self.pose[2] - self._keyframe_pose[2]), np.cos(self.pose[2] - self._keyframe_pose[2])))
+            if moved < self.keyframe_distance_m and turned < self.keyframe_angle_rad:
+                return False
+        self._keyframe_pose = self.pose.copy()
+        if self._submap is not None:
+            self._submap.add(self._keyframe_pose, points_world)
+        if self._graph is not None:
+            pose = tuple(float(v) for v in self.pose)
+            odometry = relative_pose(self._graph_frontend[-1], pose) if self._graph_frontend else None
+            self._graph_frontend.append(pose)
+            self._graph_queue.put((pose, odometry, voxel_downsample(points_robot, self.resolution, centroid=True)))
+            if self._graph_worker is None:
+                self._graph_worker = threading.Thread(target=self._run_pose_graph, daemon=True)
+                self._graph_worker.start()
+        return True
+
+    def _run_pose_graph(self):
+        """Pose graph worker: add queued keyframes, close loops, and optimize and rebuild the map after new
+        loop closures once the queue is drained, or after every 10 when keyframes arrive faster than that."""
+        closed = 0
+        while True:
+            pose, odometry, scan = self._graph_queue.get()
+            try:
+                if odometry is None:
+                    i = self._graph.add_node(pose)
+                else:
+                    i = self._graph.add_node(compose(tuple(self._graph.poses[-1]), odometry))
+                    self._graph.add_edge(i - 1, i, odometry)
+                self._graph_scans.append(scan)
+                closed += self._close_loops(i)
+                if closed and (self._graph_queue.empty() or closed >= 10):
+                    closed = 0
+                    self._optimize_graph()
+            except Exception as e:
+                logger.error(f"Pose graph worker failed on keyframe: {e}")
+            finally:
+                self._graph_queue.task_done()
+
+    def _close_loops(self, i: int, max_candidates: int = 3, max_closures: int = 1) -> int:
+        """Verify loop closure candidates of node i by scan matching and add their edges. Returns the number added."""
+        added = 0
+        for j in self._graph.candidates(i, self.loop_closure_radius_m, self.loop_closure_min_gap)[:max_candidates]:
+            z = self._match_keyframes(int(j), i)
+            if z is None:
+                continue
+            self._graph.add_edge(int(j), i, z, loop=True)
+            added += 1
+            logger.info(f"Loop closure: keyframe {i} -> {j} at ({z[0]:.2f}, {z[1]:.2f}, {math.degrees(z[2]):.1f}°)")
+            if added >= max_closures:
+                break
+        self.loop_closures += added
+        return added
+
+    def _match_keyframes(self, j: int, i: int) -> tuple[float, float, float] | None:
+        """Pose of keyframe i in the frame of keyframe j: a correlative search of the loop closure window refined
+        by point-to-line ICP. None unless the search scores min_score and ICP agrees within two cells."""
+        source, target = self._graph_scans[i], self._graph_scans[j]
+        if len(source) < 10 or len(target) < 10:
+            return None
+        init = relative_pose(tuple(self._graph.poses[j]), tuple(self._graph.poses[i]))
+        self._loop_matcher.set_target(target)
+        match_info = {}
+        x, y, theta, _ = self._loop_matcher.match(source, init, info=match_info)
+        if match_info["score"] < self._loop_matcher.min_score:
+            return None
+        info = {}
+        x1, y1, theta1, _ = icp_point_to_line(source, target, init=(x, y, theta), info=info)
+        if (
+            not info.get("residual", np.inf) <= self.resolution
+            or info.get("inliers", 0) < len(source) // 2
+            or np.hypot(x1 - x, y1 - y) > 2 * self.resolution
+        ):
+            return None
+        return x1, y1, theta1
+
+    def _optimize_graph(self):
+        """Optimize the pose graph and rebuild the map from its keyframes for the control thread to adopt."""
+        t0 = time.perf_counter()
+        stats = self._graph.optimize()
+        n = len(self._graph)
+        poses = self._graph.poses.copy()
+        kwargs = self._map_kwargs
+        if kwargs["max_resident_tiles"] is not None:
+            #tiles of the rebuilt map spill to a directory of their own, so they cannot overwrite those of the
+            #current map; _adopt_map moves them over, and the directory is removed with the rebuilt map
+            if kwargs["tile_spill_dir"] is not None:
+                os.makedirs(kwargs["tile_spill_dir"], exist_ok=True)
+            spill_dir = tempfile.mkdtemp(prefix="slam_rebuild_", dir=kwargs["tile_spill_dir"])
+            kwargs = dict(kwargs, tile_spill_dir=spill_dir)
+        rebuilt = SLAM(**kwargs)
+        if kwargs["max_resident_tiles"] is not None:
+            weakref.finalize(rebuilt, shutil.rmtree, spill_dir, True)
+        for pose, scan in zip(poses, self._graph_scans[:n]):
+            rebuilt.pose[:] = pose
+            rebuilt.update_map(apply_transform(scan, *pose))
+        stats.update(nodes=n, edges=self._graph.num_edges, time_ms=(time.perf_counter() - t0) * 1e3)
+        with self._graph_lock:
+            #a newer result covers every keyframe of one that was not adopted yet
+            self._graph_result = (n, poses, rebuilt, stats)
+        logger.info(
+            f"Pose graph optimized: {n} keyframes, {stats['edges']} edges, {stats['iterations']} iterations, "
+            f"chi2 {stats['chi2_before']:.1f} -> {stats['chi2_after']:.1f}, {stats['time_ms']:.0f}ms with map rebuild"
+        )
+
+    def _apply_pose_graph(self) -> bool:
+        """Adopt the optimized keyframes and rebuilt map of the pose graph worker, if it has new ones.
+
+        The correction of the newest optimized keyframe moves the pose, later keyframes, the submap and the
+        previous scan into the frame of the rebuilt map; scans since that keyframe are not in it.
+        Returns True if adopted.
+        """
+        with self._graph_lock:
+            result, self._graph_result = self._graph_result, None
+        if result is None:
+            return False
+        n, poses, rebuilt, stats = result
+        #rigid correction taking the front-end frame to the optimized one
+        correction = compose(tuple(poses[n - 1]), relative_pose(self._graph_frontend[n - 1], (0.0, 0.0, 0.0)))
+        self._graph_frontend[:n] = [tuple(float(v) for v in pose) for pose in poses]
+        self._graph_frontend[n:] = [compose(correction, pose) for pose in self._graph_frontend[n:]]
+        self.pose[:] = compose(correction, tuple(self.pose))
+        if self._keyframe_pose is not None:
+            self._keyframe_pose[:] = compose(correction, tuple(self._keyframe_pose))
+        if self._prev_points is not None:
+            self._prev_points = apply_transform(self._prev_points, *correction)
+        self._adopt_map(rebuilt)
+        if self._submap is not None:
+            keyframes = list(self._submap.keyframes)
+            self._submap.clear()
+            for pose, points in keyframes:
+                self._submap.add(compose(correction, tuple(pose)), apply_transform(points, *correction))
+        self._matcher_target = None
+        self.graph_optimizations += 1
+        self.last_optimization = stats
+        logger.info(
+            f"Adopted pose graph optimization: pose corrected by ({correction[0]:.2f}, {correction[1]:.2f}, "
+            f"{math.degrees(correction[2]):.1f}°)"
+        )
+        return True
+
+    def _adopt_map(self, other: "SLAM"):
+        """Replace the tiles with those of other (same grid settings); all old and new tiles count as changed."""
+        with self._map_lock:
+            #scans still queued for the mapping worker were taken in the old frame
+            self._drop_queued_scans()
+            changed = set(self._tile_versions) | set(other._tiles) | set(other._spilled)
+            #files of the old spilled tiles would stay in tile_spill_dir for the rest of the run
+            for path in self._spilled.values():
+                self._remove_spilled(path)
+            self._tiles, self._resident, self._spilled = other._tiles, other._resident, {}
+            #spilled tiles of other move into our spill directory, before other removes its own
+            for key, path in other._spilled.items():
+                self._spilled[key] = shutil.move(path, self._spill_path(key))
+            other._spilled = {}
+            i0, i1, j0, j1 = self._extent
+            k0, k1, l0, l1 = other._extent
+            self._extent = (min(i0, k0), max(i1, k1), min(j0, l0), max(j1, l1))
+            self.map_version += 1
+            self._tile_versions = {key: self.map_version for key in changed}
+            self._prob_tiles, self._prob_versions = {}, {}
+            self._evict_idle()
+            if self._distance is not None:
+                self._distance.reset(self.get_map() > self._occupied_log_odds, self._extent)
+
+    def flush_pose_graph(self) -> bool:
+        """Wait until the pose graph worker has processed every keyframe, then adopt its result.
+        Returns True if an optimized map was adopted."""
+        if self._graph is None:
+            return False
+        self._graph_queue.join()
+        return self._apply_pose_graph()
+
     def step(self, laser) -> bool:
         """Acquire one scan, process it, update map and pose. Returns True on success."""
         try:
@@ -570,29 +1912,256 @@ class SLAM:
             logger.error(f"Error in step: {e}")
             return False
 
-    def get_map(self) -> np.ndarray:
-        """Return occupancy grid (height, width). Values are log-odds; >0 occupied, <0 free."""
+    def _tile_blocks(self, i0: int, i1: int, j0: int, j1: int):
+        """Yield (key, tile slices, region slices) of every tile overlapping region (row0, row1, col0, col1)."""
+        T = MAP_TILE_CELLS
+        for tr in range(i0 // T, (i1 - 1) // T + 1):
+            a, b = max(i0, tr * T), min(i1, (tr + 1) * T)
+            for tc in range(j0 // T, (j1 - 1) // T + 1):
+                c, d = max(j0, tc * T), min(j1, (tc + 1) * T)
+                yield (
+                    (tr, tc),
+                    (slice(a - tr * T, b - tr * T), slice(c - tc * T, d - tc * T)),
+                    (slice(a - i0, b - i0), slice(c - j0, d - j0)),
+                )
+
+    def _touch_tile(self, key: tuple[int, int]) -> np.ndarray:
+        """Tile for writing: allocated on first touch, loaded back if spilled, marked most recently used."""
+        tile = self._tiles.get(key)
+        if tile is None:
+            path = self._spilled.pop(key, None)
+            if path is not None:
+                tile = np.load(path)
+                self._remove_spilled(path)
+            else:
+                T = MAP_TILE_CELLS
+                tile = np.full((T, T), self._unknown, dtype=self.grid_dtype)
+                i0, i1, j0, j1 = self._extent
+                self._extent = (
+                    min(i0, key[0] * T), max(i1, (key[0] + 1) * T),
+                    min(j0, key[1] * T), max(j1, (key[1] + 1) * T),
+                )
+            self._tiles[key] = tile
+        self._resident[key] = None
+        self._resident.move_to_end(key)
+        return tile
+
+    def _tile(self, key: tuple[int, int]) -> np.ndarray | None:
+        """Tile for reading (spilled tiles are memory-mapped read-only, not loaded), None if never touched."""
+        tile = self._tiles.get(key)
+        if tile is None and key in self._spilled:
+            tile = np.load(self._spilled[key], mmap_mode="r")
+        return tile
+
+    def _apply_block(self, i0: int, j0: int, hits: np.ndarray, misses: np.ndarray):
+        """Apply hit/miss counts of the block at cell (i0, j0) to the tiles it covers, bump map_version
+        and stamp it on the changed tiles."""
+        T = MAP_TILE_CELLS
+        bh, bw = hits.shape
+        touched = (hits > 0) | (misses > 0)
+        rows = np.maximum(np.arange(i0 // T, (i0 + bh - 1) // T + 1) * T - i0, 0)
+        cols = np.maximum(np.arange(j0 // T, (j0 + bw - 1) // T + 1) * T - j0, 0)
+        tiles = np.logical_or.reduceat(np.logical_or.reduceat(touched, rows, axis=0), cols, axis=1)
+        if not tiles.any():
+            return
+        self.map_version += 1
+        rows, cols = np.append(rows, bh).tolist(), np.append(cols, bw).tolist()
+        cells = []  #(rows, cols, occupied) of the updated cells, for the distance field
+        for r, c in np.argwhere(tiles).tolist():
+            key = ((i0 + rows[r]) // T, (j0 + cols[c]) // T)
+            a, b = i0 + rows[r] - key[0] * T, i0 + rows[r + 1] - key[0] * T
+            e, f = j0 + cols[c] - key[1] * T, j0 + cols[c + 1] - key[1] * T
+            block = (slice(rows[r], rows[r + 1]), slice(cols[c], cols[c + 1]))
+            sub = self._touch_tile(key)[a:b, e:f]
+            updated = self._apply_counts(sub, hits[block], misses[block])
+            self._tile_versions[key] = self.map_version
+            if self._distance is not None:
+                ci, cj = np.nonzero(updated)
+                cells.append((ci + i0 + rows[r], cj + j0 + cols[c], self._log_odds(sub[ci, cj]) > self._occupied_log_odds))
+        if cells:
+            self._distance.fit(self._extent)
+            self._distance.update(*(np.concatenate(v) for v in zip(*cells)))
+
+    def _evict_idle(self):
+        """Spill the least recently updated tiles to disk while more than max_resident_tiles are in memory."""
+        if self.max_resident_tiles is None:
+            return
+        while len(self._resident) > self.max_resident_tiles:
+            key, _ = self._resident.popitem(last=False)
+            self._spill_tile(key)
+
+    def _spill_path(self, key: tuple[int, int]) -> str:
+        """File a tile is spilled to; the temporary spill directory is created on first use."""
+        if self.tile_spill_dir is None:
+            self.tile_spill_dir = tempfile.mkdtemp(prefix="slam_tiles_")
+            weakref.finalize(self, shutil.rmtree, self.tile_spill_dir, True)
+        os.makedirs(self.tile_spill_dir, exist_ok=True)
+        return os.path.join(self.tile_spill_dir, f"tile_{key[0]}_{key[1]}.npy")
+
+    @staticmethod
+    def _remove_spilled(path: str):
+        """Delete the file of a spilled tile that was loaded back or replaced."""
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove spilled tile {path}: {e}")
+
+    def _spill_tile(self, key: tuple[int, int]):
+        """Write a tile to a memory-mapped .npy file and drop it (and its cached probabilities) from memory."""
+        tile = self._tiles.pop(key)
+        path = self._spill_path(key)
+        mm = np.lib.format.open_memmap(path, mode="w+", dtype=tile.dtype, shape=tile.shape)
+        mm[...] = tile
+        mm.flush()
+        del mm
+        self._spilled[key] = path
+        self._prob_tiles.pop(key, None)
+        self._prob_versions.pop(key, None)
+
+    def evict_tiles(self, keep: int = 0) -> int:
+        """Spill all but the keep most recently updated tiles to disk now. Returns the number of tiles spilled."""
+        with self._map_lock:
+            n = max(len(self._resident) - max(int(keep), 0), 0)
+            for _ in range(n):
+                key, _ = self._resident.popitem(last=False)
+                self._spill_tile(key)
+            return n
+
+    def map_nbytes(self) -> int:
+        """Memory (bytes) held by resident tiles and their cached probabilities; spilled tiles are on disk."""
+        return sum(t.nbytes for t in self._tiles.values()) + sum(p.nbytes for p in self._prob_tiles.values())
+
+    def tile_counts(self) -> tuple[int, int]:
+        """Return (resident, spilled) numbers of allocated tiles."""
+        return len(self._tiles), len(self._spilled)
+
+    def get_map_extent(self) -> tuple[int, int, int, int]:
+        """Region (row0, row1, col0, col1) of grid cells covered by get_map(): the initial width_m x height_m
+        area grown by every allocated tile. Rows and columns may be negative once the robot leaves it."""
+        return self._extent
+
+    def _region(self, region: tuple[int, int, int, int] | None) -> tuple[int, int, int, int]:
+        """Validate region (row0, row1, col0, col1) in grid cells, half-open; None = map extent."""
+        if region is None:
+            return self._extent
+        i0, i1, j0, j1 = (int(v) for v in region)
+        if i0 >= i1 or j0 >= j1:
+            raise ValueError(f"Empty map region: {region}")
+        return i0, i1, j0, j1
+
+    def _probability(self, block: np.ndarray) -> np.ndarray:
+        """Occupancy probabilities of a block of tile storage."""
+        if self.grid_dtype == "uint8":
+            return self._prob_table[block]
+        grid_clipped = np.clip(self._log_odds(block), -50, 50)
+        p = 1.0 - 1.0 / (1.0 + np.exp(grid_clipped))
+        np.clip(p, 0.0, 1.0, out=p)
+        if not np.all(np.isfinite(p)):
+            logger.warning("Non-finite values in probability map, clipping")
+            p = np.nan_to_num(p, nan=0.5, posinf=1.0, neginf=0.0)
+        return p
+
+    def _tile_prob(self, key: tuple[int, int]) -> np.ndarray | None:
+        """float32 probabilities of a tile, recomputed only if it changed since cached; None if never touched.
+        Probabilities of spilled tiles are computed from the mapped file and not cached."""
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = self._tile(key)
+            return None if tile is None else self._probability(tile).astype(np.float32)
+        version = self._tile_versions[key]
+        if self._prob_versions.get(key, -1) < version:
+            self._prob_tiles[key] = self._probability(tile).astype(np.float32)
+            self._prob_versions[key] = version
+        return self._prob_tiles[key]
+
+    def get_map(self, region: tuple[int, int, int, int] | None = None) -> np.ndarray:
+        """Return occupancy grid of the map extent (see get_map_extent), or of a region (row0, row1, col0, col1).
+        Values are log-odds; >0 occupied, <0 free, 0 unknown (never touched)."""
         try:
-            return self.grid.copy()
+            with self._map_lock:
+                i0, i1, j0, j1 = self._region(region)
+                result = np.zeros((i1 - i0, j1 - j0))
+                for key, tile_block, block in self._tile_blocks(i0, i1, j0, j1):
+                    tile = self._tile(key)
+                    if tile is not None:
+                        result[block] = self._log_odds(tile[tile_block])
+                return result
         except Exception as e:
             logger.error(f"Error getting map: {e}")
-            return np.zeros_like(self.grid)
+            i0, i1, j0, j1 = self._extent
+            return np.zeros((i1 - i0, j1 - j0))
+
+    def get_map_prob(self, region: tuple[int, int, int, int] | None = None, copy: bool = True) -> np.ndarray:
+        """Return occupancy as probabilities in [0,1] over the map extent or a region. 0.5=unknown, >0.5 occupied.
 
-    def get_map_prob(self) -> np.ndarray:
-        """Return occupancy as probabilities in [0,1]. 0.5=unknown, >0.5 occupied."""
+        Only tiles changed since the last call are recomputed. copy=False returns read-only float32 data, a view
+        of the tile cache if the region lies within one tile, valid until the next update.
+        """
         try:
-            grid_clipped = np.clip(self.grid, -50, 50)
-            p = 1.0 - 1.0 / (1.0 + np.exp(grid_clipped))
-            result = np.clip(p, 0.0, 1.0)
-            
-            if not np.all(np.isfinite(result)):
-                logger.warning("Non-finite values in probability map, clipping")
-                result = np.nan_to_num(result, nan=0.5, posinf=1.0, neginf=0.0)
-            
-            return result
+            with self._map_lock:
+                i0, i1, j0, j1 = self._region(region)
+                blocks = list(self._tile_blocks(i0, i1, j0, j1))
+                if not copy and len(blocks) == 1:
+                    key, tile_block, _ = blocks[0]
+                    prob = self._tile_prob(key)
+                    if prob is not None and key in self._tiles:
+                        result = prob[tile_block].view()
+                        result.flags.writeable = False
+                        return result
+                result = np.full((i1 - i0, j1 - j0), 0.5, dtype=float if copy else np.float32)
+                for key, tile_block, block in blocks:
+                    prob = self._tile_prob(key)
+                    if prob is not None:
+                        result[block] = prob[tile_block]
+                if not copy:
+                    result.flags.writeable = False
+                return result
         except Exception as e:
             logger.error(f"Error getting probability map: {e}")
-            return np.full_like(self.grid, 0.5, dtype=float)
+            i0, i1, j0, j1 = self._extent
+            return np.full((i1 - i0, j1 - j0), 0.5)
+
+    def changed_tiles(self, since_version: int = 0) -> tuple[int, np.ndarray]:
+        """Return (map_version, tiles) with (K,2) tile indices (row, col) changed after since_version.
+
+        Pass the returned map_version next time to sync incrementally; see tile_region for the cells of a tile.
+        """
+        with self._map_lock:
+            tiles = [key for key, version in self._tile_versions.items() if version > since_version]
+            return self.map_version, np.array(tiles, dtype=int).reshape(-1, 2)
+
+    def tile_region(self, tile_row: int, tile_col: int) -> tuple[int, int, int, int]:
+        """Region (row0, row1, col0, col1) of grid cells covered by a tile."""
+        tile_row, tile_col = int(tile_row), int(tile_col)
+        return (
+            tile_row * MAP_TILE_CELLS, (tile_row + 1) * MAP_TILE_CELLS,
+            tile_col * MAP_TILE_CELLS, (tile_col + 1) * MAP_TILE_CELLS,
+        )
+
+    def distance_at(self, x: float, y: float) -> float:
+        """Distance (m) from world point (x, y) to the nearest occupied cell, up to distance_field_max_m."""
+        if self._distance is None:
+            raise RuntimeError("No distance field: construct SLAM with distance_field_max_m")
+        j = math.floor((x + self.origin[0]) / self.resolution + 0.5)
+        i = math.floor((y + self.origin[1]) / self.resolution + 0.5)
+        with self._map_lock:
+            return self._distance.at(i, j)
+
+    def get_distance(self, xy: np.ndarray) -> np.ndarray:
+        """Distances (m) from world points (N,2) to the nearest occupied cell, up to distance_field_max_m."""
+        if self._distance is None:
+            raise RuntimeError("No distance field: construct SLAM with distance_field_max_m")
+        ij = self.world_to_cell(xy)
+        with self._map_lock:
+            return self._distance.lookup(ij[:, 1], ij[:, 0])
+
+    def get_distance_map(self) -> np.ndarray:
+        """Distance field over the map extent (see get_map_extent) as float32 m, capped at distance_field_max_m."""
+        if self._distance is None:
+            raise RuntimeError("No distance field: construct SLAM with distance_field_max_m")
+        with self._map_lock:
+            self._distance.fit(self._extent)
+            return self._distance.get()
 
     def save_map_visualization(
         self,
@@ -623,15 +2192,36 @@ class SLAM:
             if save_npy:
                 npy_path = os.path.join(out_dir, f"{base}.npy")
                 np.save(npy_path, map_prob)
+                #frame of the grid, so localization.LikelihoodField.load can localize on the saved map
+                i0, i1, j0, j1 = self._extent
+                if map_prob.shape == (i1 - i0, j1 - j0):
+                    with open(os.path.join(out_dir, f"{base}.json"), "w") as f:
+                        json.dump({
+                            "resolution": self.resolution,
+                            "origin": self.origin.tolist(),
+                            "extent": list(self._extent),
+                        }, f)
 
             matplotlib.use("Agg", force=True)
 
             #occupied (p~1)->dark; free (p~0)->light; unknown around mid-gray
             img = 1.0 - np.clip(map_prob, 0.0, 1.0)
 
+            #axes in grid cells of the map extent, so the pose lands right once the map grew past its initial area
+            i0, i1, j0, j1 = self._extent
+            if map_prob.shape != (i1 - i0, j1 - j0):
+                i0, j0 = 0, 0
+            h, w = map_prob.shape
+
             fig = plt.figure(figsize=(8, 8), dpi=150)
             ax = fig.add_subplot(111)
-            ax.imshow(img, cmap="gray", origin="lower", interpolation="nearest")
+            ax.imshow(
+                img,
+                cmap="gray",
+                origin="lower",
+                interpolation="nearest",
+                extent=(j0 - 0.5, j0 + w - 0.5, i0 - 0.5, i0 + h - 0.5),
+            )
             ax.set_title(base)
             ax.set_xlabel("grid x")
             ax.set_ylabel("grid y")
@@ -826,7 +2416,8 @@ class SLAM:
 
     def explore_waypoints(self, chassis, laser, config: Config):
         """
-        Explore with obstacle avoidance and periodic SLAM updates.
+        Explore with obstacle avoidance and periodic SLAM updates; with async_mapping a tracking thread updates
+        the pose at the sensor rate instead (see start_tracking) and the loop reads its scans.
 
         exploration_mode (on config):
           - 'waypoints': follow config.waypoints (set in config.py).
@@ -847,7 +2438,7 @@ class SLAM:
 
         current_waypoint_idx = 0
         waypoint_reached_threshold = 0.3  #meters
-        scan_interval = 5  #num of iterations between Lidar scan updates
+        scan_interval = max(1, int(config.slam_scan_interval))  #num of iterations between Lidar scan updates
         movement_duration = 0.2  #secs per movement step
 
         if use_waypoints:
@@ -864,6 +2455,10 @@ class SLAM:
                 f"Exploration mode=free (reseed heading every {free_heading_reseed_interval} iterations)"
             )
 
+        tracking = self.async_mapping
+        if tracking:
+            laser = self.start_tracking(laser)
+
         iteration = 0
         success_count = 0
 
@@ -958,13 +2553,31 @@ class SLAM:
                 chassis.drive_xy(forward=forward, strafe=strafe, rotation=rotation)
                 time.sleep(movement_duration)
                 chassis.stop_motors()
+                #commands are recorded after the move, too late for the scans the tracking thread took during it
+                if self.motion_model is not None and not tracking:
+                    self.motion_model.command(forward, strafe, rotation, movement_duration)
 
                 #Update SLAM
-                if iteration % scan_interval == 0:
+                if tracking:
+                    success_count = self.tracked_scans
+                    if iteration % 50 == 0:
+                        logger.info(
+                            f"Iteration {iteration}: pose x={x:.2f} y={y:.2f} theta={math.degrees(theta):.1f}°, "
+                            f"tracking at {self.tracking_rate_hz:.1f}Hz, {self.mapping_dropped} scans dropped by mapping"
+                        )
+                elif iteration % scan_interval == 0:
                     if self.step(laser):
                         success_count += 1
                         if iteration % 50 == 0:
-                            logger.info(f"Iteration {iteration}: pose x={x:.2f} y={y:.2f} theta={math.degrees(theta):.1f}°")
+                            logger.info(
+                                f"Iteration {iteration}: pose x={x:.2f} y={y:.2f} theta={math.degrees(theta):.1f}°, "
+                                f"scans processed {self.scans_processed}, skipped as static {self.scans_skipped}"
+                            )
+                            if self.last_icp:
+                                logger.info(
+                                    f"  Scan match {self.last_icp.get('method')}: {self.last_icp.get('iterations', 0)} iterations, "
+                                    f"residual {self.last_icp.get('residual', float('nan')) * 1000:.1f}mm"
+                                )
                             if obstacle_info:
                                 fc = obstacle_info.get("forward_clearance_mm", float("nan"))
                                 logger.info(
@@ -984,5 +2597,11 @@ class SLAM:
                 time.sleep(0.1)
                 continue
 
-        logger.info(f"Exploration completed: {success_count} SLAM updates successful")
+        if tracking:
+            self.stop_tracking()
+            success_count = self.tracked_scans
+        logger.info(
+            f"Exploration completed: {success_count} SLAM updates successful, "
+            f"{self.scans_processed} scans processed, {self.scans_skipped} skipped as static"
+        )
         return success_count
\ No newline at end of file
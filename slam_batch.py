@@ -0,0 +1,209 @@
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from hokuyolx.recording import ReplayLaser
+from slam import SLAM
+
+####################################################
+RUNNER_PARAMS = ("scan_interval", "max_scans")  #parameters of the replay; all others are passed to SLAM
+
+def expand_grid(grid: dict) -> list:
+    """All combinations of a {parameter: [values]} grid as a list of {parameter: value} configurations."""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def map_metrics(slam: SLAM) -> dict:
+    """Map statistics comparable between runs: explored area, occupied/free cells, mean occupancy entropy of
+    the explored cells (bits, lower = crisper map)."""
+    prob = slam.get_map_prob(copy=False)
+    known = np.abs(prob - 0.5) > 1e-3
+    p = np.clip(prob[known].astype(float), 1e-6, 1 - 1e-6)
+    entropy = -(p * np.log2(p) + (1 - p) * np.log2(1 - p))
+    return {
+        "explored_m2": float(np.sum(known)) * slam.resolution**2,
+        "occupied_cells": int(np.sum(prob > 0.65)),
+        "free_cells": int(np.sum(prob < 0.35)),
+        "map_entropy": float(entropy.mean()) if entropy.size else float("nan"),
+    }
+
+def pose_error(poses: np.ndarray, timestamps: np.ndarray, reference: str) -> float:
+    """RMS position error (m) of poses against those of a reference run saved by save_run, compared at the
+    scan timestamps both runs processed."""
+    with np.load(reference) as ref:
+        ref_poses, ref_timestamps = ref["poses"], ref["timestamps"]
+    common, i, j = np.intersect1d(timestamps, ref_timestamps, return_indices=True)
+    if len(common) == 0:
+        return float("nan")
+    return float(np.sqrt(np.mean(np.sum((poses[i, :2] - ref_poses[j, :2])**2, axis=1))))
+
+def save_run(path: str, slam: SLAM, poses: np.ndarray, timestamps: np.ndarray, params: dict):
+    """Write map and poses in compact form: compressed .npz with the map as uint8 probabilities (0-255) and
+    its extent in grid cells, poses as float32 (x, y, theta) with their scan timestamps."""
+    np.savez_compressed(
+        path,
+        map=np.round(slam.get_map_prob() * 255).astype(np.uint8),
+        extent=np.array(slam.get_map_extent(), dtype=np.int64),
+        resolution=np.float64(slam.resolution),
+        poses=poses.astype(np.float32),
+        timestamps=timestamps.astype(np.int64),
+        params=json.dumps(params),
+    )
+
+def run_config(log_path: str, params: dict, out_path: str | None = None, reference: str | None = None) -> dict:
+    """Replay a scan log through SLAM built with params. Returns params and run metrics.
+
+    scan_interval replays every n-th scan (as explore_waypoints steps SLAM every scan_interval iterations)
+    and max_scans stops early; all other params are SLAM arguments. With a reference run (save_run output,
+    e.g. of the most accurate configuration) the RMS pose error against it is reported as pose_error_mm.
+    """
+    slam_params = {k: v for k, v in params.items() if k not in RUNNER_PARAMS}
+    scan_interval = max(1, int(params.get("scan_interval", 1)))
+    max_scans = params.get("max_scans")
+    result = dict(params)
+    try:
+        slam = SLAM(**slam_params)
+        laser = ReplayLaser(log_path)
+    except Exception as e:
+        result["error"] = str(e)
+        return result
+    try:
+        indices = range(0, len(laser), scan_interval)
+        if max_scans:
+            indices = indices[:int(max_scans)]
+        all_timestamps = laser.timestamps()
+        poses, timestamps = [], []
+        failed, iterations, residuals = 0, [], []
+        start = time.perf_counter()
+        for k in indices:
+            laser.seek(k)
+            ok = slam.step(laser)
+            failed += not ok
+            if slam.last_icp:
+                iterations.append(slam.last_icp.get("iterations", 0))
+                residuals.append(slam.last_icp.get("residual", np.nan))
+                slam.last_icp = {}
+            poses.append(slam.get_pose())
+            timestamps.append(all_timestamps[k])
+        slam.flush_mapping()
+        slam.flush_pose_graph()
+        wall = time.perf_counter() - start
+    finally:
+        laser.close()
+    poses = np.array(poses, dtype=float).reshape(-1, 3)
+    n = len(poses)
+    result.update(
+        scans=n,
+        wall_s=wall,
+        scans_per_s=n / wall if wall > 0 else float("nan"),
+        icp_failure_rate=failed / max(n - 1, 1),  #the first scan initializes the map
+        icp_iterations=float(np.mean(iterations)) if iterations else float("nan"),
+        icp_residual_mm=float(np.nanmean(residuals)) * 1e3 if residuals else float("nan"),
+        path_m=float(np.sum(np.hypot(*np.diff(poses[:, :2], axis=0).T))) if n > 1 else 0.0,
+        **map_metrics(slam),
+    )
+    if reference:
+        result["pose_error_mm"] = pose_error(poses, np.array(timestamps), reference) * 1e3
+    if out_path:
+        save_run(out_path, slam, poses, np.array(timestamps), params)
+        result["output"] = out_path
+    return result
+
+def _quiet_worker():
+    #per-scan warnings of hundreds of runs would drown the summary; failures are counted instead
+    logging.getLogger().setLevel(logging.ERROR)
+
+def sweep(
+    log_path: str,
+    configs: list,
+    workers: int | None = None,
+    out_dir: str | None = None,
+    reference: str | None = None,
+) -> list:
+    """Run every configuration on the log in a process pool (workers = all cores by default).
+    Returns the results in the order of configs; with out_dir each run is saved as config_NNN.npz."""
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    out_paths = [os.path.join(out_dir, f"config_{i:03d}.npz") if out_dir else None for i in range(len(configs))]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_quiet_worker) as pool:
+        n = len(configs)
+        return list(pool.map(run_config, [log_path] * n, configs, out_paths, [reference] * n))
+
+def write_results(path: str, results: list):
+    """Write sweep results as CSV, one row per configuration."""
+    fields = []
+    for result in results:
+        fields += [k for k in result if k not in fields]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+
+def _parse_value(text: str):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    if text.lower() in ("true", "false"):
+        return text.lower() == "true"
+    if text.lower() == "none":
+        return None
+    return text
+
+def main():
+    """Replay a scan log through SLAM for a grid of parameters on all cores:
+
+    python slam_batch.py run.hkl resolution=0.05,0.1 icp_method=point_to_point,point_to_line scan_interval=1,5
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="scan log recorded with scan_log_path (ScanRecorder)")
+    parser.add_argument("grid", nargs="*", metavar="name=v1,v2,...",
+                        help="SLAM argument, scan_interval or max_scans with the values to try")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--out", default="slam_sweep", help="directory of maps, poses and results.csv")
+    parser.add_argument("--reference", default=None,
+                        help="config_NNN.npz of an earlier run to measure pose errors against")
+    parser.add_argument("--max-pose-error-mm", type=float, default=None,
+                        help="with --reference, list only configurations at most this far off")
+    parser.add_argument("--sort", default="scans_per_s", help="result column to sort the summary by")
+    args = parser.parse_args()
+
+    grid = {}
+    for item in args.grid:
+        name, sep, values = item.partition("=")
+        if not sep or not values:
+            parser.error(f"Expected name=v1,v2,..., got {item!r}")
+        grid[name] = [_parse_value(v) for v in values.split(",")]
+    configs = expand_grid(grid)
+
+    start = time.perf_counter()
+    results = sweep(args.log, configs, args.workers, args.out, args.reference)
+    print(f"{len(configs)} configurations in {time.perf_counter() - start:.1f}s")
+    write_results(os.path.join(args.out, "results.csv"), results)
+
+    ok = [r for r in results if "error" not in r]
+    if args.reference and args.max_pose_error_mm is not None:
+        ok = [r for r in ok if r["pose_error_mm"] <= args.max_pose_error_mm]
+        print(f"{len(ok)} configurations within {args.max_pose_error_mm:g}mm of the reference")
+    reverse = args.sort in ("scans_per_s", "explored_m2", "occupied_cells", "free_cells")
+    for r in sorted(ok, key=lambda r: r.get(args.sort, float("nan")), reverse=reverse):
+        params = " ".join(f"{k}={r[k]}" for k in grid)
+        print(
+            f"{params}: {r['wall_s']:.1f}s, {r['scans_per_s']:.0f} scans/s, ICP failures {100 * r['icp_failure_rate']:.1f}%, "
+            f"residual {r['icp_residual_mm']:.1f}mm, map entropy {r['map_entropy']:.3f}, explored {r['explored_m2']:.1f}m²"
+            + (f", pose error {r['pose_error_mm']:.1f}mm" if "pose_error_mm" in r else "")
+        )
+    for r in results:
+        if "error" in r:
+            print(f"Failed: {' '.join(f'{k}={r[k]}' for k in grid)}: {r['error']}")
+    print(f"Results saved to: {os.path.join(args.out, 'results.csv')}")
+
+if __name__ == '__main__':
+    main()